@@ -0,0 +1,260 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import spotify_cli
+from spotify_cli import local_db_accessor
+
+# Parallel related artist requests. The Spotify scheduler still applies.
+crawl_workers = 4
+
+# Pending artists taken from the frontier per round, per worker
+round_size_per_worker = 4
+
+
+# ------------------------ Crawler ------------------------
+def seed_crawl(crawl_name, seed_ids):
+    ''' Add seed artists at depth 0. Seeds already in the crawl keep their
+    state, so seeding again resumes the crawl.
+
+    Parameters
+    ----------
+    Str
+        Crawl name
+
+    List
+        A list of spotify artist IDs
+
+    Returns
+    -------
+    int
+        Number of new seeds
+    '''
+    known = local_db_accessor.find_frontier(crawl_name, seed_ids)
+    new_ids = [id for id in dict.fromkeys(seed_ids) if id not in known]
+    with local_db_accessor.batch():
+        spotify_cli.get_artists(new_ids)
+        local_db_accessor.save_frontier(crawl_name, \
+            [(id, 0, 'pending') for id in new_ids])
+    return len(new_ids)
+
+def expand_budget(crawl_name, max_artists, max_per_depth):
+    ''' Get how many more artists each depth may expand, from the counts
+    stored in the frontier so a resumed crawl keeps its budget.
+
+    Parameters
+    ----------
+    Str
+        Crawl name
+
+    int
+        Total number of artists to expand, None for no limit
+
+    int
+        Number of artists to expand per depth, None for no limit
+
+    Returns
+    -------
+    Tuple
+        (artists left in total or None, {depth: artists left} or None)
+    '''
+    counts = local_db_accessor.frontier_counts(crawl_name)
+    expanded = {depth: counts[depth].get('done', 0) \
+                + counts[depth].get('failed', 0) for depth in counts}
+
+    total_left = None
+    if max_artists is not None:
+        total_left = max(0, max_artists - sum(expanded.values()))
+
+    depth_left = None
+    if max_per_depth is not None:
+        depth_left = {depth: max(0, max_per_depth - expanded.get(depth, 0)) \
+                      for depth in counts}
+    return total_left, depth_left
+
+def take_round(crawl_name, max_depth, size, total_left, depth_left):
+    ''' Take the next pending artists that fit the budgets.
+
+    Parameters
+    ----------
+    Str
+        Crawl name
+
+    int
+        Deepest depth to expand
+
+    int
+        Maximum number of artists
+
+    int
+        Artists left in total, None for no limit
+
+    Dict
+        Artists left by depth, None for no limit
+
+    Returns
+    -------
+    List
+        A list of (artist id, depth) tuples, shallowest first
+    '''
+    if total_left is not None:
+        size = min(size, total_left)
+
+    entries = []
+    for depth in range(max_depth + 1):
+        limit = size - len(entries)
+        if depth_left is not None:
+            limit = min(limit, depth_left.get(depth, 0))
+        if limit <= 0:
+            continue
+        entries += [(artist_id, depth) for artist_id \
+                    in local_db_accessor.next_frontier(crawl_name, depth, \
+                                                       limit)]
+    return entries
+
+def save_round(crawl_name, max_depth, entries, results):
+    ''' Save one round of related artists, their edges and the frontier
+    changes in one transaction.
+
+    Parameters
+    ----------
+    Str
+        Crawl name
+
+    int
+        Deepest depth to expand
+
+    List
+        A list of (artist id, depth) tuples
+
+    List
+        Related artists responses in entries order, or the exception of
+        failed requests
+
+    Returns
+    -------
+    Tuple
+        (number of artists expanded, number of new frontier artists)
+    '''
+    expanded = 0
+    discovered = {}
+    frontier = []
+    with local_db_accessor.batch():
+        for (artist_id, depth), result in zip(entries, results):
+            if isinstance(result, Exception):
+                print('Crawl failed - ' + artist_id + ': ' + str(result))
+                frontier.append((artist_id, depth, 'failed'))
+                continue
+
+            artists = spotify_cli.hydrate_artists(result['artists'])
+            local_db_accessor.save_related_artists(artist_id, artists)
+            frontier.append((artist_id, depth, 'done'))
+            expanded += 1
+
+            if depth < max_depth:
+                for artist in artists:
+                    discovered.setdefault(artist.artist_id, depth + 1)
+
+        # The frontier is deduplicated against every artist the crawl
+        # has seen, whatever its status
+        known = local_db_accessor.find_frontier(crawl_name, list(discovered))
+        new_ids = [id for id in discovered if id not in known]
+        frontier += [(id, discovered[id], 'pending') for id in new_ids]
+        local_db_accessor.save_frontier(crawl_name, frontier)
+    return expanded, len(new_ids)
+
+def crawl(crawl_name, seed_ids=(), max_depth=2, max_artists=None, \
+          max_per_depth=None, workers=None):
+    ''' Crawl the related artist graph breadth-first from seed artists.
+    The frontier lives in the crawl_frontier table, so an interrupted
+    crawl continues where it stopped when run again with the same name.
+    Requests run in parallel; all writes happen on this thread, one
+    transaction per round.
+
+    Parameters
+    ----------
+    Str
+        Crawl name
+
+    List
+        A list of seed spotify artist IDs
+
+    int
+        Deepest depth to expand; seeds are depth 0
+
+    int
+        Total number of artists to expand, None for no limit
+
+    int
+        Number of artists to expand per depth, None for no limit
+
+    int
+        Parallel requests, crawl_workers if not given
+
+    Returns
+    -------
+    Dict
+        {depth: {status: count}} of the crawl
+    '''
+    if workers is None:
+        workers = crawl_workers
+    seeded = seed_crawl(crawl_name, list(seed_ids))
+    print('Crawl ' + crawl_name + ': ' + str(seeded) + ' new seeds')
+
+    def call(entry):
+        try:
+            return spotify_cli.spotify.artist_related_artists(entry[0])
+        except Exception as e:
+            return e
+
+    start = time.time()
+    total = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            total_left, depth_left = expand_budget(crawl_name, max_artists, \
+                                                   max_per_depth)
+            entries = take_round(crawl_name, max_depth, \
+                                 workers * round_size_per_worker, \
+                                 total_left, depth_left)
+            if len(entries) == 0:
+                break
+
+            results = list(executor.map(call, entries))
+            expanded, discovered = save_round(crawl_name, max_depth, \
+                                              entries, results)
+            total += expanded
+            print('Expanded ' + str(total) + ' artists, depth ' \
+                  + str(entries[-1][1]) + ', ' + str(discovered) \
+                  + ' new in frontier, ' \
+                  + str(round(total / max(time.time() - start, 1e-9), 1)) \
+                  + ' artists/s')
+
+    counts = local_db_accessor.frontier_counts(crawl_name)
+    print('Crawl ' + crawl_name + ' stopped: ' + str(counts))
+    return counts
+
+
+# ------------------------ Main function ---------------------
+if __name__ == "__main__":
+    # Usage: python3 artist_crawler.py NAME [--depth N] [--max-artists N]
+    #        [--max-per-depth N] [--workers N] [SEED_ID ...]
+    parser = argparse.ArgumentParser(description='Crawl related artists ' \
+        + 'breadth-first into the local database. Run again with the ' \
+        + 'same name to resume.')
+    parser.add_argument('name', help='crawl name')
+    parser.add_argument('seeds', nargs='*', help='seed spotify artist IDs')
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--max-artists', type=int, default=None)
+    parser.add_argument('--max-per-depth', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=crawl_workers)
+    args = parser.parse_args()
+
+    crawl(args.name, args.seeds, args.depth, args.max_artists, \
+          args.max_per_depth, args.workers)
+    local_db_accessor.analyze()
+    local_db_accessor.close()
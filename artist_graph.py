@@ -0,0 +1,449 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+
+# Edges added since the last build are kept in a side list, and merged
+# into the CSR arrays once there are this many of them
+compact_threshold = 10000
+
+
+class ArtistGraph:
+    ''' In-memory related artist graph. An edge a -> b means b is listed as
+    related to a. Artist ids are interned to ints, and the out and in
+    edges are kept as CSR arrays: the neighbors of node n are
+    targets[offsets[n]:offsets[n + 1]].
+    '''
+    def __init__(self, edges=()):
+        self.lock = threading.RLock()
+        self.ids = []
+        self.index = {}
+        self._build(edges)
+
+    # ------------------------ Building ------------------------
+    def _intern(self, artist_id):
+        ''' Get the node number of an artist id, adding a node if needed.
+
+        Parameters
+        ----------
+        Str
+            Artist id
+
+        Returns
+        -------
+        int
+            Node number
+        '''
+        node = self.index.get(artist_id)
+        if node is None:
+            node = len(self.ids)
+            self.index[artist_id] = node
+            self.ids.append(artist_id)
+        return node
+
+    def _build(self, edges):
+        ''' Build the CSR arrays from (from id, to id) edges. Duplicate
+        edges and self loops are dropped.
+
+        Parameters
+        ----------
+        Iterable
+            (from artist id, to artist id) pairs
+
+        Returns
+        -------
+        None
+        '''
+        pairs = set()
+        for from_id, to_id in edges:
+            if from_id != to_id:
+                pairs.add((self._intern(from_id), self._intern(to_id)))
+        self.edge_count = len(pairs)
+
+        self.out_offsets, self.out_targets = csr(len(self.ids), pairs)
+        self.in_offsets, self.in_targets = csr(len(self.ids), \
+            [(to_node, from_node) for from_node, to_node in pairs])
+        self.delta_out = {}
+        self.delta_in = {}
+        self.delta_count = 0
+
+    def add_edges(self, from_id, to_ids):
+        ''' Add edges from one artist, e.g. after save_related_artists.
+        New edges go to the side lists; the CSR arrays are rebuilt once
+        compact_threshold edges are pending.
+
+        Parameters
+        ----------
+        Str
+            Artist id
+
+        List
+            A list of related artist ids
+
+        Returns
+        -------
+        int
+            Number of new edges
+        '''
+        with self.lock:
+            from_node = self._intern(from_id)
+            added = 0
+            for to_id in to_ids:
+                to_node = self._intern(to_id)
+                if from_node == to_node or to_node in self._out(from_node):
+                    continue
+                self.delta_out.setdefault(from_node, []).append(to_node)
+                self.delta_in.setdefault(to_node, []).append(from_node)
+                added += 1
+            self.edge_count += added
+            self.delta_count += added
+
+            if self.delta_count >= compact_threshold:
+                self.compact()
+            return added
+
+    def compact(self):
+        ''' Merge pending edges into the CSR arrays.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            pairs = list(self._pairs())
+            self.out_offsets, self.out_targets = csr(len(self.ids), pairs)
+            self.in_offsets, self.in_targets = csr(len(self.ids), \
+                [(to_node, from_node) for from_node, to_node in pairs])
+            self.delta_out = {}
+            self.delta_in = {}
+            self.delta_count = 0
+
+    # ------------------------ Adjacency ------------------------
+    def _out(self, node):
+        neighbors = []
+        if node + 1 < len(self.out_offsets):
+            neighbors = self.out_targets[self.out_offsets[node]:\
+                                         self.out_offsets[node + 1]]
+        return list(neighbors) + self.delta_out.get(node, [])
+
+    def _in(self, node):
+        neighbors = []
+        if node + 1 < len(self.in_offsets):
+            neighbors = self.in_targets[self.in_offsets[node]:\
+                                        self.in_offsets[node + 1]]
+        return list(neighbors) + self.delta_in.get(node, [])
+
+    def _pairs(self):
+        for node in range(len(self.ids)):
+            for neighbor in self._out(node):
+                yield node, neighbor
+
+    def _neighbors(self, node, directed):
+        if directed:
+            return self._out(node)
+        return self._out(node) + self._in(node)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, artist_id):
+        return artist_id in self.index
+
+    def neighbors(self, artist_id):
+        ''' Get the artists related to an artist.
+
+        Parameters
+        ----------
+        Str
+            Artist id
+
+        Returns
+        -------
+        List
+            A list of artist ids
+        '''
+        with self.lock:
+            node = self.index.get(artist_id)
+            if node is None:
+                return []
+            return [self.ids[n] for n in self._out(node)]
+
+    def degree(self, artist_id):
+        ''' Get the out and in degree of an artist.
+
+        Parameters
+        ----------
+        Str
+            Artist id
+
+        Returns
+        -------
+        Tuple
+            (out degree, in degree)
+        '''
+        with self.lock:
+            node = self.index.get(artist_id)
+            if node is None:
+                return 0, 0
+            return len(self._out(node)), len(self._in(node))
+
+    # ------------------------ Traversal ------------------------
+    def k_hop(self, artist_id, k, directed=True):
+        ''' Get every artist within k hops.
+
+        Parameters
+        ----------
+        Str
+            Artist id
+
+        int
+            Maximum number of hops
+
+        bool
+            False to follow edges both ways
+
+        Returns
+        -------
+        Dict
+            Hop count by artist id, without the artist itself
+        '''
+        with self.lock:
+            start = self.index.get(artist_id)
+            if start is None:
+                return {}
+            hops = {start: 0}
+            frontier = [start]
+            for hop in range(1, k + 1):
+                next_frontier = []
+                for node in frontier:
+                    for neighbor in self._neighbors(node, directed):
+                        if neighbor not in hops:
+                            hops[neighbor] = hop
+                            next_frontier.append(neighbor)
+                frontier = next_frontier
+                if len(frontier) == 0:
+                    break
+            del hops[start]
+            return {self.ids[node]: hop for node, hop in hops.items()}
+
+    def shortest_path(self, from_id, to_id, directed=True):
+        ''' Find a shortest path between two artists with a breadth-first
+        search.
+
+        Parameters
+        ----------
+        Str
+            Artist id to start from
+
+        Str
+            Artist id to reach
+
+        bool
+            False to follow edges both ways
+
+        Returns
+        -------
+        List
+            Artist ids from from_id to to_id, None if there is no path
+        '''
+        with self.lock:
+            start = self.index.get(from_id)
+            goal = self.index.get(to_id)
+            if start is None or goal is None:
+                return None
+
+            parents = {start: None}
+            queue = deque([start])
+            while len(queue) > 0 and goal not in parents:
+                node = queue.popleft()
+                for neighbor in self._neighbors(node, directed):
+                    if neighbor not in parents:
+                        parents[neighbor] = node
+                        queue.append(neighbor)
+            if goal not in parents:
+                return None
+
+            path = []
+            node = goal
+            while node is not None:
+                path.append(self.ids[node])
+                node = parents[node]
+            return path[::-1]
+
+    # ------------------------ Whole graph ------------------------
+    def pagerank(self, damping=0.85, iterations=50, tolerance=1e-6):
+        ''' PageRank centrality: artists that many central artists list as
+        related score higher. Artists without out edges spread their
+        score evenly.
+
+        Parameters
+        ----------
+        float
+            Damping factor
+
+        int
+            Maximum number of iterations
+
+        float
+            Stop once the scores move less than this in total
+
+        Returns
+        -------
+        Dict
+            Score by artist id, summing to 1
+        '''
+        with self.lock:
+            n = len(self.ids)
+            if n == 0:
+                return {}
+            out_degree = [len(self._out(node)) for node in range(n)]
+            in_edges = [self._in(node) for node in range(n)]
+
+            scores = [1.0 / n] * n
+            for iteration in range(iterations):
+                dangling = sum(scores[node] for node in range(n) \
+                               if out_degree[node] == 0)
+                base = (1 - damping) / n + damping * dangling / n
+                shares = [scores[node] / out_degree[node] \
+                          if out_degree[node] > 0 else 0.0 \
+                          for node in range(n)]
+                new_scores = [base + damping \
+                              * sum(shares[u] for u in in_edges[node]) \
+                              for node in range(n)]
+                change = sum(abs(new_scores[node] - scores[node]) \
+                             for node in range(n))
+                scores = new_scores
+                if change < tolerance:
+                    break
+            return {self.ids[node]: scores[node] for node in range(n)}
+
+    def components(self):
+        ''' Get the weakly connected components, i.e. edge direction is
+        ignored.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        List
+            Lists of artist ids, largest component first
+        '''
+        with self.lock:
+            n = len(self.ids)
+            parent = array('l', range(n))
+
+            def find(node):
+                while parent[node] != node:
+                    parent[node] = parent[parent[node]]
+                    node = parent[node]
+                return node
+
+            for from_node, to_node in self._pairs():
+                root_a = find(from_node)
+                root_b = find(to_node)
+                if root_a != root_b:
+                    parent[root_a] = root_b
+
+            groups = {}
+            for node in range(n):
+                groups.setdefault(find(node), []).append(self.ids[node])
+            return sorted(groups.values(), key=len, reverse=True)
+
+    def stats(self):
+        ''' Get the graph size.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict
+            {'artists', 'edges', 'pending_edges'}
+        '''
+        with self.lock:
+            return {'artists': len(self.ids), 'edges': self.edge_count, \
+                    'pending_edges': self.delta_count}
+
+def csr(n, pairs):
+    ''' Build CSR arrays from (from node, to node) pairs.
+
+    Parameters
+    ----------
+    int
+        Number of nodes
+
+    Iterable
+        (from node, to node) pairs
+
+    Returns
+    -------
+    Tuple
+        (offsets of length n + 1, targets)
+    '''
+    pairs = sorted(pairs)
+    offsets = array('l', [0] * (n + 1))
+    for from_node, to_node in pairs:
+        offsets[from_node + 1] += 1
+    for node in range(n):
+        offsets[node + 1] += offsets[node]
+    targets = array('l', [to_node for from_node, to_node in pairs])
+    return offsets, targets
+
+def load_graph(accessor):
+    ''' Build the graph from the related_artist table, and keep it up to
+    date with later save_related_artists calls.
+
+    Parameters
+    ----------
+    DataAccessor
+        Local DB accessor
+
+    Returns
+    -------
+    ArtistGraph
+        The graph
+    '''
+    graph = ArtistGraph(accessor.find_related_artist_edges())
+    accessor.related_artist_listeners.append(graph.add_edges)
+    return graph
+
+
+# ------------------------ Main function ---------------------
+if __name__ == "__main__":
+    # Usage: python3 artist_graph.py [db_name]
+    from data_accessor import DataAccessor
+    db_name = 'final_pj.sqlite'
+    if len(sys.argv) > 1:
+        db_name = sys.argv[1]
+
+    accessor = DataAccessor(db_name)
+    start = time.perf_counter()
+    graph = load_graph(accessor)
+    print('Loaded ' + str(graph.stats()) + ' in ' \
+          + str(round((time.perf_counter() - start) * 1000, 1)) + ' ms')
+
+    components = graph.components()
+    print('Components: ' + str(len(components)) + ', largest has ' \
+          + str(len(components[0]) if len(components) > 0 else 0) \
+          + ' artists')
+
+    ranks = graph.pagerank()
+    top = sorted(ranks, key=ranks.get, reverse=True)[:10]
+    for artist in accessor.find_artists(top):
+        if artist is not None:
+            print(artist.artist_name + ' - ' \
+                  + str(round(ranks[artist.artist_id], 4)))
+    accessor.close()
@@ -0,0 +1,406 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import math
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Neighbors kept per artist
+default_k = 10
+
+# Weight of the popularity and follower bucket features next to genres
+bucket_weight = 0.5
+
+
+class SimilarityIndex:
+    ''' Artist similarity from sparse genre vectors. Genres are weighted by
+    inverse document frequency, optionally joined by popularity and
+    follower buckets, and each vector is L2 normalized so a dot product
+    is the cosine. The matrix is stored by column (feature -> rows and
+    weights), which is what the top-k scoring needs.
+    '''
+    def __init__(self, k=None, use_buckets=False):
+        self.k = k or default_k
+        self.use_buckets = use_buckets
+        self.lock = threading.RLock()
+        self.ids = []
+        self.index = {}
+        self.rows = []
+        self.document_frequency = {}
+        self.columns = {}
+        self.column_arrays = {}
+        self.neighbors = []
+        self.pending = {}
+
+    # ------------------------ Vectors ------------------------
+    def _features(self, artist):
+        ''' Get the raw features of an artist.
+
+        Parameters
+        ----------
+        Artist
+            Internal Artist object
+
+        Returns
+        -------
+        Dict
+            Weight by feature name before IDF and normalization
+        '''
+        features = {'genre:' + genre: 1.0 for genre in artist.genre_list()}
+        if self.use_buckets:
+            if artist.popularity is not None:
+                features['popularity:' + str(artist.popularity // 10)] = \
+                    bucket_weight
+            if artist.followers is not None and artist.followers > 0:
+                features['followers:' + str(int(math.log10(artist.followers)))] \
+                    = bucket_weight
+        return features
+
+    def _vector(self, features):
+        ''' Weight genre features by IDF and normalize.
+
+        Parameters
+        ----------
+        Dict
+            Raw features from _features
+
+        Returns
+        -------
+        Dict
+            Weight by feature name, unit length
+        '''
+        n = len(self.ids)
+        vector = {}
+        for feature, weight in features.items():
+            if feature.startswith('genre:'):
+                df = self.document_frequency.get(feature, 0)
+                weight *= math.log((1 + n) / (1 + df)) + 1
+            vector[feature] = weight
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if norm == 0:
+            return {}
+        return {feature: weight / norm for feature, weight in vector.items()}
+
+    def _column(self, feature):
+        ''' Get a feature column as NumPy arrays, cached until it changes.
+
+        Parameters
+        ----------
+        Str
+            Feature name
+
+        Returns
+        -------
+        Tuple
+            (row numbers, weights) arrays
+        '''
+        arrays = self.column_arrays.get(feature)
+        if arrays is None:
+            column = self.columns.get(feature, {})
+            arrays = (np.fromiter(column.keys(), dtype=np.int64, \
+                                  count=len(column)), \
+                      np.fromiter(column.values(), dtype=np.float64, \
+                                  count=len(column)))
+            self.column_arrays[feature] = arrays
+        return arrays
+
+    def _scores(self, vector):
+        ''' Cosine of a vector with every row.
+
+        Parameters
+        ----------
+        Dict
+            Unit vector
+
+        Returns
+        -------
+        ndarray
+            Score by row number
+        '''
+        scores = np.zeros(len(self.ids))
+        for feature, weight in vector.items():
+            rows, weights = self._column(feature)
+            scores[rows] += weight * weights
+        return scores
+
+    def _top(self, scores, row):
+        ''' Get the k best rows other than row.
+
+        Parameters
+        ----------
+        ndarray
+            Score by row number
+
+        int
+            Row number of the artist itself
+
+        Returns
+        -------
+        List
+            A list of (row number, score) tuples, best first
+        '''
+        scores[row] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > self.k:
+            best = np.argpartition(-scores[candidates], self.k - 1)[:self.k]
+            candidates = candidates[best]
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(other), float(scores[other])) for other in order]
+
+    # ------------------------ Building ------------------------
+    def build(self, artists):
+        ''' Rebuild the index and every top-k list.
+
+        Parameters
+        ----------
+        List
+            A list of internal Artist objects
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            artists = list({artist.artist_id: artist \
+                            for artist in artists}.values())
+            self.ids = [artist.artist_id for artist in artists]
+            self.index = {id: row for row, id in enumerate(self.ids)}
+            raw = [self._features(artist) for artist in artists]
+
+            self.document_frequency = {}
+            for features in raw:
+                for feature in features:
+                    self.document_frequency[feature] = \
+                        self.document_frequency.get(feature, 0) + 1
+
+            self.rows = [self._vector(features) for features in raw]
+            self.columns = {}
+            self.column_arrays = {}
+            for row, vector in enumerate(self.rows):
+                for feature, weight in vector.items():
+                    self.columns.setdefault(feature, {})[row] = weight
+
+            self.neighbors = [self._top(self._scores(self.rows[row]), row) \
+                              for row in range(len(self.ids))]
+            self.pending = {}
+
+    def add_artists(self, artists):
+        ''' Queue new or changed artists. They are applied on the next
+        query, so a burst of saves costs one update.
+
+        Parameters
+        ----------
+        List
+            A list of internal Artist objects
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            for artist in artists:
+                self.pending[artist.artist_id] = artist
+
+    def add_artist(self, artist):
+        ''' Queue one artist, the save_artist listener.
+
+        Parameters
+        ----------
+        Artist
+            Internal Artist object
+
+        Returns
+        -------
+        None
+        '''
+        self.add_artists([artist])
+
+    def _apply_pending(self):
+        ''' Insert or update queued artists. Their own top-k lists are
+        computed, and they are merged into the lists of the artists they
+        now beat. IDF weights of existing rows are kept until the next
+        build.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        if len(self.pending) == 0:
+            return
+        pending = list(self.pending.values())
+        self.pending = {}
+
+        changed = []
+        for artist in pending:
+            row = self.index.get(artist.artist_id)
+            if row is None:
+                row = len(self.ids)
+                self.index[artist.artist_id] = row
+                self.ids.append(artist.artist_id)
+                self.rows.append({})
+                self.neighbors.append([])
+
+            features = self._features(artist)
+            old_features = [feature for feature in self.rows[row]]
+            if set(old_features) == set(features) and len(features) > 0:
+                continue
+            for feature in old_features:
+                self.document_frequency[feature] -= 1
+                del self.columns[feature][row]
+                self.column_arrays.pop(feature, None)
+            for feature in features:
+                self.document_frequency[feature] = \
+                    self.document_frequency.get(feature, 0) + 1
+
+            self.rows[row] = self._vector(features)
+            for feature, weight in self.rows[row].items():
+                self.columns.setdefault(feature, {})[row] = weight
+                self.column_arrays.pop(feature, None)
+            changed.append(row)
+
+        # Rows that listed a changed artist are recomputed from scratch
+        changed_set = set(changed)
+        for other in range(len(self.ids)):
+            if other not in changed_set and any(neighbor in changed_set \
+                    for neighbor, score in self.neighbors[other]):
+                self.neighbors[other] = self._top(\
+                    self._scores(self.rows[other]), other)
+
+        for row in changed:
+            scores = self._scores(self.rows[row])
+            self.neighbors[row] = self._top(scores.copy(), row)
+            for other in np.flatnonzero(scores > 0):
+                other = int(other)
+                if other in changed_set:
+                    continue
+                self._offer(other, row, float(scores[other]))
+
+    def _offer(self, row, candidate, score):
+        ''' Put candidate into the top-k list of row if it beats the worst.
+
+        Parameters
+        ----------
+        int
+            Row number whose list is updated
+
+        int
+            Candidate row number
+
+        float
+            Cosine between them
+
+        Returns
+        -------
+        None
+        '''
+        neighbors = [item for item in self.neighbors[row] \
+                     if item[0] != candidate]
+        if len(neighbors) >= self.k and score <= neighbors[-1][1]:
+            return
+        neighbors.append((candidate, score))
+        neighbors.sort(key=lambda item: -item[1])
+        self.neighbors[row] = neighbors[:self.k]
+
+    # ------------------------ Queries ------------------------
+    def similar(self, artist_id, k=None):
+        ''' Get the most similar artists.
+
+        Parameters
+        ----------
+        Str
+            Artist id
+
+        int
+            Number of artists, at most the index k
+
+        Returns
+        -------
+        List
+            A list of (artist id, cosine) tuples, most similar first
+        '''
+        with self.lock:
+            self._apply_pending()
+            row = self.index.get(artist_id)
+            if row is None:
+                return []
+            return [(self.ids[other], score) for other, score \
+                    in self.neighbors[row][:k or self.k]]
+
+    def similar_to_genres(self, genres, k=None):
+        ''' Get the artists closest to a list of genres.
+
+        Parameters
+        ----------
+        List
+            A list of genre names
+
+        int
+            Number of artists
+
+        Returns
+        -------
+        List
+            A list of (artist id, cosine) tuples, most similar first
+        '''
+        with self.lock:
+            self._apply_pending()
+            vector = self._vector({'genre:' + genre: 1.0 for genre in genres})
+            scores = self._scores(vector)
+            order = np.argsort(-scores, kind='stable')[:k or self.k]
+            return [(self.ids[row], float(scores[row])) for row in order \
+                    if scores[row] > 0]
+
+def load_index(accessor, k=None, use_buckets=False):
+    ''' Build the index from every cached artist, and keep it up to date
+    with later save_artist calls.
+
+    Parameters
+    ----------
+    DataAccessor
+        Local DB accessor
+
+    int
+        Neighbors kept per artist
+
+    bool
+        True to add popularity and follower buckets
+
+    Returns
+    -------
+    SimilarityIndex
+        The index
+    '''
+    index = SimilarityIndex(k, use_buckets)
+    index.build(accessor.find_all_artists())
+    accessor.artist_listeners.append(index.add_artist)
+    return index
+
+
+# ------------------------ Main function ---------------------
+if __name__ == "__main__":
+    # Usage: python3 artist_similarity.py [db_name] [artist_id]
+    from data_accessor import DataAccessor
+    db_name = 'final_pj.sqlite'
+    if len(sys.argv) > 1:
+        db_name = sys.argv[1]
+
+    accessor = DataAccessor(db_name)
+    start = time.perf_counter()
+    index = load_index(accessor)
+    print('Indexed ' + str(len(index.ids)) + ' artists in ' \
+          + str(round((time.perf_counter() - start) * 1000, 1)) + ' ms')
+
+    if len(sys.argv) > 2:
+        for artist_id, score in index.similar(sys.argv[2]):
+            print(accessor.find_artist(artist_id).artist_name + ' - ' \
+                  + str(round(score, 3)))
+    accessor.close()
@@ -0,0 +1,750 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import asyncio
+import base64
+import time
+from urllib.parse import urlencode
+
+import aiohttp
+import spotipy
+from oauthlib.oauth1 import Client as OAuth1Client
+from yarl import URL
+
+import spotify_cli
+from spotify_cli import local_db_accessor
+from single_flight import SingleFlight
+
+# Base URLs, point them at a local stub server for offline testing
+spotify_api_url = 'https://api.spotify.com/v1'
+spotify_token_url = 'https://accounts.spotify.com/api/token'
+twitter_api_url = 'https://api.twitter.com/1.1'
+
+# Connection pool size and the cap of in-flight requests
+pool_size = 32
+max_in_flight = 16
+keepalive_timeout = 30
+request_timeout = 30
+
+# Concurrent misses for the same (entity type, id) share one fetch
+inflight = SingleFlight()
+
+# DB writes run on worker threads with asyncio.to_thread, so a commit never
+# blocks the event loop. A batch is per thread, so each one is opened and
+# committed inside a single to_thread call.
+
+
+# ------------------------ Clients ------------------------
+class AsyncSpotifyClient:
+    ''' Spotify Web API client over a shared aiohttp session, with the
+    client credentials flow
+    '''
+    def __init__(self, session, semaphore, client_id, client_secret, \
+                 base_url=None, token_url=None, scheduler=None):
+        self.session = session
+        self.semaphore = semaphore
+        self.scheduler = scheduler or spotify_cli.spotify_scheduler
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url or spotify_api_url
+        self.token_url = token_url or spotify_token_url
+
+        self.token = None
+        self.token_expires_on = 0
+        self.token_lock = asyncio.Lock()
+
+    async def _access_token(self, refresh=False):
+        ''' Get a bearer token, requesting a new one when it is about to
+        expire. Concurrent callers share one token request.
+
+        Parameters
+        ----------
+        bool
+            True to drop the current token, e.g. after a 401
+
+        Returns
+        -------
+        Str
+            Access token
+        '''
+        async with self.token_lock:
+            if refresh or time.time() > self.token_expires_on - 60:
+                credentials = base64.b64encode((self.client_id + ':' \
+                    + self.client_secret).encode()).decode()
+                async with self.semaphore:
+                    async with self.session.post(self.token_url, \
+                            data={'grant_type': 'client_credentials'}, \
+                            headers={'Authorization': 'Basic ' \
+                                     + credentials}) as response:
+                        response.raise_for_status()
+                        result = await response.json()
+                self.token = result['access_token']
+                self.token_expires_on = time.time() + result['expires_in']
+            return self.token
+
+    async def get(self, url, params=None):
+        ''' GET a Spotify endpoint through the scheduler. Errors are raised
+        as SpotifyException so they are classified like spotipy ones.
+
+        Parameters
+        ----------
+        Str
+            Path under base_url, or a full URL such as a next cursor
+
+        Dict
+            Query parameters
+
+        Returns
+        -------
+        Dict
+            Decoded JSON response
+        '''
+        if not url.startswith('http'):
+            url = self.base_url + url
+
+        async def request():
+            for attempt in range(2):
+                token = await self._access_token(refresh=attempt > 0)
+                async with self.semaphore:
+                    async with self.session.get(url, params=params, headers=\
+                            {'Authorization': 'Bearer ' + token}) as response:
+                        if response.status == 401 and attempt == 0:
+                            continue
+                        if response.status >= 400:
+                            raise spotipy.SpotifyException(response.status, \
+                                -1, url + ': ' + await response.text(), \
+                                headers=dict(response.headers))
+                        return await response.json()
+
+        return await self.scheduler.call_async(request)
+
+    async def artist(self, artist_id):
+        return await self.get('/artists/' + artist_id)
+
+    async def artists(self, artist_ids):
+        return await self.get('/artists', {'ids': ','.join(artist_ids)})
+
+    async def track(self, track_id):
+        return await self.get('/tracks/' + track_id)
+
+    async def tracks(self, track_ids):
+        return await self.get('/tracks', {'ids': ','.join(track_ids)})
+
+    async def artist_related_artists(self, artist_id):
+        return await self.get('/artists/' + artist_id + '/related-artists')
+
+    async def playlist(self, playlist_id):
+        return await self.get('/playlists/' + playlist_id, \
+                              {'additional_types': 'track'})
+
+    async def playlist_items(self, playlist_id, limit=100, offset=0):
+        return await self.get('/playlists/' + playlist_id + '/tracks', \
+                              {'limit': limit, 'offset': offset, \
+                               'additional_types': 'track'})
+
+class AsyncTwitterClient:
+    ''' Twitter API v1.1 client over a shared aiohttp session, signing
+    requests with OAuth 1.0a
+    '''
+    def __init__(self, session, semaphore, client_key, client_secret, \
+                 access_token, access_token_secret, base_url=None, \
+                 scheduler=None):
+        self.session = session
+        self.semaphore = semaphore
+        self.scheduler = scheduler or spotify_cli.twitter_scheduler
+        self.oauth = OAuth1Client(client_key, client_secret=client_secret, \
+                                  resource_owner_key=access_token, \
+                                  resource_owner_secret=access_token_secret)
+        self.base_url = base_url or twitter_api_url
+
+    async def get(self, path, params):
+        ''' Signed GET of a Twitter endpoint through the scheduler.
+
+        Parameters
+        ----------
+        Str
+            Path under base_url
+
+        Dict
+            Query parameters
+
+        Returns
+        -------
+        Dict
+            Decoded JSON response
+        '''
+        async def request():
+            # The signature covers the query string, so the URL is sent as
+            # is. Every attempt gets a fresh nonce.
+            uri, headers, body = self.oauth.sign(self.base_url + path + '?' \
+                                                 + urlencode(params))
+            async with self.semaphore:
+                async with self.session.get(URL(uri, encoded=True), \
+                                            headers=headers) as response:
+                    response.raise_for_status()
+                    return await response.json()
+
+        return await self.scheduler.call_async(request)
+
+    async def search_tweets(self, keyword, count=100, since_id=None, \
+                            max_id=None):
+        params = {'q': keyword, 'count': count}
+        if since_id is not None:
+            params['since_id'] = since_id
+        if max_id is not None:
+            params['max_id'] = max_id
+        return await self.get('/search/tweets.json', params)
+
+class AsyncClients:
+    ''' Spotify and Twitter clients sharing one pooled keep-alive session
+    and one in-flight request cap. Use as an async context manager.
+    '''
+    def __init__(self, spotify_base_url=None, spotify_token_url=None, \
+                 twitter_base_url=None, max_requests=None):
+        self.spotify_base_url = spotify_base_url
+        self.spotify_token_url = spotify_token_url
+        self.twitter_base_url = twitter_base_url
+        self.max_requests = max_requests or max_in_flight
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=pool_size, \
+                                         keepalive_timeout=keepalive_timeout)
+        self.session = aiohttp.ClientSession(connector=connector, \
+            timeout=aiohttp.ClientTimeout(total=request_timeout))
+        semaphore = asyncio.Semaphore(self.max_requests)
+
+        self.spotify = AsyncSpotifyClient(self.session, semaphore, \
+            spotify_cli.spotify_client_id, spotify_cli.spotify_client_secret, \
+            self.spotify_base_url, self.spotify_token_url)
+        self.twitter = AsyncTwitterClient(self.session, semaphore, \
+            spotify_cli.twitter_client_key, spotify_cli.twitter_client_secret, \
+            spotify_cli.twitter_access_token, \
+            spotify_cli.twitter_access_token_secret, self.twitter_base_url)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+
+
+# ------------------------ Negative cache ------------------------
+async def fetch_unless_known_missing(entity_type, entity_id, fetch):
+    ''' Async counterpart of spotify_cli.fetch_unless_known_missing.
+
+    Parameters
+    ----------
+    Str
+        Entity type
+
+    Str
+        Entity id
+
+    Function
+        Coroutine function fetching and saving the entity, taking the id
+
+    Returns
+    -------
+    Object
+        The fetched object
+    '''
+    negative = local_db_accessor.find_negative(entity_type, entity_id)
+    if spotify_cli.is_known_missing(negative):
+        print('Negative cache hit - ' + entity_type)
+        raise spotify_cli.CachedLookupError(entity_type, entity_id, \
+                                            negative[0], negative[1])
+
+    try:
+        return await fetch(entity_id)
+    except Exception as e:
+        reason = 'failed'
+        if spotify_cli.is_missing_error(e):
+            reason = 'missing'
+        await asyncio.to_thread(local_db_accessor.save_negative, \
+                                entity_type, entity_id, reason, \
+                                type(e).__name__)
+        raise
+
+async def fetch_once(entity_type, entity_id, fetch):
+    ''' Async counterpart of spotify_cli.fetch_once.
+
+    Parameters
+    ----------
+    Str
+        Entity type
+
+    Str
+        Entity id
+
+    Function
+        Coroutine function fetching and saving the entity, taking the id
+
+    Returns
+    -------
+    Object
+        The fetched object
+    '''
+    async def run():
+        return await fetch_unless_known_missing(entity_type, entity_id, fetch)
+    return await inflight.do_async((entity_type, entity_id), run)
+
+
+
+# ------------------------ Fetch functions ------------------------
+async def fetch_in_batches(entity_type, ids, endpoint):
+    ''' Call a multi-id endpoint for up to spotify_batch_size ids at a
+    time, all chunks concurrently, and record ids that could not be
+    fetched in the negative cache.
+
+    Parameters
+    ----------
+    Str
+        Entity type
+
+    List
+        A list of ids
+
+    Function
+        Coroutine function taking a list of ids, returning the list of
+        Spotify objects
+
+    Returns
+    -------
+    Dict
+        Spotify objects by id
+    '''
+    ids = list(dict.fromkeys(ids))
+    chunks = [ids[start:start + spotify_cli.spotify_batch_size] for start \
+              in range(0, len(ids), spotify_cli.spotify_batch_size)]
+    results = await asyncio.gather(*[endpoint(chunk) for chunk in chunks], \
+                                   return_exceptions=True)
+
+    spotify_objects = {}
+    negatives = []
+    for chunk, result in zip(chunks, results):
+        if isinstance(result, Exception):
+            negatives.extend([(id, 'failed', type(result).__name__) \
+                              for id in chunk])
+            continue
+
+        for id, spotify_object in zip(chunk, result):
+            if spotify_object is None:
+                negatives.append((id, 'missing', 'NotFound'))
+            else:
+                spotify_objects[id] = spotify_object
+
+    def save_negatives():
+        with local_db_accessor.batch():
+            for id, reason, error in negatives:
+                local_db_accessor.save_negative(entity_type, id, reason, \
+                                                error)
+
+    if len(negatives) > 0:
+        await asyncio.to_thread(save_negatives)
+    return spotify_objects
+
+async def hydrate_tracks(clients, track_objects):
+    ''' Async counterpart of spotify_cli.hydrate_tracks.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    List
+        A list of Spotify track objects
+
+    Returns
+    -------
+    List
+        A list of internal Track objects in input order
+    '''
+    track_objects = [track_object for track_object in track_objects \
+                     if track_object is not None \
+                     and track_object['id'] is not None \
+                     and track_object.get('type', 'track') == 'track']
+
+    artist_ids = [artist_object['id'] for track_object in track_objects \
+                  for artist_object in track_object['artists'] \
+                  if artist_object['id'] is not None]
+    artists = {}
+    for artist in await get_artists(clients, list(dict.fromkeys(artist_ids))):
+        artists[artist.artist_id] = artist
+
+    def save_tracks():
+        tracks = []
+        with local_db_accessor.batch():
+            for track_object in track_objects:
+                tracks.append(local_db_accessor.save_track(spotify_cli\
+                    .convert_spotify_track_object(track_object, artists)))
+        return tracks
+
+    return await asyncio.to_thread(save_tracks)
+
+async def fetch_artist(clients, artist_id):
+    ''' Fetch artist from Spotify and save it.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    Str
+        A spotify artist ID
+
+    Returns
+    -------
+    Artist
+        Internal Artist object
+    '''
+    artist = spotify_cli.convert_spotify_artist_object(\
+        await clients.spotify.artist(artist_id))
+    return await asyncio.to_thread(local_db_accessor.save_artist, artist)
+
+async def fetch_track(clients, track_id):
+    ''' Fetch track from Spotify and save it.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    Str
+        A spotify track ID
+
+    Returns
+    -------
+    Track
+        Internal Track object
+    '''
+    tracks = await hydrate_tracks(clients, \
+                                  [await clients.spotify.track(track_id)])
+    return tracks[0]
+
+async def fetch_playlist(clients, playlist_id):
+    ''' Fetch playlist from Spotify with all its pages, several pages at a
+    time, and save it. The saved tracks are replaced by the fresh ones in
+    one transaction.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    Str
+        A spotify playlist ID
+
+    Returns
+    -------
+    Playlist
+        Internal Playlist object
+    '''
+    playlist_object = await clients.spotify.playlist(playlist_id)
+    tracks = await hydrate_tracks(clients, [item['track'] for item \
+                                            in playlist_object['tracks']['items']])
+    playlist = spotify_cli.convert_spotify_playlist_object(playlist_object, \
+                                                           tracks)
+
+    paging = playlist_object['tracks']
+    if paging['next'] is None:
+        await asyncio.to_thread(local_db_accessor.save_playlist, playlist)
+        return playlist
+
+    async def fetch_page(page):
+        tracks = await hydrate_tracks(clients, [item['track'] for item \
+                                                in page['items']])
+        return [track.track_id for track in tracks], page['next']
+
+    async def fetch_page_at(offset):
+        return await fetch_page(await clients.spotify.playlist_items(\
+            playlist_id, spotify_cli.playlist_page_size, offset))
+
+    offsets = list(range(paging['offset'] + paging['limit'], \
+                         paging['total'], spotify_cli.playlist_page_size))
+    print('Loading ' + str(len(offsets)) + ' more playlist pages...')
+    results = await asyncio.gather(*[fetch_page_at(offset) for offset \
+                                     in offsets], return_exceptions=True)
+    pages = []
+    complete = True
+    for offset, result in zip(offsets, results):
+        if isinstance(result, Exception):
+            print('Playlist page failed - offset ' + str(offset) + ': ' \
+                  + str(result))
+            complete = False
+        else:
+            pages.append(result[0])
+
+    # The playlist grew after the first page was read
+    next_url = None
+    if len(results) > 0 and not isinstance(results[-1], Exception):
+        next_url = results[-1][1]
+    while next_url is not None:
+        track_ids, next_url = await fetch_page(\
+            await clients.spotify.get(next_url))
+        pages.append(track_ids)
+
+    # Without every page the fresh set is unknown, so nothing is removed
+    def save_pages():
+        with local_db_accessor.batch():
+            local_db_accessor.save_playlist(playlist, replace_tracks=complete)
+            for track_ids in pages:
+                local_db_accessor.save_playlist_tracks(playlist_id, track_ids)
+
+    await asyncio.to_thread(save_pages)
+    return local_db_accessor.find_playlist(playlist_id)
+
+async def ingest_tweets(clients, track, max_pages=None):
+    ''' Async counterpart of spotify_cli.ingest_tweets.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    Track
+        Internal Track object
+
+    int
+        Page budget, spotify_cli.tweet_page_budget if not given
+
+    Returns
+    -------
+    int
+        Number of tweets ingested
+    '''
+    if max_pages is None:
+        max_pages = spotify_cli.tweet_page_budget
+    walk = spotify_cli.start_tweet_walk(track)
+    for page in range(max_pages):
+        response = await clients.twitter.search_tweets(track.track_name, \
+            spotify_cli.tweet_page_size, walk['since_id'], walk['max_id'])
+        if not await asyncio.to_thread(spotify_cli.save_tweet_page, track, \
+                                       response['statuses'], walk):
+            break
+    return await asyncio.to_thread(spotify_cli.finish_tweet_walk, track, walk)
+
+
+
+# ------------------------ Get functions ------------------------
+async def get_artist(clients, artist_id):
+    ''' Get artist. Stale hits are refreshed by spotify_cli's background
+    refresh.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    Str
+        A spotify artist ID
+
+    Returns
+    -------
+    Artist
+        Internal Artist object
+    '''
+    result = local_db_accessor.find_artist(artist_id)
+    if result is not None:
+        return spotify_cli.serve_cached('artist', result, artist_id, \
+                                        spotify_cli.fetch_artist)
+    print('Cache miss - artist')
+    return await fetch_once('artist', artist_id, \
+                            lambda id: fetch_artist(clients, id))
+
+async def get_artists(clients, artist_ids):
+    ''' Get many artists. Only the misses go to Spotify, all chunks
+    concurrently. Artists that cannot be fetched are left out.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    List
+        A list of spotify artist IDs
+
+    Returns
+    -------
+    List
+        A list of internal Artist objects in input order
+    '''
+    artists = local_db_accessor.find_artists(artist_ids)
+    misses = [artist_ids[i] for i in range(len(artists)) \
+              if artists[i] is None]
+
+    negatives = local_db_accessor.find_negatives('artist', misses)
+    misses = [id for id in misses \
+              if not spotify_cli.is_known_missing(negatives.get(id))]
+    if len(misses) > 0:
+        print('Cache miss - ' + str(len(misses)) + ' artists')
+
+    async def artists_endpoint(ids):
+        return (await clients.spotify.artists(ids))['artists']
+
+    # Artists other coroutines are already fetching are waited for
+    async def fetch_claimed(keys):
+        spotify_objects = await fetch_in_batches('artist', \
+            [key[1] for key in keys], artists_endpoint)
+        artists = await asyncio.to_thread(spotify_cli.hydrate_artists, \
+                                          list(spotify_objects.values()))
+        return {('artist', artist.artist_id): artist for artist in artists}
+
+    results = await inflight.do_many_async([('artist', id) for id in misses], \
+                                           fetch_claimed, return_exceptions=True)
+    fetched = {key[1]: results[key] for key in results \
+               if results[key] is not None \
+               and not isinstance(results[key], Exception)}
+
+    stale = []
+    for i in range(len(artists)):
+        if artists[i] is None:
+            artists[i] = fetched.get(artist_ids[i])
+        elif spotify_cli.is_stale('artist', artists[i].fetched_on):
+            stale.append(artist_ids[i])
+    spotify_cli.refresh_many_in_background('artist', stale, \
+                                           spotify_cli.fetch_artists)
+    return [artist for artist in artists if artist is not None]
+
+async def get_track(clients, track_id):
+    ''' Get track.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    Str
+        A spotify track ID
+
+    Returns
+    -------
+    Track
+        Internal Track object
+    '''
+    result = local_db_accessor.find_track(track_id)
+    if result is not None:
+        return spotify_cli.serve_cached('track', result, track_id, \
+                                        spotify_cli.fetch_track)
+    print('Cache miss - track')
+    return await fetch_once('track', track_id, \
+                            lambda id: fetch_track(clients, id))
+
+async def get_playlist(clients, playlist_id):
+    ''' Get playlist.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    Str
+        A spotify playlist ID
+
+    Returns
+    -------
+    Playlist
+        Internal Playlist object
+    '''
+    result = local_db_accessor.find_playlist(playlist_id)
+    if result is not None:
+        return spotify_cli.serve_cached('playlist', result, playlist_id, \
+                                        spotify_cli.fetch_playlist)
+    print('Cache miss - playlist')
+    return await fetch_once('playlist', playlist_id, \
+                            lambda id: fetch_playlist(clients, id))
+
+async def get_related_artists(clients, artist_id):
+    ''' Get related artists to artist_id.
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    Str
+        A spotify artist ID
+
+    Returns
+    -------
+    List
+        A list of internal Artist objects
+    '''
+    await get_artist(clients, artist_id)
+    result = local_db_accessor.find_related_artists(artist_id)
+    if result is not None:
+        print('Cache hit - related artists')
+        return result
+
+    print('Cache miss - related artists')
+    spotify_result = await clients.spotify.artist_related_artists(artist_id)
+
+    def save_related():
+        with local_db_accessor.batch():
+            artists = spotify_cli.hydrate_artists(spotify_result['artists'])
+            local_db_accessor.save_related_artists(artist_id, artists)
+        return artists
+
+    return await asyncio.to_thread(save_related)
+
+async def get_twitters_by_track(clients, track, limit=100):
+    ''' Get a list of twitter posts by track name
+
+    Parameters
+    ----------
+    AsyncClients
+        Open clients
+
+    Track
+        Internal Track object
+
+    int
+        A number representing the limit of number of posts
+
+    Returns
+    -------
+    List
+        A list of internal Twitter objects, newest first
+    '''
+    cursor = local_db_accessor.find_tweet_cursor(track.track_id)
+    if cursor is not None:
+        if spotify_cli.is_stale('tweets', cursor[1]):
+            print('Cache hit (stale, refreshing) - twitters by track')
+            spotify_cli.refresh_in_background('tweets', track.track_id, \
+                lambda id: spotify_cli.ingest_tweets(track))
+        else:
+            print('Cache hit - twitters by track')
+    else:
+        print('Cache miss - twitters by track')
+        await inflight.do_async(('tweets', track.track_id), \
+                                lambda: ingest_tweets(clients, track))
+
+    result = local_db_accessor.find_twitters_by_track(track)
+    if result is None:
+        return []
+    return result[:limit]
+
+def run(get_function, *args, **client_options):
+    ''' Run one async get function with freshly opened clients.
+
+    Parameters
+    ----------
+    Function
+        One of the async get functions of this module
+
+    Tuple
+        Its arguments after clients
+
+    Dict
+        AsyncClients options, e.g. spotify_base_url
+
+    Returns
+    -------
+    Object
+        What the get function returns
+    '''
+    async def main():
+        async with AsyncClients(**client_options) as clients:
+            return await get_function(clients, *args)
+    return asyncio.run(main())
@@ -0,0 +1,166 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import sys
+
+from aiohttp import web
+
+# Default port, matching the stub URLs in the README
+default_port = 8765
+
+# Items of every stub playlist and tweets matching every stub search
+playlist_length = 250
+tweet_count = 150
+
+
+# ------------------------ Payloads ------------------------
+def artist_object(artist_id):
+    ''' Build a full Spotify artist object.
+
+    Parameters
+    ----------
+    Str
+        Artist id
+
+    Returns
+    -------
+    Dict
+        Spotify artist object
+    '''
+    return {'id': artist_id, 'name': 'Artist ' + artist_id, \
+            'genres': ['pop', 'genre ' + artist_id[-1]], \
+            'followers': {'total': 100}, 'popularity': 50, \
+            'external_urls': {'spotify': 'https://open.spotify.com/artist/' \
+                              + artist_id}, \
+            'type': 'artist'}
+
+def track_object(track_id):
+    ''' Build a Spotify track object with simplified artists.
+
+    Parameters
+    ----------
+    Str
+        Track id
+
+    Returns
+    -------
+    Dict
+        Spotify track object
+    '''
+    artists = [{'id': 'a' + track_id[-1], 'type': 'artist'}, \
+               {'id': 'b' + track_id[-2:], 'type': 'artist'}]
+    return {'id': track_id, 'name': 'Track ' + track_id, \
+            'duration_ms': 200000, 'popularity': 40, \
+            'external_urls': {'spotify': 'https://open.spotify.com/track/' \
+                              + track_id}, \
+            'artists': artists, 'type': 'track'}
+
+def playlist_page(request, playlist_id, limit, offset):
+    ''' Build a paging object of playlist items.
+
+    Parameters
+    ----------
+    Request
+        The aiohttp request, used for the next URL
+
+    Str
+        Playlist id
+
+    int
+        Page size
+
+    int
+        Offset of the first item
+
+    Returns
+    -------
+    Dict
+        Spotify paging object
+    '''
+    items = [{'track': track_object(playlist_id + '%05d' % position)} \
+             for position in range(offset, \
+                                   min(playlist_length, offset + limit))]
+    next_url = None
+    if offset + limit < playlist_length:
+        next_url = str(request.url.with_path('/v1/playlists/' + playlist_id \
+            + '/tracks').with_query({'limit': limit, \
+                                     'offset': offset + limit}))
+    return {'items': items, 'total': playlist_length, 'limit': limit, \
+            'offset': offset, 'next': next_url}
+
+
+
+# ------------------------ Handlers ------------------------
+async def token(request):
+    return web.json_response({'access_token': 'stub-token', \
+                              'token_type': 'Bearer', 'expires_in': 3600})
+
+async def artist(request):
+    return web.json_response(artist_object(request.match_info['id']))
+
+async def artists(request):
+    return web.json_response({'artists': [artist_object(id) for id \
+                              in request.query['ids'].split(',')]})
+
+async def playlist(request):
+    playlist_id = request.match_info['id']
+    return web.json_response({'id': playlist_id, \
+        'name': 'Playlist ' + playlist_id, 'owner': {'id': 'stub'}, \
+        'description': 'Stub playlist', 'followers': {'total': 1}, \
+        'external_urls': {'spotify': 'https://open.spotify.com/playlist/' \
+                          + playlist_id}, \
+        'tracks': playlist_page(request, playlist_id, 100, 0)})
+
+async def playlist_items(request):
+    return web.json_response(playlist_page(request, \
+        request.match_info['id'], int(request.query.get('limit', 100)), \
+        int(request.query.get('offset', 0))))
+
+async def search_tweets(request):
+    ''' Tweets with ids 1 to tweet_count, newest first, filtered by
+    since_id and max_id like the real search.
+    '''
+    if not request.headers.get('Authorization', '').startswith('OAuth '):
+        return web.json_response({'errors': []}, status=401)
+    newest = tweet_count
+    if 'max_id' in request.query:
+        newest = min(newest, int(request.query['max_id']))
+    oldest = int(request.query.get('since_id', 0)) + 1
+    ids = list(range(newest, oldest - 1, -1))[:int(request.query['count'])]
+    return web.json_response({'statuses': [{'id_str': str(id), \
+        'user': {'name': 'user' + str(id), 'url': None}, \
+        'text': request.query['q'] + ' ' + str(id), \
+        'created_at': 'Mon Jan 01 00:00:00 +0000 2024'} for id in ids]})
+
+def make_app():
+    ''' Build the stub app: the token endpoint, Spotify artists and
+    playlists under /v1 and Twitter search under /1.1.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    Application
+        The aiohttp application
+    '''
+    app = web.Application()
+    app.router.add_post('/token', token)
+    app.router.add_get('/v1/artists', artists)
+    app.router.add_get('/v1/artists/{id}', artist)
+    app.router.add_get('/v1/playlists/{id}', playlist)
+    app.router.add_get('/v1/playlists/{id}/tracks', playlist_items)
+    app.router.add_get('/1.1/search/tweets.json', search_tweets)
+    return app
+
+
+# ------------------------ Main function ---------------------
+if __name__ == "__main__":
+    # Usage: python3 async_stub_server.py [port]
+    port = default_port
+    if len(sys.argv) > 1:
+        port = int(sys.argv[1])
+    web.run_app(make_app(), host='127.0.0.1', port=port)
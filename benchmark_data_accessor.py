@@ -0,0 +1,117 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import os
+import sys
+import tempfile
+import time
+
+from data_accessor import DataAccessor
+
+# Our own objects
+from spotify_objects import Artist
+from spotify_objects import Track
+
+
+# ------------------------ Helper functions ------------------------
+def create_accessor(db_name):
+    ''' Create an empty database with our schema. DataAccessor applies
+    the migrations on open.
+
+    Parameters
+    ----------
+    Str
+        Database file name
+
+    Returns
+    -------
+    DataAccessor
+        Accessor over the new database
+    '''
+    return DataAccessor(db_name)
+
+def synthetic_tracks(n_tracks, n_artists):
+    ''' Build synthetic tracks with two artists each.
+
+    Parameters
+    ----------
+    int
+        Number of tracks
+
+    int
+        Number of distinct artists
+
+    Returns
+    -------
+    Tuple
+        A list of internal Artist objects and a list of Track objects
+    '''
+    artists = []
+    for i in range(n_artists):
+        artists.append(Artist('artist' + str(i), 'Artist ' + str(i), \
+                              'pop, rock', i, i % 100, 'https://example/a'))
+
+    tracks = []
+    for i in range(n_tracks):
+        track = Track('track' + str(i), 'Track ' + str(i), 180000, i % 100, \
+                      'https://example/t')
+        track.artists.append(artists[i % n_artists])
+        track.artists.append(artists[(i * 7 + 1) % n_artists])
+        if track.artists[0] is track.artists[1]:
+            track.artists.pop()
+        tracks.append(track)
+    return artists, tracks
+
+def run(n_tracks, batched):
+    ''' Time an ingest of n_tracks tracks into a fresh database.
+
+    Parameters
+    ----------
+    int
+        Number of tracks
+
+    bool
+        True to use DataAccessor.batch(), False to commit per save
+
+    Returns
+    -------
+    float
+        Rows written per second
+    '''
+    artists, tracks = synthetic_tracks(n_tracks, max(1, n_tracks // 10))
+    rows = len(artists) + len(tracks) \
+         + sum(len(track.artists) for track in tracks)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        accessor = create_accessor(os.path.join(tmp_dir, 'bench.sqlite'))
+        start = time.perf_counter()
+        if batched:
+            with accessor.batch():
+                accessor.save_artists(artists)
+                accessor.save_tracks(tracks)
+        else:
+            for artist in artists:
+                accessor.save_artist(artist)
+            for track in tracks:
+                accessor.save_track(track)
+        elapsed = time.perf_counter() - start
+        accessor.close()
+
+    return rows / elapsed
+
+
+# ------------------------ Main function ---------------------
+if __name__ == "__main__":
+    # Usage: python3 benchmark_data_accessor.py [n_tracks]
+    n_tracks = 100000
+    if len(sys.argv) > 1:
+        n_tracks = int(sys.argv[1])
+
+    print('Ingesting ' + str(n_tracks) + ' synthetic tracks...')
+    per_row = run(n_tracks, False)
+    print('Commit per save: ' + str(int(per_row)) + ' rows/sec')
+    batched = run(n_tracks, True)
+    print('Batched:         ' + str(int(batched)) + ' rows/sec')
+    print('Speedup:         ' + str(round(batched / per_row, 1)) + 'x')
@@ -0,0 +1,561 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Neighbors kept per track or artist. Memory is about 8 * k bytes per row.
+default_k = 10
+
+# Long playlists are cut into windows of this many consecutive tracks, so
+# one 10,000 track playlist does not add 50 million pairs
+max_window = 500
+
+# Pairs counted before they are merged into the running totals
+pair_batch_size = 5000000
+
+# Pairs counted per block of rows. Each block is pruned to the top k before
+# the next one is counted, so build memory grows with this, not with the
+# number of distinct pairs.
+pair_block_size = 20000000
+
+
+class CooccurrenceMatrix:
+    ''' Sparse symmetric co-occurrence counts, pruned to the k most frequent
+    neighbors per row. Rows are kept as two (rows x k) NumPy arrays of
+    neighbor row numbers (-1 for empty slots) and counts, best first.
+    '''
+    def __init__(self, k=None, window=None):
+        self.k = k or default_k
+        self.window = window or max_window
+        self.ids = []
+        self.index = {}
+        self.neighbors = np.full((0, self.k), -1, dtype=np.int32)
+        self.counts = np.zeros((0, self.k), dtype=np.int32)
+
+    # ------------------------ Rows ------------------------
+    def _intern(self, item_id):
+        ''' Get the row number of an id, adding a row if needed.
+
+        Parameters
+        ----------
+        Str
+            Track or artist id
+
+        Returns
+        -------
+        int
+            Row number
+        '''
+        row = self.index.get(item_id)
+        if row is None:
+            row = len(self.ids)
+            self.index[item_id] = row
+            self.ids.append(item_id)
+        return row
+
+    def _grow(self):
+        ''' Make room in the arrays for every interned id, doubling their
+        size so appends stay cheap.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        size = len(self.neighbors)
+        if size >= len(self.ids):
+            return
+        size = max(len(self.ids), size * 2)
+        neighbors = np.full((size, self.k), -1, dtype=np.int32)
+        counts = np.zeros((size, self.k), dtype=np.int32)
+        neighbors[:len(self.neighbors)] = self.neighbors
+        counts[:len(self.counts)] = self.counts
+        self.neighbors = neighbors
+        self.counts = counts
+
+    # ------------------------ Building ------------------------
+    def _pair_count(self, starts):
+        ''' Count the pairs of every window of every group, both ways,
+        duplicates included.
+
+        Parameters
+        ----------
+        ndarray
+            Start offset of each group in rows, plus len(rows)
+
+        Returns
+        -------
+        int
+            Number of pairs
+        '''
+        sizes = np.diff(starts)
+        full, rest = sizes // self.window, sizes % self.window
+        return int(np.sum(full * self.window * (self.window - 1) \
+                          + rest * (rest - 1)))
+
+    def _pairs(self, rows, starts, low, high):
+        ''' Get the row pairs of every window of every group, both ways,
+        whose first row is in [low, high).
+
+        Parameters
+        ----------
+        ndarray
+            Row numbers, grouped
+
+        ndarray
+            Start offset of each group in rows, plus len(rows)
+
+        int
+            First row of the block
+
+        int
+            Row after the last row of the block
+
+        Returns
+        -------
+        Generator
+            ndarray batches of pair keys, row * n + other row
+        '''
+        n = len(self.ids)
+        triangles = {}
+        batch = []
+        batch_size = 0
+        for group in range(len(starts) - 1):
+            for start in range(starts[group], starts[group + 1], self.window):
+                members = rows[start:min(start + self.window, \
+                                         starts[group + 1])]
+                size = len(members)
+                if size < 2:
+                    continue
+                if size not in triangles:
+                    triangles[size] = np.triu_indices(size, 1)
+                first, second = triangles[size]
+                a = members[first].astype(np.int64)
+                b = members[second].astype(np.int64)
+                distinct = a != b
+                a, b = a[distinct], b[distinct]
+                forward = (a >= low) & (a < high)
+                backward = (b >= low) & (b < high)
+                batch += [a[forward] * n + b[forward], \
+                          b[backward] * n + a[backward]]
+                batch_size += int(np.count_nonzero(forward)) \
+                    + int(np.count_nonzero(backward))
+                if batch_size >= pair_batch_size:
+                    yield np.concatenate(batch)
+                    batch = []
+                    batch_size = 0
+        if len(batch) > 0:
+            yield np.concatenate(batch)
+
+    def build(self, memberships):
+        ''' Rebuild the matrix from group memberships, e.g. playlist tracks.
+        Rows are counted in blocks of about pair_block_size pairs, and each
+        block is pruned to the top k before the next one is counted.
+
+        Parameters
+        ----------
+        Iterable
+            (group id, item id) pairs, sorted by group
+
+        Returns
+        -------
+        None
+        '''
+        self.ids = []
+        self.index = {}
+        rows = []
+        starts = []
+        previous = None
+        for group_id, item_id in memberships:
+            if group_id != previous or len(starts) == 0:
+                starts.append(len(rows))
+                previous = group_id
+            rows.append(self._intern(item_id))
+        starts.append(len(rows))
+        rows = np.array(rows, dtype=np.int32)
+        starts = np.array(starts, dtype=np.int64)
+
+        n = len(self.ids)
+        self.neighbors = np.full((n, self.k), -1, dtype=np.int32)
+        self.counts = np.zeros((n, self.k), dtype=np.int32)
+
+        # Every pair of a row lands in the row's block, so pruning a block
+        # keeps the same top k as pruning all pairs at once
+        blocks = max(1, -(-self._pair_count(starts) // pair_block_size))
+        block_rows = max(1, -(-n // blocks))
+        for low in range(0, n, block_rows):
+            keys = np.zeros(0, dtype=np.int64)
+            totals = np.zeros(0, dtype=np.int64)
+            for batch in self._pairs(rows, starts, low, low + block_rows):
+                batch_keys, batch_counts = np.unique(batch, \
+                                                     return_counts=True)
+                keys, totals = merge_counts(keys, totals, batch_keys, \
+                                            batch_counts)
+            self._keep_top(keys, totals)
+
+    def _keep_top(self, keys, totals):
+        ''' Store the k most frequent neighbors of the rows in keys.
+
+        Parameters
+        ----------
+        ndarray
+            Sorted unique pair keys, row * n + other row
+
+        ndarray
+            Counts of keys
+
+        Returns
+        -------
+        None
+        '''
+        if len(keys) == 0:
+            return
+
+        # Best first within each row, then keep the first k of each row
+        n = len(self.ids)
+        row_of = keys // n
+        other = keys % n
+        order = np.lexsort((other, -totals, row_of))
+        row_of, other, totals = row_of[order], other[order], totals[order]
+        row_start = np.searchsorted(row_of, row_of, side='left')
+        rank = np.arange(len(row_of)) - row_start
+        keep = rank < self.k
+        self.neighbors[row_of[keep], rank[keep]] = other[keep]
+        self.counts[row_of[keep], rank[keep]] = totals[keep]
+
+    # ------------------------ Updating ------------------------
+    def add_group(self, old_ids, new_ids):
+        ''' Count the pairs a group gains when new items join it. Pruned
+        pairs have no count left, so they restart from this occurrence
+        until the next build.
+
+        Parameters
+        ----------
+        List
+            Ids already in the group
+
+        List
+            Ids joining the group
+
+        Returns
+        -------
+        int
+            Number of pairs counted
+        '''
+        new_rows = list(dict.fromkeys(self._intern(id) for id in new_ids))
+        if len(new_rows) == 0:
+            return 0
+        new_set = set(new_rows)
+        old_rows = [row for row in dict.fromkeys(self._intern(id) \
+                    for id in old_ids) if row not in new_set]
+        self._grow()
+
+        # New items are windowed like build does; the first window is
+        # filled up with the last old items
+        partners = {}
+        for start in range(0, len(new_rows), self.window):
+            window = new_rows[start:start + self.window]
+            tail = []
+            if start == 0 and len(window) < self.window:
+                tail = old_rows[len(old_rows) - (self.window - len(window)):] \
+                    if len(old_rows) > self.window - len(window) else old_rows
+            for row in window:
+                partners[row] = [other for other in window if other != row] \
+                    + tail
+            for row in tail:
+                partners[row] = window
+
+        pairs = 0
+        for row, others in partners.items():
+            self._bump(row, np.array(others, dtype=np.int32))
+            pairs += len(others)
+        return pairs // 2
+
+    def _bump(self, row, others):
+        ''' Add one to the counts of row with other rows and keep the top k.
+
+        Parameters
+        ----------
+        int
+            Row number
+
+        ndarray
+            Other row numbers, without duplicates
+
+        Returns
+        -------
+        None
+        '''
+        if len(others) == 0:
+            return
+        neighbors = self.neighbors[row]
+        counts = self.counts[row].copy()
+        present = np.isin(neighbors, others) & (neighbors >= 0)
+        counts[present] += 1
+        absent = others[~np.isin(others, neighbors)]
+
+        candidates = np.concatenate([neighbors[neighbors >= 0], absent])
+        candidate_counts = np.concatenate([counts[neighbors >= 0], \
+                                           np.ones(len(absent), np.int32)])
+        order = np.argsort(-candidate_counts, kind='stable')[:self.k]
+        self.neighbors[row] = -1
+        self.counts[row] = 0
+        self.neighbors[row, :len(order)] = candidates[order]
+        self.counts[row, :len(order)] = candidate_counts[order]
+
+    # ------------------------ Queries ------------------------
+    def top(self, item_id, k=None):
+        ''' Get the ids that most often share a group with an id.
+
+        Parameters
+        ----------
+        Str
+            Track or artist id
+
+        int
+            Number of ids, at most the matrix k
+
+        Returns
+        -------
+        List
+            A list of (id, count) tuples, most frequent first
+        '''
+        row = self.index.get(item_id)
+        if row is None or row >= len(self.neighbors):
+            return []
+        return [(self.ids[other], int(count)) for other, count \
+                in zip(self.neighbors[row][:k or self.k], \
+                       self.counts[row][:k or self.k]) if other >= 0]
+
+    def stats(self):
+        ''' Get the matrix size.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict
+            {'rows', 'pairs', 'bytes'}
+        '''
+        return {'rows': len(self.ids), \
+                'pairs': int(np.count_nonzero(self.neighbors >= 0)), \
+                'bytes': self.neighbors.nbytes + self.counts.nbytes}
+
+def merge_counts(keys, counts, other_keys, other_counts):
+    ''' Merge two sorted (key, count) arrays, adding up equal keys.
+
+    Parameters
+    ----------
+    ndarray
+        Sorted unique keys
+
+    ndarray
+        Counts of keys
+
+    ndarray
+        Sorted unique keys
+
+    ndarray
+        Counts of other_keys
+
+    Returns
+    -------
+    Tuple
+        (sorted unique keys, counts)
+    '''
+    keys = np.concatenate([keys, other_keys])
+    counts = np.concatenate([counts, other_counts])
+    order = np.argsort(keys, kind='stable')
+    keys, counts = keys[order], counts[order]
+    if len(keys) == 0:
+        return keys, counts
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    return keys[starts], np.add.reduceat(counts, starts)
+
+
+class PlaylistCooccurrence:
+    ''' Track x track and artist x artist co-occurrence over cached
+    playlists. Saved playlist tracks are queued by the accessor listener
+    and counted on the next query.
+    '''
+    def __init__(self, accessor, k=None, window=None):
+        self.accessor = accessor
+        self.lock = threading.RLock()
+        self.tracks = CooccurrenceMatrix(k, window)
+        self.artists = CooccurrenceMatrix(k, window)
+        self.pending = {}
+
+    def build(self):
+        ''' Rebuild both matrices from the playlist_track table.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            self.tracks.build(self.accessor.find_playlist_memberships())
+            self.artists.build(\
+                self.accessor.find_playlist_artist_memberships())
+            self.pending = {}
+
+    def add_playlist_tracks(self, playlist_id, old_track_ids, track_ids):
+        ''' Queue tracks saved to a playlist, the accessor listener. Tracks
+        that were already linked are not counted twice.
+
+        Parameters
+        ----------
+        Str
+            Playlist id
+
+        List
+            Track ids linked to the playlist before the save
+
+        List
+            Track ids saved
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            entry = self.pending.get(playlist_id)
+            if entry is None:
+                entry = {'old_tracks': list(old_track_ids), \
+                         'old_track_set': set(old_track_ids), \
+                         'new_tracks': {}}
+                self.pending[playlist_id] = entry
+            for track_id in track_ids:
+                if track_id not in entry['old_track_set']:
+                    entry['new_tracks'][track_id] = None
+
+    def _apply_pending(self):
+        ''' Count the pairs of queued playlist tracks.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        if len(self.pending) == 0:
+            return
+        pending = self.pending
+        self.pending = {}
+
+        for entry in pending.values():
+            new_tracks = list(entry['new_tracks'])
+            if len(new_tracks) == 0:
+                continue
+            self.tracks.add_group(entry['old_tracks'], new_tracks)
+
+            old_artists = self.accessor.find_artist_ids_by_tracks(\
+                entry['old_tracks'])
+            old_artist_set = set(old_artists)
+            new_artists = [id for id in self.accessor.find_artist_ids_by_tracks(\
+                           new_tracks) if id not in old_artist_set]
+            self.artists.add_group(old_artists, new_artists)
+
+    def tracks_with(self, track_id, k=None):
+        ''' Get the tracks that most often share a playlist with a track.
+
+        Parameters
+        ----------
+        Str
+            Track id
+
+        int
+            Number of tracks
+
+        Returns
+        -------
+        List
+            A list of (track id, playlist count) tuples
+        '''
+        with self.lock:
+            self._apply_pending()
+            return self.tracks.top(track_id, k)
+
+    def artists_with(self, artist_id, k=None):
+        ''' Get the artists that most often share a playlist with an artist.
+
+        Parameters
+        ----------
+        Str
+            Artist id
+
+        int
+            Number of artists
+
+        Returns
+        -------
+        List
+            A list of (artist id, playlist count) tuples
+        '''
+        with self.lock:
+            self._apply_pending()
+            return self.artists.top(artist_id, k)
+
+def load_cooccurrence(accessor, k=None, window=None):
+    ''' Build the co-occurrence matrices from every cached playlist, and
+    keep them up to date with later playlist saves.
+
+    Parameters
+    ----------
+    DataAccessor
+        Local DB accessor
+
+    int
+        Neighbors kept per track or artist
+
+    int
+        Playlist window size
+
+    Returns
+    -------
+    PlaylistCooccurrence
+        The matrices
+    '''
+    cooccurrence = PlaylistCooccurrence(accessor, k, window)
+    cooccurrence.build()
+    accessor.playlist_track_listeners.append(\
+        cooccurrence.add_playlist_tracks)
+    return cooccurrence
+
+
+# ------------------------ Main function ---------------------
+if __name__ == "__main__":
+    # Usage: python3 cooccurrence.py [db_name] [track_id]
+    from data_accessor import DataAccessor
+    db_name = 'final_pj.sqlite'
+    if len(sys.argv) > 1:
+        db_name = sys.argv[1]
+
+    accessor = DataAccessor(db_name)
+    start = time.perf_counter()
+    cooccurrence = load_cooccurrence(accessor)
+    print('Tracks ' + str(cooccurrence.tracks.stats()) + ', artists ' \
+          + str(cooccurrence.artists.stats()) + ' in ' \
+          + str(round((time.perf_counter() - start) * 1000, 1)) + ' ms')
+
+    if len(sys.argv) > 2:
+        for track_id, count in cooccurrence.tracks_with(sys.argv[2]):
+            print(accessor.find_track(track_id).track_name + ' - ' \
+                  + str(count) + ' playlists')
+    accessor.close()
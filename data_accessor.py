@@ -3,20 +3,686 @@
 ##### Uniqname: xchengx             #####
 #########################################
 
-import sqlite3
+import threading
 import time
+from contextlib import contextmanager
 
 # Our own objects
 from spotify_objects import Artist
 from spotify_objects import Track
 from spotify_objects import Playlist
 from spotify_objects import Twitter
+from entity_cache import EntityCache
+from db_connections import ConnectionManager
+import db_migrations
+
+# SQLite allows 999 bound variables per statement on older builds
+max_query_variables = 900
+
+# Columns per table, in table order. The first key_size columns form the
+# primary key.
+table_columns = {
+    'artist': (['artist_id', 'artist_name', 'genres', 'followers', \
+                'popularity', 'external_url', 'fetched_on'], 1),
+    'track': (['track_id', 'track_name', 'duration_ms', 'popularity', \
+               'external_url', 'fetched_on'], 1),
+    'track_artist': (['track_id', 'artist_id'], 2),
+    'related_artist': (['related_to_artist_id', 'artist_id'], 2),
+    'playlist': (['playlist_id', 'playlist_name', 'owner_name', \
+                  'playlist_description', 'followers', 'external_url', \
+                  'fetched_on'], 1),
+    'featured_playlist': (['playlist_id', 'updated_on'], 1),
+    'playlist_track': (['playlist_id', 'track_id'], 2),
+    'twitter': (['twitter_id', 'user_name', 'url', 'text', 'created_at'], 1),
+    'track_twitter': (['track_id', 'twitter_id'], 2),
+    'negative_cache': (['entity_type', 'entity_id', 'reason', \
+                        'error_class', 'recorded_on'], 2),
+    'search_cache': (['search_type', 'query', 'result_ids', 'fetched_on', \
+                      'used_on'], 2),
+    'tweet_cursor': (['track_id', 'since_id', 'updated_on', 'max_id', \
+                      'newest_id'], 1),
+    'crawl_frontier': (['crawl_name', 'artist_id', 'depth', 'status', \
+                        'updated_on'], 2),
+}
+
+# Columns that are stored but do not count as a change of the row
+untracked_columns = ['fetched_on', 'used_on']
+
+def upsert_sql(table):
+    ''' Build an idempotent INSERT for a table. Existing rows are only
+    rewritten when a non-key column other than untracked_columns changed;
+    link tables ignore duplicates.
+
+    Parameters
+    ----------
+    Str
+        Table name
+
+    Returns
+    -------
+    Str
+        INSERT ... ON CONFLICT statement
+    '''
+    columns, key_size = table_columns[table]
+    sql = 'INSERT INTO ' + table + ' (' + ', '.join(columns) + ') values (' \
+        + ','.join(['?'] * len(columns)) + ') ON CONFLICT (' \
+        + ', '.join(columns[:key_size]) + ') DO '
+
+    values = columns[key_size:]
+    if len(values) == 0:
+        return sql + 'NOTHING'
+    return sql + 'UPDATE SET ' \
+        + ', '.join([c + ' = excluded.' + c for c in values]) \
+        + ' WHERE ' \
+        + ' OR '.join([table + '.' + c + ' IS NOT excluded.' + c \
+                       for c in values if c not in untracked_columns])
+
+def touch_sql(table):
+    ''' Build an UPDATE that stores the untracked columns of a table, for
+    rows the upsert left alone because nothing else changed.
+
+    Parameters
+    ----------
+    Str
+        Table name
+
+    Returns
+    -------
+    Str
+        UPDATE statement taking the untracked values, then the key, or None
+        if the table has no untracked columns
+    '''
+    columns, key_size = table_columns[table]
+    untracked = [c for c in columns if c in untracked_columns]
+    if len(untracked) == 0:
+        return None
+    return 'UPDATE ' + table + ' SET ' \
+        + ', '.join([c + ' = ?' for c in untracked]) + ' WHERE ' \
+        + ' AND '.join([c + ' = ?' for c in columns[:key_size]])
 
 class DataAccessor:
     ''' Our internal data accessor
     '''
-    def __init__(self, db_name):
-        self.conn = sqlite3.connect(db_name)
+    def __init__(self, db_name, cache_capacities=None, profile='default'):
+        # WAL mode: readers get a connection per thread, all writes go
+        # through the single writer connection under its lock
+        self.connections = ConnectionManager(db_name, profile)
+        self.conn = self.connections.writer
+        with self.connections.writer_lock:
+            db_migrations.migrate(self.conn)
+        
+        # In-process identity map in front of the find_* lookups
+        self.cache = EntityCache(cache_capacities)
+        
+        # Rows queued per table while inside batch(), per thread
+        self._local = threading.local()
+        
+        # Called after the commit with (artist id, related artist ids) on
+        # every save_related_artists, e.g. by artist_graph to add edges
+        self.related_artist_listeners = []
+        
+        # Called after the commit with the Artist on every save_artist,
+        # e.g. by artist_similarity to update its index
+        self.artist_listeners = []
+        
+        # Called after the commit with (playlist id, track ids linked
+        # before, track ids saved) whenever tracks are saved to a playlist,
+        # e.g. by cooccurrence to count new pairs
+        self.playlist_track_listeners = []
+    
+    def close(self):
+        ''' Close all DB connections.
+    
+        Parameters
+        ----------
+        None
+    
+        Returns
+        -------
+        None
+        '''
+        with self.connections.writer_lock:
+            self.conn.execute('PRAGMA optimize')
+        self.connections.close()
+    
+    def analyze(self):
+        ''' Refresh the query planner statistics, e.g. after a large ingest.
+    
+        Parameters
+        ----------
+        None
+    
+        Returns
+        -------
+        None
+        '''
+        with self.connections.writer_lock:
+            db_migrations.analyze(self.conn)
+    
+    # Unit of work
+    @contextmanager
+    def batch(self):
+        ''' Group saves into one transaction. Rows are collected per table,
+        deduplicated by primary key, and upserted with executemany when the
+        block exits. Nothing is written if the block or the write raises.
+        Nested calls join the outer batch.
+    
+        Parameters
+        ----------
+        None
+    
+        Returns
+        -------
+        Dict
+            Filled when the batch is written:
+            {table: {'inserted': int, 'updated': int, 'unchanged': int}}
+        '''
+        if getattr(self._local, 'pending', None) is not None:
+            yield self._local.counts
+            return
+        
+        self._local.pending = {}
+        self._local.counts = {}
+        self._local.committed = []
+        self._local.changed = {}
+        self._local.links = {}
+        try:
+            yield self._local.counts
+            pending = self._local.pending
+            committed = self._local.committed
+            changed = self._local.changed
+            links = self._local.links
+            self._local.pending = None
+            counts, before = self._flush(pending, links)
+            self._local.counts.update(counts)
+        finally:
+            self._local.pending = None
+        
+        # Only now can other threads read the new rows
+        for callback in committed:
+            callback()
+        self._invalidate_dependents(changed)
+        for playlist_id, old_track_ids in before.get('playlist_track', \
+                                                     {}).items():
+            track_ids = [row[1] for row \
+                         in pending.get('playlist_track', {}).values() \
+                         if row[0] == playlist_id]
+            for listener in self.playlist_track_listeners:
+                listener(playlist_id, old_track_ids, track_ids)
+    
+    def _after_commit(self, callback):
+        ''' Run a callback once the current batch is committed, or now
+        outside of a batch.
+    
+        Parameters
+        ----------
+        Function
+            Takes no argument
+    
+        Returns
+        -------
+        None
+        '''
+        if getattr(self._local, 'pending', None) is None:
+            callback()
+            return
+        self._local.committed.append(callback)
+    
+    def _invalidate(self, entity_type, key):
+        ''' Drop a cached entity now and again after the commit, so a copy
+        loaded from the old row in the meantime is not served afterwards.
+        Cached tracks and playlists holding a saved artist or track are
+        dropped after the commit too.
+    
+        Parameters
+        ----------
+        Str
+            Entity type, e.g. 'artist'
+        
+        Str
+            Entity id
+    
+        Returns
+        -------
+        None
+        '''
+        self.cache.invalidate(entity_type, key)
+        self._after_commit(lambda: self.cache.invalidate(entity_type, key))
+        if entity_type in ('artist', 'track'):
+            if getattr(self._local, 'pending', None) is None:
+                self._invalidate_dependents({entity_type: {key}})
+            else:
+                self._local.changed.setdefault(entity_type, set()).add(key)
+    
+    def _invalidate_dependents(self, changed):
+        ''' Drop the cached tracks and playlists that hold a saved artist
+        or track, found through the reverse link indexes, so they are
+        reloaded with the new instance instead of keeping the old one.
+    
+        Parameters
+        ----------
+        Dict
+            Saved ids by entity type, {'artist': set, 'track': set}
+    
+        Returns
+        -------
+        None
+        '''
+        track_ids = set(changed.get('track', ()))
+        artist_ids = list(changed.get('artist', ()))
+        if len(artist_ids) > 0:
+            track_ids.update(record[0] for record in self._select_in(\
+                'SELECT track_id FROM track_artist WHERE artist_id IN ({})', \
+                artist_ids))
+        for track_id in track_ids:
+            self.cache.invalidate('track', track_id)
+        
+        if len(track_ids) > 0:
+            for record in self._select_in('SELECT DISTINCT playlist_id ' \
+                    + 'FROM playlist_track WHERE track_id IN ({})', \
+                    list(track_ids)):
+                self.cache.invalidate('playlist', record[0])
+    
+    def _write_links(self, table, scope, ids, replace=False):
+        ''' Queue link rows (scope, id) for a two-column link table, and
+        remember the scope so _flush reads its links before the write.
+    
+        Parameters
+        ----------
+        Str
+            Link table name
+        
+        Str
+            Value of the first key column, e.g. a playlist id
+        
+        List
+            Values of the second key column
+        
+        bool
+            True if the links queued for the scope in this batch replace
+            the saved ones
+    
+        Returns
+        -------
+        None
+        '''
+        with self.batch():
+            self._write(table, [[scope, id] for id in ids])
+            scopes = self._local.links.setdefault(table, {})
+            scopes[scope] = scopes.get(scope, False) or replace
+    
+    def _flush(self, pending, links):
+        ''' Upsert queued rows in one transaction.
+    
+        Parameters
+        ----------
+        Dict
+            Queued rows: {table: {primary key: row}}
+        
+        Dict
+            Link scopes written by _write_links: {table: {scope: replace}}
+    
+        Returns
+        -------
+        Tuple
+            ({table: {'inserted': int, 'updated': int, 'unchanged': int}},
+             {table: {scope: ids linked before the write, in saved order}})
+        '''
+        counts = {}
+        before = {}
+        with self.connections.writer_lock, self.conn:
+            for table, scopes in links.items():
+                columns = table_columns[table][0]
+                sql = 'SELECT ' + columns[1] + ' FROM ' + table + ' WHERE ' \
+                    + columns[0] + ' = ? ORDER BY rowid'
+                before[table] = {scope: [record[0] for record in \
+                                         self.conn.execute(sql, [scope])] \
+                                 for scope in scopes}
+                
+                # Replaced links that differ from the saved ones are all
+                # rewritten, so rowid order stays the queued order
+                for scope, replace in scopes.items():
+                    queued = [row[1] for row in pending.get(table, {}).values() \
+                              if row[0] == scope]
+                    if replace and queued != before[table][scope]:
+                        self.conn.execute('DELETE FROM ' + table + ' WHERE ' \
+                                          + columns[0] + ' = ?', [scope])
+            
+            for table, rows in pending.items():
+                existing = self._count_existing(table, list(rows))
+                # rowcount leaves out rows written by triggers
+                changed = self.conn.executemany(upsert_sql(table), \
+                                                list(rows.values())).rowcount
+                
+                inserted = len(rows) - existing
+                counts[table] = {'inserted': inserted, \
+                                 'updated': changed - inserted, \
+                                 'unchanged': len(rows) - changed}
+                
+                touch = touch_sql(table)
+                if touch is not None and changed < len(rows):
+                    self._touch(table, touch, list(rows.values()))
+        return counts, before
+    
+    def _touch(self, table, sql, rows):
+        ''' Store the untracked columns of rows, e.g. a new fetch time for
+        data that did not change.
+    
+        Parameters
+        ----------
+        Str
+            Table name
+        
+        Str
+            Statement from touch_sql
+        
+        List
+            A list of rows in table_columns order
+    
+        Returns
+        -------
+        None
+        '''
+        columns, key_size = table_columns[table]
+        positions = [i for i in range(len(columns)) \
+                     if columns[i] in untracked_columns]
+        self.conn.executemany(sql, \
+            [[row[i] for i in positions] + list(row[:key_size]) \
+             for row in rows])
+    
+    def _count_existing(self, table, keys):
+        ''' Count how many primary keys are already in a table.
+    
+        Parameters
+        ----------
+        Str
+            Table name
+        
+        List
+            A list of primary key tuples
+    
+        Returns
+        -------
+        int
+            Number of keys found
+        '''
+        columns, key_size = table_columns[table]
+        row = '(' + ','.join(['?'] * key_size) + ')'
+        # A join, because a multi-column IN (VALUES ...) scans the table
+        sql = 'SELECT count(*) FROM (VALUES {}) AS k JOIN ' + table \
+            + ' AS t ON ' + ' AND '.join(['t.' + columns[i] + ' = k.column' \
+                                          + str(i + 1) \
+                                          for i in range(key_size)])
+        
+        existing = 0
+        per_chunk = max_query_variables // key_size
+        for start in range(0, len(keys), per_chunk):
+            chunk = keys[start:start + per_chunk]
+            params = [value for key in chunk for value in key]
+            existing += self.conn.execute(\
+                sql.format(','.join([row] * len(chunk))), params).fetchone()[0]
+        return existing
+    
+    def _write(self, table, rows):
+        ''' Upsert rows into a table. Inside batch() the rows are queued
+        instead and written when the batch ends.
+    
+        Parameters
+        ----------
+        Str
+            Table name
+        
+        List
+            A list of rows in table_columns order
+    
+        Returns
+        -------
+        None
+        '''
+        if len(rows) == 0:
+            return
+        
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            with self.batch():
+                self._write(table, rows)
+            return
+        
+        key_size = table_columns[table][1]
+        queued = pending.setdefault(table, {})
+        for row in rows:
+            queued[tuple(row[:key_size])] = row
+    
+    # Set-based loaders
+    def _select_in(self, sql, ids, params=[]):
+        ''' Run a SELECT whose {} placeholder is an IN list, in chunks that
+        fit SQLite's bound-variable limit.
+    
+        Parameters
+        ----------
+        Str
+            SELECT statement containing 'IN ({})'
+        
+        List
+            A list of ids
+        
+        List
+            Parameters bound before the IN list
+    
+        Returns
+        -------
+        List
+            A list of records from all chunks
+        '''
+        ids = list(dict.fromkeys(ids))
+        conn = self.connections.reader()
+        per_chunk = max_query_variables - len(params)
+        records = []
+        for start in range(0, len(ids), per_chunk):
+            chunk = ids[start:start + per_chunk]
+            placeholders = ','.join(['?'] * len(chunk))
+            records.extend(conn.execute(sql.format(placeholders), \
+                                        list(params) + chunk).fetchall())
+        return records
+    
+    def _from_cache(self, entity_type, ids, found):
+        ''' Move cached entities into found and return the ids that still
+        have to be read from the DB.
+    
+        Parameters
+        ----------
+        Str
+            Entity type, e.g. 'artist'
+        
+        List
+            A list of ids
+        
+        Dict
+            Objects found so far by id
+    
+        Returns
+        -------
+        List
+            A list of ids that are not cached
+        '''
+        missing = []
+        for id in dict.fromkeys(ids):
+            if id in found:
+                continue
+            value = self.cache.get(entity_type, id)
+            if value is None:
+                missing.append(id)
+            else:
+                found[id] = value
+        return missing
+    
+    def _link_ids(self, entity_type, key, sql, params):
+        ''' Run a one-column link table query, cached under entity_type
+        and key until the link table is saved again.
+    
+        Parameters
+        ----------
+        Str
+            Entity type, e.g. 'related_artists'
+        
+        Str
+            Cache key
+        
+        Str
+            SELECT statement returning one id column
+        
+        List
+            Query parameters
+    
+        Returns
+        -------
+        Tuple
+            A tuple of ids in query order
+        '''
+        ids = self.cache.get(entity_type, key)
+        if ids is None:
+            generation = self.cache.generation
+            ids = tuple(record[0] for record in \
+                        self.connections.reader().execute(sql, params)\
+                        .fetchall())
+            self.cache.put(entity_type, key, ids, generation)
+        return ids
+    
+    def _load_artists(self, artist_ids, artists=None):
+        ''' Load artists by id with one IN query per chunk.
+    
+        Parameters
+        ----------
+        List
+            A list of artist ids
+        
+        Dict
+            Already loaded artists by id. New artists are added to it so
+            every caller shares one Artist object per id.
+    
+        Returns
+        -------
+        Dict
+            Internal Artist objects by artist id
+        '''
+        if artists is None:
+            artists = {}
+        missing = self._from_cache('artist', artist_ids, artists)
+        generation = self.cache.generation
+        records = self._select_in(\
+            'SELECT * FROM artist WHERE artist_id IN ({})', missing)
+        for record in records:
+            artist = Artist(record[0], record[1], record[2], record[3], \
+                            record[4], record[5])
+            artist.fetched_on = record[6]
+            artists[record[0]] = self.cache.put('artist', record[0], artist, \
+                                                generation)
+        return artists
+    
+    def _load_tracks(self, track_ids, artists=None):
+        ''' Load tracks and their artists with a constant number of queries.
+    
+        Parameters
+        ----------
+        List
+            A list of track ids
+        
+        Dict
+            Already loaded artists by id, shared with the caller
+    
+        Returns
+        -------
+        Dict
+            Internal Track objects by track id
+        '''
+        tracks = {}
+        missing = self._from_cache('track', track_ids, tracks)
+        generation = self.cache.generation
+        
+        loaded = {}
+        for record in self._select_in(\
+                'SELECT * FROM track WHERE track_id IN ({})', missing):
+            loaded[record[0]] = Track(record[0], record[1], record[2], \
+                                      record[3], record[4])
+            loaded[record[0]].fetched_on = record[5]
+        
+        links = self._select_in(\
+            'SELECT * FROM track_artist WHERE track_id IN ({})', \
+            list(loaded))
+        artists = self._load_artists([link[1] for link in links], artists)
+        
+        for track_id, artist_id in links:
+            if artist_id in artists:
+                loaded[track_id].artists.append(artists[artist_id])
+        
+        for track_id in loaded:
+            tracks[track_id] = self.cache.put('track', track_id, \
+                                              loaded[track_id], generation)
+        return tracks
+    
+    def _load_playlists(self, playlist_ids):
+        ''' Load playlists with all their tracks and artists using a
+        constant number of queries.
+    
+        Parameters
+        ----------
+        List
+            A list of playlist ids
+    
+        Returns
+        -------
+        Dict
+            Internal Playlist objects by playlist id
+        '''
+        playlists = {}
+        missing = self._from_cache('playlist', playlist_ids, playlists)
+        generation = self.cache.generation
+        
+        loaded = {}
+        for record in self._select_in(\
+                'SELECT * FROM playlist WHERE playlist_id IN ({})', missing):
+            loaded[record[0]] = Playlist(record[0], record[1], record[2], \
+                                         record[3], record[4], record[5])
+            loaded[record[0]].fetched_on = record[6]
+        
+        links = self._select_in(\
+            'SELECT * FROM playlist_track WHERE playlist_id IN ({}) ' \
+            + 'ORDER BY rowid', list(loaded))
+        tracks = self._load_tracks([link[1] for link in links])
+        
+        for playlist_id, track_id in links:
+            if track_id in tracks:
+                loaded[playlist_id].tracks.append(tracks[track_id])
+        
+        for playlist_id in loaded:
+            playlists[playlist_id] = self.cache.put('playlist', playlist_id, \
+                                                    loaded[playlist_id], \
+                                                    generation)
+        return playlists
+    
+    def _load_twitters(self, twitter_ids):
+        ''' Load Twitter posts by id with one IN query per chunk.
+    
+        Parameters
+        ----------
+        List
+            A list of Twitter ids
+    
+        Returns
+        -------
+        Dict
+            Internal Twitter objects by Twitter id
+        '''
+        twitters = {}
+        missing = self._from_cache('twitter', twitter_ids, twitters)
+        generation = self.cache.generation
+        records = self._select_in(\
+            'SELECT * FROM twitter WHERE twitter_id IN ({})', missing)
+        for record in records:
+            twitters[record[0]] = self.cache.put('twitter', record[0], \
+                Twitter(record[0], record[1], record[2], record[3], \
+                        record[4]), generation)
+        return twitters
     
     # Spotify artist 
     def save_artist(self, artist):
@@ -24,352 +690,1100 @@ class DataAccessor:
     
         Parameters
         ----------
-        Artist
-            Internal Artist object
+        Artist
+            Internal Artist object
+    
+        Returns
+        -------
+        Artist
+            Internal Artist object
+        '''
+        artist.fetched_on = int(time.time())
+        with self.batch():
+            self._invalidate('artist', artist.artist_id)
+            self._write('artist', \
+                [[artist.artist_id, artist.artist_name, artist.genres,\
+                  artist.followers, artist.popularity, artist.external_url, \
+                  artist.fetched_on]])
+            
+            for listener in self.artist_listeners:
+                self._after_commit(lambda listener=listener: listener(artist))
+        return artist
+        
+    def find_artist(self, artist_id):
+        ''' Get artist in the DB. Return None if there is no record.
+    
+        Parameters
+        ----------
+        Str
+            Artist id
+    
+        Returns
+        -------
+        Artist
+            Internal Artist object
+        '''
+        return self._load_artists([artist_id]).get(artist_id)
+        
+    def find_artists(self, artist_ids):
+        ''' Get many artists in the DB with chunked IN queries.
+    
+        Parameters
+        ----------
+        List
+            A list of artist ids
+    
+        Returns
+        -------
+        List
+            Internal Artist objects in input order, None for missing ids
+        '''
+        artists = self._load_artists(artist_ids)
+        return [artists.get(id) for id in artist_ids]
+        
+    def find_all_artists(self):
+        ''' Get every artist in the DB. The rows are not cached.
+    
+        Parameters
+        ----------
+        None
+    
+        Returns
+        -------
+        List
+            A list of internal Artist objects
+        '''
+        artists = []
+        for record in self.connections.reader().execute(\
+                'SELECT * FROM artist'):
+            artist = Artist(record[0], record[1], record[2], record[3], \
+                            record[4], record[5])
+            artist.fetched_on = record[6]
+            artists.append(artist)
+        return artists
+        
+    # Spotify track 
+    def save_track(self, track):
+        ''' Save track in the DB.
+    
+        Parameters
+        ----------
+        Track
+            Internal Track object
+    
+        Returns
+        -------
+        Track
+            Internal Track object
+        '''
+        track.fetched_on = int(time.time())
+        with self.batch():
+            self._invalidate('track', track.track_id)
+            self._write('track', \
+                [[track.track_id, track.track_name, track.duration_ms,\
+                  track.popularity, track.external_url, track.fetched_on]])
+            self._write('track_artist', \
+                [[track.track_id, artist.artist_id] \
+                 for artist in track.artists])
+        
+        return track
+        
+    def find_track(self, track_id):
+        ''' Get track in the DB. Return None if there is no record.
+    
+        Parameters
+        ----------
+        Str
+            Track id
+    
+        Returns
+        -------
+        Track
+            Internal Track object
+        '''
+        return self._load_tracks([track_id]).get(track_id)
+        
+    def find_tracks(self, track_ids):
+        ''' Get many tracks in the DB with chunked IN queries.
+    
+        Parameters
+        ----------
+        List
+            A list of track ids
+    
+        Returns
+        -------
+        List
+            Internal Track objects in input order, None for missing ids
+        '''
+        tracks = self._load_tracks(track_ids)
+        return [tracks.get(id) for id in track_ids]
+        
+    # Spotify playlist 
+    def save_playlist(self, playlist, replace_tracks=True):
+        ''' Save playlist in the DB. Its tracks replace the saved ones,
+        together with the tracks saved by save_playlist_tracks in the same
+        batch.
+    
+        Parameters
+        ----------
+        Playlist
+            Internal Playlist object
+        
+        bool
+            False to only add tracks, e.g. when a page failed to load
+    
+        Returns
+        -------
+        Playlist
+            Internal Playlist object
+        '''
+        playlist.fetched_on = int(time.time())
+        with self.batch():
+            self._invalidate('playlist', playlist.playlist_id)
+            self._write('playlist', \
+                [[playlist.playlist_id, playlist.playlist_name, \
+                  playlist.owner_name, playlist.playlist_description, \
+                  playlist.followers, playlist.external_url, \
+                  playlist.fetched_on]])
+            self._write_links('playlist_track', playlist.playlist_id, \
+                              [track.track_id for track in playlist.tracks], \
+                              replace_tracks)
+        
+        return playlist
+        
+    def save_playlist_tracks(self, playlist_id, track_ids):
+        ''' Add tracks to a saved playlist, e.g. the later pages of a long
+        playlist after save_playlist in the same batch.
+    
+        Parameters
+        ----------
+        Str
+            Playlist id
+        
+        List
+            A list of track ids
+    
+        Returns
+        -------
+        List
+            A list of track ids
+        '''
+        with self.batch():
+            self._invalidate('playlist', playlist_id)
+            self._write_links('playlist_track', playlist_id, track_ids)
+        
+        return track_ids
+        
+    def find_playlist(self, playlist_id):
+        ''' Get playlist in the DB. Return None if there is no record.
+    
+        Parameters
+        ----------
+        Str
+            Playlist id
+    
+        Returns
+        -------
+        Playlist
+            Internal Playlist object
+        '''
+        return self._load_playlists([playlist_id]).get(playlist_id)
+        
+    def find_playlist_memberships(self):
+        ''' Get every saved playlist track, streamed from the DB.
+    
+        Parameters
+        ----------
+        None
+    
+        Returns
+        -------
+        Iterator
+            (playlist id, track id) tuples, grouped by playlist in saved
+            order
+        '''
+        return self.connections.reader().execute('SELECT playlist_id, ' \
+            + 'track_id FROM playlist_track ORDER BY playlist_id, rowid')
+        
+    def find_playlist_artist_memberships(self):
+        ''' Get the artists of every saved playlist, streamed from the DB.
+    
+        Parameters
+        ----------
+        None
+    
+        Returns
+        -------
+        Iterator
+            Distinct (playlist id, artist id) tuples, grouped by playlist
+        '''
+        return self.connections.reader().execute('SELECT playlist_id, ' \
+            + 'artist_id FROM playlist_track JOIN track_artist ' \
+            + 'USING (track_id) GROUP BY playlist_id, artist_id ' \
+            + 'ORDER BY playlist_id, min(playlist_track.rowid)')
+        
+    # Spotify related artist 
+    def save_related_artists(self, to_artist_id, artists):
+        ''' Save related artists in the DB.
+    
+        Parameters
+        ----------
+        Str
+            Artist id
+        
+        List
+            A list of artist objects
+    
+        Returns
+        -------
+        List
+            A list of artist objects
+        '''
+        related_ids = [artist.artist_id for artist in artists \
+                       if artist is not None]
+        with self.batch():
+            self._invalidate('related_artists', to_artist_id)
+            self._write('related_artist', \
+                [[to_artist_id, artist_id] for artist_id in related_ids])
+            
+            for listener in self.related_artist_listeners:
+                self._after_commit(lambda listener=listener: \
+                                   listener(to_artist_id, related_ids))
+        return artists
+        
+    def find_related_artists(self, to_artist_id):
+        ''' Get playlist in the DB. Return None if there is no record.
+    
+        Parameters
+        ----------
+        Str
+            Playlist id
+    
+        Returns
+        -------
+        List
+            A list of internal Artist object
+        '''
+        ids = self._link_ids('related_artists', to_artist_id, \
+            'SELECT artist_id FROM related_artist ' \
+            + 'WHERE related_to_artist_id = ?', [to_artist_id])
+        
+        loaded = self._load_artists(ids)
+        artists = [loaded[id] for id in ids if id in loaded]
+            
+        if len(artists) == 0:
+            return None
+        
+        return artists
+        
+    def find_related_artist_edges(self):
+        ''' Get every related artist edge.
+    
+        Parameters
+        ----------
+        None
+    
+        Returns
+        -------
+        List
+            A list of (artist id, related artist id) tuples
+        '''
+        return self.connections.reader().execute('SELECT ' \
+            + 'related_to_artist_id, artist_id FROM related_artist')\
+            .fetchall()
+        
+    # Spotify featured playlists
+    def save_featured_palylists(self, playlists):
+        ''' Save featured palylist in the DB. They replace the previously
+        saved featured playlists.
+    
+        Parameters
+        ----------
+        List
+            A list of internal playlist objects
+    
+        Returns
+        -------
+        List
+            A list of internal playlist objects
+        '''
+        cur_timestamp = int(time.time())
+        
+        with self.batch():
+            self._invalidate('featured_playlists', '')
+            self._write('featured_playlist', \
+                [[playlist.playlist_id, cur_timestamp] \
+                 for playlist in playlists if playlist is not None])
+        
+        return playlists
+        
+    def find_featured_palylists(self):
+        ''' Get playlist in the DB. Return None if there is no record.
+    
+        Parameters
+        ----------
+        Str
+            Playlist id
+    
+        Returns
+        -------
+        List
+            A list of internal Artist object
+        '''
+        # Only the most recently saved set is current
+        ids = self._link_ids('featured_playlists', '', \
+            'SELECT playlist_id FROM featured_playlist WHERE updated_on = ' \
+            + '(SELECT max(updated_on) FROM featured_playlist)', [])
+        
+        loaded = self._load_playlists(ids)
+        playlists = [loaded[id] for id in ids if id in loaded]
+            
+        if len(playlists) == 0:
+            return None
+        
+        return playlists
+        
+    def featured_playlists_updated_on(self):
+        ''' Get when the current featured playlists were saved.
+    
+        Parameters
+        ----------
+        None
+    
+        Returns
+        -------
+        int
+            Unix time, None if there is no record
+        '''
+        return self.connections.reader()\
+            .execute('SELECT max(updated_on) FROM featured_playlist')\
+            .fetchone()[0]
+        
+    # Twitter
+    def save_twitter(self, twitter):
+        ''' Save featured palylist in the DB.
+    
+        Parameters
+        ----------
+        List
+            A list of internal Twitter objects
+    
+        Returns
+        -------
+        List
+            A list of internal Twitter objects
+        '''
+        with self.batch():
+            self._invalidate('twitter', twitter.twitter_id)
+            self._write('twitter', \
+                [[twitter.twitter_id, twitter.user_name, twitter.url, \
+                  twitter.text, twitter.created_at]])
+        
+        return twitter
+        
+    def find_twitter(self, twitter_id):
+        ''' Find Twitter by id
+    
+        Parameters
+        ----------
+        Str
+            Twitter id
+    
+        Returns
+        -------
+        List
+            A list of internal Twitter objects
+        '''
+        return self._load_twitters([twitter_id]).get(twitter_id)
+        
+    def find_twitters(self, twitter_ids):
+        ''' Get many Twitter posts in the DB with chunked IN queries.
+    
+        Parameters
+        ----------
+        List
+            A list of Twitter ids
+    
+        Returns
+        -------
+        List
+            Internal Twitter objects in input order, None for missing ids
+        '''
+        twitters = self._load_twitters(twitter_ids)
+        return [twitters.get(id) for id in twitter_ids]
+        
+    def save_twitter_by_track(self, track, twitters):
+        ''' Save featured palylist in the DB.
+    
+        Parameters
+        ----------
+        Track
+            Internal Track object
+        
+        List
+            A list of internal Twitter objects
+    
+        Returns
+        -------
+        List
+            A list of internal Twitter objects
+        '''
+        with self.batch():
+            self._invalidate('track_twitters', track.track_id)
+            self._write('track_twitter', \
+                [[track.track_id, twitter.twitter_id] \
+                 for twitter in twitters if twitter is not None])
+        
+        return twitters
+        
+    def find_twitters_by_track(self, track):
+        ''' Save featured palylist in the DB.
+    
+        Parameters
+        ----------
+        Track
+            Internal Track object
+        
+        List
+            A list of internal Twitter objects
+    
+        Returns
+        -------
+        List
+            A list of internal Twitter objects
+        '''
+        # Twitter ids grow over time, so the longest and largest is newest
+        ids = self._link_ids('track_twitters', track.track_id, \
+            'SELECT twitter_id FROM track_twitter WHERE track_id = ? ' \
+            + 'ORDER BY length(twitter_id) DESC, twitter_id DESC', \
+            [track.track_id])
+        
+        loaded = self._load_twitters(ids)
+        twitters = [loaded[id] for id in ids if id in loaded]
+            
+        if len(twitters) == 0:
+            return None
+        
+        return twitters
+        
+    def save_tweet_cursor(self, track_id, since_id, max_id=None, \
+                          newest_id=None):
+        ''' Save the tweet cursor of a track: every tweet up to since_id is
+        ingested, and an unfinished walk left the ones between since_id and
+        max_id to fetch.
+    
+        Parameters
+        ----------
+        Str
+            A spotify track ID
+        
+        Str
+            Twitter id up to which every tweet is ingested, None if none
+        
+        Str
+            Twitter id the unfinished walk resumes from, None if the last
+            walk finished
+        
+        Str
+            Newest Twitter id of the unfinished walk
+    
+        Returns
+        -------
+        None
+        '''
+        self._write('tweet_cursor', [[track_id, since_id, int(time.time()), \
+                                      max_id, newest_id]])
+        
+    def find_tweet_cursor(self, track_id):
+        ''' Get the tweet cursor of a track. Return None if its tweets were
+        never ingested.
+    
+        Parameters
+        ----------
+        Str
+            A spotify track ID
+    
+        Returns
+        -------
+        Tuple
+            (since id, updated on, max id, newest id)
+        '''
+        return self.connections.reader().execute('SELECT since_id, ' \
+            + 'updated_on, max_id, newest_id FROM tweet_cursor ' \
+            + 'WHERE track_id = ?', [track_id]).fetchone()
+        
+    # Crawl frontier
+    def save_frontier(self, crawl_name, entries):
+        ''' Save crawl frontier entries. Existing entries are overwritten,
+        so only pass artists that are new to the crawl or whose status
+        changed.
+    
+        Parameters
+        ----------
+        Str
+            Crawl name
+        
+        List
+            A list of (artist id, depth, status) tuples; status is
+            'pending', 'done' or 'failed'
+    
+        Returns
+        -------
+        None
+        '''
+        now = int(time.time())
+        self._write('crawl_frontier', \
+            [[crawl_name, artist_id, depth, status, now] \
+             for artist_id, depth, status in entries])
+        
+    def find_frontier(self, crawl_name, artist_ids):
+        ''' Get the crawl frontier entries of many artists.
+    
+        Parameters
+        ----------
+        Str
+            Crawl name
+        
+        List
+            A list of artist ids
     
         Returns
         -------
-        Artist
-            Internal Artist object
+        Dict
+            (depth, status) by artist id, for the artists in the crawl
         '''
-        db_cursor = self.conn.cursor()
-        db_cursor.execute('INSERT INTO artist values (?,?,?,?,?,?)', \
-            [artist.artist_id, artist.artist_name, artist.genres,\
-             artist.followers, artist.popularity, artist.external_url])
-        self.conn.commit()
-        return artist
+        records = self._select_in('SELECT artist_id, depth, status ' \
+            + 'FROM crawl_frontier WHERE crawl_name = ? ' \
+            + 'AND artist_id IN ({})', artist_ids, [crawl_name])
+        return {record[0]: (record[1], record[2]) for record in records}
         
-    def find_artist(self, artist_id):
-        ''' Get artist in the DB. Return None if there is no record.
+    def next_frontier(self, crawl_name, depth, limit):
+        ''' Get pending crawl entries of one depth, oldest first.
     
         Parameters
         ----------
         Str
-            Artist id
+            Crawl name
+        
+        int
+            Depth
+        
+        int
+            Maximum number of entries
     
         Returns
         -------
-        Artist
-            Internal Artist object
+        List
+            A list of artist ids
         '''
-        db_cursor = self.conn.cursor()
-        record = db_cursor.execute('SELECT * FROM artist WHERE artist_id = ?',\
-            [artist_id]).fetchone()
-        if record is None:
-            return record
-        artist = Artist(record[0], record[1], record[2], record[3], record[4],\
-                        record[5])
-        return artist
+        records = self.connections.reader().execute('SELECT artist_id ' \
+            + 'FROM crawl_frontier WHERE crawl_name = ? ' \
+            + "AND status = 'pending' AND depth = ? " \
+            + 'ORDER BY rowid LIMIT ?', [crawl_name, depth, limit]).fetchall()
+        return [record[0] for record in records]
         
-    # Spotify track 
-    def save_track(self, track):
-        ''' Save track in the DB.
+    def frontier_counts(self, crawl_name):
+        ''' Count crawl entries by depth and status.
     
         Parameters
         ----------
-        Track
-            Internal Track object
+        Str
+            Crawl name
     
         Returns
         -------
-        Track
-            Internal Track object
+        Dict
+            {depth: {status: count}}
         '''
-        db_cursor = self.conn.cursor()
-        db_cursor.execute('INSERT INTO track values (?,?,?,?,?)', \
-            [track.track_id, track.track_name, track.duration_ms,\
-             track.popularity, track.external_url])
-        self.conn.commit()
-        
-        for artist in track.artists:
-            db_cursor.execute('INSERT INTO track_artist values (?,?)', \
-              [track.track_id, artist.artist_id])
-            self.conn.commit()
+        records = self.connections.reader().execute('SELECT depth, status, ' \
+            + 'count(*) FROM crawl_frontier WHERE crawl_name = ? ' \
+            + 'GROUP BY depth, status', [crawl_name]).fetchall()
+        counts = {}
+        for depth, status, count in records:
+            counts.setdefault(depth, {})[status] = count
+        return counts
         
-        return track
-        
-    def find_track(self, track_id):
-        ''' Get track in the DB. Return None if there is no record.
+    # Negative cache
+    def save_negative(self, entity_type, entity_id, reason, error_class):
+        ''' Remember that an id could not be fetched.
     
         Parameters
         ----------
         Str
-            Track id
+            Entity type, e.g. 'track'
+        
+        Str
+            Entity id
+        
+        Str
+            'missing' if the id does not exist, 'failed' for other errors
+        
+        Str
+            Class name of the error
     
         Returns
         -------
-        Track
-            Internal Track object
+        None
         '''
-        db_cursor = self.conn.cursor()
-        record = db_cursor.execute('SELECT * FROM track WHERE track_id = ?',\
-            [track_id]).fetchone()
-        if record is None:
-            return record
-        track = Track(record[0], record[1], record[2], record[3], record[4])
+        self._write('negative_cache', \
+            [[entity_type, entity_id, reason, error_class, int(time.time())]])
         
-        artist_db_objects = db_cursor\
-            .execute('SELECT * FROM track_artist WHERE track_id = ?',\
-            [track_id]).fetchall()
-        
-        for artist_db_object in artist_db_objects:
-            track.artists.append(self.find_artist(artist_db_object[1]))
+    def find_negatives(self, entity_type, entity_ids):
+        ''' Get negative cache records for many ids.
+    
+        Parameters
+        ----------
+        Str
+            Entity type, e.g. 'track'
         
-        return track
+        List
+            A list of entity ids
+    
+        Returns
+        -------
+        Dict
+            (reason, error class, recorded on) by entity id, for the ids
+            that have a record
+        '''
+        records = self._select_in('SELECT entity_id, reason, error_class, ' \
+            + 'recorded_on FROM negative_cache WHERE entity_type = ? ' \
+            + 'AND entity_id IN ({})', entity_ids, [entity_type])
+        return {record[0]: (record[1], record[2], record[3]) \
+                for record in records}
         
-    # Spotify playlist 
-    def save_playlist(self, playlist):
-        ''' Save playlist in the DB.
+    def find_negative(self, entity_type, entity_id):
+        ''' Get the negative cache record for an id. Return None if there
+        is no record.
     
         Parameters
         ----------
-        Playlist
-            Internal Playlist object
+        Str
+            Entity type, e.g. 'track'
+        
+        Str
+            Entity id
     
         Returns
         -------
-        Playlist
-            Internal Playlist object
+        Tuple
+            (reason, error class, recorded on)
         '''
-        db_cursor = self.conn.cursor()
-        db_cursor.execute('INSERT INTO playlist values (?,?,?,?,?,?)', \
-            [playlist.playlist_id, playlist.playlist_name, playlist.owner_name,\
-             playlist.playlist_description, playlist.followers, \
-             playlist.external_url])
-        self.conn.commit()
+        return self.find_negatives(entity_type, [entity_id]).get(entity_id)
+        
+    # Search result cache
+    def save_search(self, search_type, query, result_ids):
+        ''' Save the ordered result ids of a search.
+    
+        Parameters
+        ----------
+        Str
+            Search type, e.g. 'artist'
         
-        for track in playlist.tracks:
-            db_cursor.execute('INSERT INTO playlist_track values (?,?)', \
-              [playlist.playlist_id, track.track_id])
-            self.conn.commit()
+        Str
+            Normalized query
         
-        return playlist
+        List
+            A list of result ids, best match first
+    
+        Returns
+        -------
+        None
+        '''
+        now = int(time.time())
+        self._write('search_cache', \
+            [[search_type, query, ','.join(result_ids), now, now]])
         
-    def find_playlist(self, playlist_id):
-        ''' Get playlist in the DB. Return None if there is no record.
+    def find_search(self, search_type, query):
+        ''' Get the cached result ids of a search and mark it as recently
+        used. Return None if the search is not cached.
     
         Parameters
         ----------
         Str
-            Playlist id
+            Search type, e.g. 'artist'
+        
+        Str
+            Normalized query
     
         Returns
         -------
-        Playlist
-            Internal Playlist object
+        Tuple
+            (a list of result ids, fetched on)
         '''
-        db_cursor = self.conn.cursor()
-        record = db_cursor\
-            .execute('SELECT * FROM playlist WHERE playlist_id = ?',\
-            [playlist_id]).fetchone()
-        
+        record = self.connections.reader().execute('SELECT result_ids, ' \
+            + 'fetched_on FROM search_cache WHERE search_type = ? ' \
+            + 'AND query = ?', [search_type, query]).fetchone()
         if record is None:
-            return record
-        playlist = Playlist(record[0], record[1], record[2], record[3], \
-                            record[4], record[5])
+            return None
         
-        track_db_objects = db_cursor\
-            .execute('SELECT * FROM playlist_track WHERE playlist_id = ?',\
-            [playlist_id]).fetchall()
+        with self.connections.writer_lock, self.conn:
+            self.conn.execute('UPDATE search_cache SET used_on = ? ' \
+                + 'WHERE search_type = ? AND query = ?', \
+                [int(time.time()), search_type, query])
         
-        for track_db_object in track_db_objects:
-            playlist.tracks.append(self.find_track(track_db_object[1]))
+        if len(record[0]) == 0:
+            return [], record[1]
+        return record[0].split(','), record[1]
         
-        return playlist
+    def evict_searches(self, capacity):
+        ''' Delete the least recently used searches over capacity.
+    
+        Parameters
+        ----------
+        int
+            Number of searches to keep
+    
+        Returns
+        -------
+        int
+            Number of searches deleted
+        '''
+        with self.connections.writer_lock, self.conn:
+            return self.conn.execute('DELETE FROM search_cache WHERE rowid ' \
+                + 'IN (SELECT rowid FROM search_cache ORDER BY used_on DESC ' \
+                + 'LIMIT -1 OFFSET ?)', [capacity]).rowcount
         
-    # Spotify related artist 
-    def save_related_artists(self, to_artist_id, artists):
-        ''' Save related artists in the DB.
+    # Local full-text search
+    def _search_ids(self, sql, columns, keyword, limit):
+        ''' Run a ranked FTS5 query for a keyword typed by the user. Every
+        word must match; the last one also matches as a prefix.
     
         Parameters
         ----------
         Str
-            Artist id
+            SELECT statement taking the MATCH expression and the limit
         
         List
-            A list of artist objects
+            A list of FTS columns to match
+        
+        Str
+            Search keyword
+        
+        int
+            Maximum number of results
     
         Returns
         -------
         List
-            A list of artist objects
+            A list of ids, best match first
         '''
-        db_cursor = self.conn.cursor()
-        
-        for artist in artists:
-            if artist is None:
-                pass
-            db_cursor.execute('INSERT INTO related_artist values (?,?)', \
-              [to_artist_id, artist.artist_id])
-            self.conn.commit()
+        words = [word.replace('"', '""') for word in keyword.split()]
+        if len(words) == 0:
+            return []
+        query = '{' + ' '.join(columns) + '} : (' \
+              + ' '.join(['"' + word + '"' for word in words]) + '*)'
+        return [record[0] for record in self.connections.reader()\
+                .execute(sql, [query, limit]).fetchall()]
+    
+    def search_artists(self, keyword, limit=10, genres=False):
+        ''' Search cached artists by name, best match first.
+    
+        Parameters
+        ----------
+        Str
+            Search keyword
         
-        return artists
+        int
+            Maximum number of results
         
-    def find_related_artists(self, to_artist_id):
-        ''' Get playlist in the DB. Return None if there is no record.
+        bool
+            Also match the keyword against genres
+    
+        Returns
+        -------
+        List
+            A list of internal Artist objects
+        '''
+        # bm25 normalizes by the length of the whole row, so long genre
+        # lists would push real artists below karaoke covers. Every word
+        # has to match the name, so the shortest name is the closest one.
+        columns = ['artist_name']
+        order = 'length(artist.artist_name)'
+        if genres:
+            columns.append('genres')
+            order = 'rank'
+        ids = self._search_ids('SELECT artist.artist_id FROM artist_fts ' \
+            + 'JOIN artist ON artist.rowid = artist_fts.rowid ' \
+            + 'WHERE artist_fts MATCH ? ' \
+            + 'ORDER BY ' + order + ', artist.popularity DESC LIMIT ?', \
+            columns, keyword, limit)
+        return [artist for artist in self.find_artists(ids) \
+                if artist is not None]
+    
+    def search_tracks(self, keyword, limit=10):
+        ''' Search cached tracks by name, best match first.
     
         Parameters
         ----------
         Str
-            Playlist id
+            Search keyword
+        
+        int
+            Maximum number of results
     
         Returns
         -------
         List
-            A list of internal Artist object
+            A list of internal Track objects
         '''
-        db_cursor = self.conn.cursor()
-        
-        ids = db_cursor\
-        .execute('SELECT * FROM related_artist WHERE related_to_artist_id = ?',\
-            [to_artist_id]).fetchall()
+        ids = self._search_ids('SELECT track.track_id FROM track_fts ' \
+            + 'JOIN track ON track.rowid = track_fts.rowid ' \
+            + 'WHERE track_fts MATCH ? ' \
+            + 'ORDER BY rank, track.popularity DESC LIMIT ?', \
+            ['track_name'], keyword, limit)
+        return [track for track in self.find_tracks(ids) \
+                if track is not None]
+    
+    # Reverse lookups (served by the secondary indexes of db_migrations)
+    def _reverse_ids(self, sql, id):
+        ''' Run a one-column reverse lookup query.
+    
+        Parameters
+        ----------
+        Str
+            SELECT statement returning one id column
         
-        artists = []
-        for id in ids:
-            artists.append(self.find_artist(id[1]))
-            
-        if len(artists) == 0:
+        Str
+            Id to look up
+    
+        Returns
+        -------
+        List
+            A list of ids
+        '''
+        return [record[0] for record in \
+                self.connections.reader().execute(sql, [id]).fetchall()]
+    
+    def find_tracks_by_artist(self, artist_id):
+        ''' Get all cached tracks by an artist. Return None if there is no
+        record.
+    
+        Parameters
+        ----------
+        Str
+            Artist id
+    
+        Returns
+        -------
+        List
+            A list of internal Track objects
+        '''
+        ids = self._reverse_ids(\
+            'SELECT track_id FROM track_artist WHERE artist_id = ?', artist_id)
+        tracks = [track for track in self.find_tracks(ids) \
+                  if track is not None]
+        if len(tracks) == 0:
             return None
-        
-        return artists
-        
-    # Spotify featured playlists
-    def save_featured_palylists(self, playlists):
-        ''' Save featured palylist in the DB.
+        return tracks
+    
+    def find_artist_ids_by_tracks(self, track_ids):
+        ''' Get the artist ids of many tracks.
     
         Parameters
         ----------
         List
-            A list of internal playlist objects
+            A list of track ids
     
         Returns
         -------
         List
-            A list of internal playlist objects
+            Distinct artist ids in track order
         '''
-        cur_timestamp = int(str(time.time()).replace('.', ''))
-        
-        db_cursor = self.conn.cursor()
+        records = self._select_in('SELECT track_id, artist_id ' \
+            + 'FROM track_artist WHERE track_id IN ({})', track_ids)
+        by_track = {}
+        for track_id, artist_id in records:
+            by_track.setdefault(track_id, []).append(artist_id)
+        return list(dict.fromkeys(artist_id for track_id in track_ids \
+                                  for artist_id in by_track.get(track_id, [])))
         
-        for playlist in playlists:
-            if playlist is None:
-                pass
-            db_cursor.execute('INSERT INTO featured_playlist values (?,?)', \
-              [playlist.playlist_id, cur_timestamp])
-            self.conn.commit()
+    # Genres, kept in sync with artist.genres by triggers
+    def find_artists_by_genre(self, genre_name, limit=None):
+        ''' Get cached artists of a genre, most popular first.
+    
+        Parameters
+        ----------
+        Str
+            Genre name
         
-        return playlists
+        int
+            Maximum number of artists, None for all
+    
+        Returns
+        -------
+        List
+            A list of internal Artist objects
+        '''
+        ids = [record[0] for record in self.connections.reader().execute(\
+            'SELECT artist.artist_id FROM genre ' \
+            + 'JOIN artist_genre ON artist_genre.genre_id = genre.genre_id ' \
+            + 'JOIN artist ON artist.artist_id = artist_genre.artist_id ' \
+            + 'WHERE genre.genre_name = ? ' \
+            + 'ORDER BY artist.popularity DESC LIMIT ?', \
+            [genre_name, -1 if limit is None else limit]).fetchall()]
+        return [artist for artist in self.find_artists(ids) \
+                if artist is not None]
         
-    def find_featured_palylists(self):
-        ''' Get playlist in the DB. Return None if there is no record.
+    def genre_histogram(self, artist_ids=None):
+        ''' Count artists per genre, for a set of artists or all of them.
     
         Parameters
         ----------
-        Str
-            Playlist id
+        List
+            A list of artist ids, None for every cached artist
     
         Returns
         -------
         List
-            A list of internal Artist object
+            A list of (genre name, artist count) tuples, largest first
         '''
-        db_cursor = self.conn.cursor()
+        sql = 'SELECT genre.genre_name, count(*) FROM artist_genre ' \
+            + 'JOIN genre ON genre.genre_id = artist_genre.genre_id {} ' \
+            + 'GROUP BY artist_genre.genre_id'
+        if artist_ids is None:
+            records = self.connections.reader().execute(\
+                sql.format('')).fetchall()
+        else:
+            records = self._select_in(sql.format(\
+                'WHERE artist_genre.artist_id IN ({})'), artist_ids)
         
-        ids = db_cursor.execute('SELECT * FROM featured_playlist').fetchall()
+        # Id lists longer than one chunk give one count per chunk
+        counts = {}
+        for genre_name, count in records:
+            counts[genre_name] = counts.get(genre_name, 0) + count
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
         
-        playlists = []
-        for id in ids:
-            playlists.append(self.find_playlist(id[0]))
-            
+    def find_playlists_by_track(self, track_id):
+        ''' Get all cached playlists that contain a track. Return None if
+        there is no record.
+    
+        Parameters
+        ----------
+        Str
+            Track id
+    
+        Returns
+        -------
+        List
+            A list of internal Playlist objects
+        '''
+        ids = self._reverse_ids(\
+            'SELECT playlist_id FROM playlist_track WHERE track_id = ?', \
+            track_id)
+        loaded = self._load_playlists(ids)
+        playlists = [loaded[id] for id in ids if id in loaded]
         if len(playlists) == 0:
             return None
-        
         return playlists
-        
-    # Twitter
-    def save_twitter(self, twitter):
-        ''' Save featured palylist in the DB.
+    
+    def find_tracks_by_twitter(self, twitter_id):
+        ''' Get all cached tracks a Twitter post was found for. Return None
+        if there is no record.
     
         Parameters
         ----------
-        List
-            A list of internal Twitter objects
+        Str
+            Twitter id
     
         Returns
         -------
         List
-            A list of internal Twitter objects
+            A list of internal Track objects
         '''
-        db_cursor = self.conn.cursor()
-        
-        try:
-            db_cursor.execute('INSERT INTO twitter values (?,?,?,?,?)',\
-                [twitter.twitter_id, twitter.user_name, twitter.url, \
-                 twitter.text, twitter.created_at])
-            self.conn.commit()
-        except:
-            pass
-        
-        return twitter
-        
-    def find_twitter(self, twitter_id):
-        ''' Find Twitter by id
+        ids = self._reverse_ids(\
+            'SELECT track_id FROM track_twitter WHERE twitter_id = ?', \
+            twitter_id)
+        tracks = [track for track in self.find_tracks(ids) \
+                  if track is not None]
+        if len(tracks) == 0:
+            return None
+        return tracks
+    
+    def find_artists_related_to(self, artist_id):
+        ''' Get all cached artists that list artist_id as a related
+        artist. Return None if there is no record.
     
         Parameters
         ----------
         Str
-            Twitter id
+            Artist id
     
         Returns
         -------
         List
-            A list of internal Twitter objects
+            A list of internal Artist objects
         '''
-        db_cursor = self.conn.cursor()
-        
-        record = db_cursor\
-            .execute('SELECT * FROM twitter WHERE twitter_id = ?',\
-                     [twitter_id]).fetchone()
-        if record is None:
-            return record
-        twitter = Twitter(record[0], record[1], record[2], record[3], record[4])
-        return twitter
+        ids = self._reverse_ids(\
+            'SELECT related_to_artist_id FROM related_artist ' \
+            + 'WHERE artist_id = ?', artist_id)
+        artists = [artist for artist in self.find_artists(ids) \
+                   if artist is not None]
+        if len(artists) == 0:
+            return None
+        return artists
         
-    def save_twitter_by_track(self, track, twitters):
-        ''' Save featured palylist in the DB.
+    # Bulk saves
+    def save_artists(self, artists):
+        ''' Save a list of artists in one transaction.
     
         Parameters
         ----------
-        Track
-            Internal Track object
-        
         List
-            A list of internal Twitter objects
+            A list of internal Artist objects
     
         Returns
         -------
         List
-            A list of internal Twitter objects
+            A list of internal Artist objects
         '''
-        db_cursor = self.conn.cursor()
-        
-        for twitter in twitters:
-            if twitter is None:
-                pass
-            db_cursor.execute('INSERT INTO track_twitter values (?,?)', \
-              [track.track_id, twitter.twitter_id])
-            self.conn.commit()
-        
-        return twitters
-        
-    def find_twitters_by_track(self, track):
-        ''' Save featured palylist in the DB.
+        with self.batch():
+            for artist in artists:
+                self.save_artist(artist)
+        return artists
+    
+    def save_tracks(self, tracks):
+        ''' Save a list of tracks and their artist links in one transaction.
+    
+        Parameters
+        ----------
+        List
+            A list of internal Track objects
+    
+        Returns
+        -------
+        List
+            A list of internal Track objects
+        '''
+        with self.batch():
+            for track in tracks:
+                self.save_track(track)
+        return tracks
+    
+    def save_playlists(self, playlists):
+        ''' Save a list of playlists and their track links in one
+        transaction.
+    
+        Parameters
+        ----------
+        List
+            A list of internal Playlist objects
+    
+        Returns
+        -------
+        List
+            A list of internal Playlist objects
+        '''
+        with self.batch():
+            for playlist in playlists:
+                self.save_playlist(playlist)
+        return playlists
+    
+    def save_twitters(self, twitters):
+        ''' Save a list of Twitter posts in one transaction.
     
         Parameters
         ----------
-        Track
-            Internal Track object
-        
         List
             A list of internal Twitter objects
     
@@ -378,17 +1792,7 @@ class DataAccessor:
         List
             A list of internal Twitter objects
         '''
-        db_cursor = self.conn.cursor()
-        
-        ids = db_cursor\
-                .execute('SELECT * FROM track_twitter WHERE track_id = ?',\
-                 [track.track_id]).fetchall()
-        
-        twitters = []
-        for id in ids:
-            twitters.append(self.find_twitter(id[1]))
-            
-        if len(twitters) == 0:
-            return None
-        
-        return twitters
\ No newline at end of file
+        with self.batch():
+            for twitter in twitters:
+                self.save_twitter(twitter)
+        return twitters
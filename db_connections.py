@@ -0,0 +1,167 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import os
+import sqlite3
+import threading
+import weakref
+
+# Connection settings. cache_size is in KiB when negative (SQLite rule),
+# mmap_size in bytes and busy_timeout in ms.
+performance_profiles = {
+    'default': {
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 64 * 1024 * 1024,
+        'busy_timeout': 5000,
+    },
+    'bulk': {
+        'synchronous': 'OFF',
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 30000,
+    },
+    'safe': {
+        'synchronous': 'FULL',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'busy_timeout': 5000,
+    },
+}
+
+class ReaderHandle:
+    ''' Holds the read-only connection of one thread. It lives in the
+    thread-local storage, so it is collected when the thread exits.
+    '''
+    def __init__(self, conn):
+        self.conn = conn
+
+class ConnectionManager:
+    ''' WAL-mode SQLite connections: one shared writer connection that
+    callers serialize through writer_lock, and one read-only connection
+    per thread, closed when its thread exits.
+    '''
+    def __init__(self, db_name, profile='default'):
+        if isinstance(profile, str):
+            profile = performance_profiles[profile]
+        self.profile = dict(performance_profiles['default'])
+        self.profile.update(profile)
+
+        self.db_name = db_name
+        self.in_memory = db_name == ':memory:'
+
+        self.writer_lock = threading.RLock()
+        self.writer = sqlite3.connect(db_name, check_same_thread=False)
+        if not self.in_memory:
+            self.writer.execute('PRAGMA journal_mode = WAL')
+        self._configure(self.writer)
+        self.writer.execute('PRAGMA synchronous = ' \
+                            + str(self.profile['synchronous']))
+
+        self._local = threading.local()
+        self._readers = set()
+        self._readers_lock = threading.Lock()
+
+    def _configure(self, conn):
+        ''' Apply the profile pragmas shared by readers and the writer.
+
+        Parameters
+        ----------
+        Connection
+            SQLite connection
+
+        Returns
+        -------
+        None
+        '''
+        conn.execute('PRAGMA cache_size = ' \
+                     + str(int(self.profile['cache_size'])))
+        conn.execute('PRAGMA mmap_size = ' \
+                     + str(int(self.profile['mmap_size'])))
+        conn.execute('PRAGMA busy_timeout = ' \
+                     + str(int(self.profile['busy_timeout'])))
+
+    def reader(self):
+        ''' Get the read-only connection of the calling thread, opening it
+        on first use. An in-memory DB has no second connection, so its
+        readers share the writer.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Connection
+            Read-only SQLite connection
+        '''
+        if self.in_memory:
+            return self.writer
+
+        handle = getattr(self._local, 'reader', None)
+        if handle is None:
+            uri = 'file:' + os.path.abspath(self.db_name) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._configure(conn)
+            handle = ReaderHandle(conn)
+            self._local.reader = handle
+            with self._readers_lock:
+                self._readers.add(conn)
+            # Worker threads of short-lived pools would otherwise keep
+            # their connection open until close()
+            weakref.finalize(handle, self._close_reader, conn)
+        return handle.conn
+
+    def _close_reader(self, conn):
+        ''' Close the reader of a thread that exited.
+
+        Parameters
+        ----------
+        Connection
+            Read-only SQLite connection
+
+        Returns
+        -------
+        None
+        '''
+        with self._readers_lock:
+            if conn not in self._readers:
+                return
+            self._readers.discard(conn)
+        conn.close()
+
+    def reader_count(self):
+        ''' Get the number of open reader connections.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            Open readers
+        '''
+        with self._readers_lock:
+            return len(self._readers)
+
+    def close(self):
+        ''' Close every reader and the writer.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = set()
+        self._local = threading.local()
+        with self.writer_lock:
+            self.writer.close()
@@ -0,0 +1,353 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import os
+import sys
+import time
+import sqlite3
+
+schema_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+                           'Create_Tables.sql')
+
+
+# ------------------------ Migrations ------------------------
+def create_base_tables(conn):
+    ''' Version 1: the tables of Create_Tables.sql. Databases created
+    before migrations existed already have them and are left as is.
+
+    Parameters
+    ----------
+    Connection
+        SQLite connection inside the migration transaction
+
+    Returns
+    -------
+    None
+    '''
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table'" \
+                          + " AND name = 'artist'").fetchone()
+    if exists is not None:
+        return
+
+    with open(schema_file) as f:
+        for statement in f.read().split(';'):
+            if len(statement.strip()) > 0:
+                conn.execute(statement)
+
+def genre_values_sql(column):
+    ''' Build a json_each() call over the genres of an artist, which are
+    stored joined by ', '. Triggers cannot use a recursive WITH to split
+    the string, so it is rewritten as a JSON array instead. Strings that
+    still are not valid JSON, e.g. with control characters, give no genres
+    rather than failing the artist write.
+
+    Parameters
+    ----------
+    Str
+        SQL expression of the genres string, e.g. new.genres
+
+    Returns
+    -------
+    Str
+        Table-valued function whose value column holds one genre per row
+    '''
+    escaped = "replace(replace(coalesce(" + column + ", ''), '\\', " \
+        + "'\\\\'), '\"', '\\\"')"
+    array = "'[\"' || replace(" + escaped + ", ', ', '\",\"') || '\"]'"
+    return "json_each(CASE WHEN json_valid(" + array + ") THEN " + array \
+        + " ELSE '[]' END)"
+
+def link_genres_sql(artist_id, genres, table=None):
+    ''' Build the statements that intern the genres of artists and link
+    them to the artists. Existing rows are skipped with NOT EXISTS rather
+    than OR IGNORE: a trigger fired by an upsert takes the upsert's
+    conflict handling, which does not ignore them.
+
+    Parameters
+    ----------
+    Str
+        SQL expression of the artist id, e.g. new.artist_id
+
+    Str
+        SQL expression of the genres string
+
+    Str
+        Table to read the artists from, None inside a trigger
+
+    Returns
+    -------
+    List
+        INSERT statements for genre and artist_genre
+    '''
+    source = genre_values_sql(genres)
+    if table is not None:
+        source = table + ', ' + source
+    return ["INSERT INTO genre (genre_name) SELECT DISTINCT value FROM " \
+                + source + " WHERE value != '' AND NOT EXISTS " \
+                + "(SELECT 1 FROM genre WHERE genre_name = value)",
+            "INSERT INTO artist_genre (artist_id, genre_id) " \
+                + "SELECT DISTINCT " + artist_id + ", genre.genre_id FROM " \
+                + source + " JOIN genre ON genre.genre_name = value " \
+                + "WHERE NOT EXISTS (SELECT 1 FROM artist_genre AS linked " \
+                + "WHERE linked.artist_id = " + artist_id \
+                + " AND linked.genre_id = genre.genre_id)"]
+
+# Numbered migrations, applied in order: (version, description, step).
+# A step is a list of SQL statements or a function taking the connection.
+migrations = [
+    (1, 'Base tables', create_base_tables),
+    (2, 'Secondary indexes for reverse lookups', [
+        'CREATE INDEX IF NOT EXISTS track_artist_by_artist ' \
+            + 'ON track_artist (artist_id)',
+        'CREATE INDEX IF NOT EXISTS playlist_track_by_track ' \
+            + 'ON playlist_track (track_id)',
+        'CREATE INDEX IF NOT EXISTS track_twitter_by_twitter ' \
+            + 'ON track_twitter (twitter_id)',
+        'CREATE INDEX IF NOT EXISTS related_artist_by_artist ' \
+            + 'ON related_artist (artist_id)',
+    ]),
+    (3, 'FTS5 search index over artist and track names', [
+        "CREATE VIRTUAL TABLE artist_fts USING fts5(" \
+            + "artist_name, genres, content='artist', " \
+            + "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE VIRTUAL TABLE track_fts USING fts5(" \
+            + "track_name, content='track', " \
+            + "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER artist_fts_insert AFTER INSERT ON artist BEGIN " \
+            + "INSERT INTO artist_fts (rowid, artist_name, genres) " \
+            + "VALUES (new.rowid, new.artist_name, new.genres); END",
+        "CREATE TRIGGER artist_fts_delete AFTER DELETE ON artist BEGIN " \
+            + "INSERT INTO artist_fts (artist_fts, rowid, artist_name, " \
+            + "genres) VALUES ('delete', old.rowid, old.artist_name, " \
+            + "old.genres); END",
+        "CREATE TRIGGER artist_fts_update AFTER UPDATE ON artist BEGIN " \
+            + "INSERT INTO artist_fts (artist_fts, rowid, artist_name, " \
+            + "genres) VALUES ('delete', old.rowid, old.artist_name, " \
+            + "old.genres); " \
+            + "INSERT INTO artist_fts (rowid, artist_name, genres) " \
+            + "VALUES (new.rowid, new.artist_name, new.genres); END",
+        "CREATE TRIGGER track_fts_insert AFTER INSERT ON track BEGIN " \
+            + "INSERT INTO track_fts (rowid, track_name) " \
+            + "VALUES (new.rowid, new.track_name); END",
+        "CREATE TRIGGER track_fts_delete AFTER DELETE ON track BEGIN " \
+            + "INSERT INTO track_fts (track_fts, rowid, track_name) " \
+            + "VALUES ('delete', old.rowid, old.track_name); END",
+        "CREATE TRIGGER track_fts_update AFTER UPDATE ON track BEGIN " \
+            + "INSERT INTO track_fts (track_fts, rowid, track_name) " \
+            + "VALUES ('delete', old.rowid, old.track_name); " \
+            + "INSERT INTO track_fts (rowid, track_name) " \
+            + "VALUES (new.rowid, new.track_name); END",
+        "INSERT INTO artist_fts (artist_fts) VALUES ('rebuild')",
+        "INSERT INTO track_fts (track_fts) VALUES ('rebuild')",
+    ]),
+    (4, 'Fetch time per cached row', [
+        'ALTER TABLE artist ADD COLUMN fetched_on int',
+        'ALTER TABLE track ADD COLUMN fetched_on int',
+        'ALTER TABLE playlist ADD COLUMN fetched_on int',
+        # updated_on used to be time.time() with the dot removed; its
+        # first ten digits are the Unix time in seconds
+        'UPDATE featured_playlist SET updated_on = ' \
+            + 'CAST(substr(CAST(updated_on AS TEXT), 1, 10) AS INTEGER) ' \
+            + 'WHERE updated_on > 9999999999',
+    ]),
+    (5, 'Negative cache for missing and failed lookups', [
+        'CREATE TABLE negative_cache (' \
+            + 'entity_type varchar(255) NOT NULL, ' \
+            + 'entity_id varchar(255) NOT NULL, ' \
+            + 'reason varchar(255) NOT NULL, ' \
+            + 'error_class varchar(255), ' \
+            + 'recorded_on int NOT NULL, ' \
+            + 'PRIMARY KEY(entity_type, entity_id))',
+    ]),
+    (6, 'Search result cache', [
+        'CREATE TABLE search_cache (' \
+            + 'search_type varchar(255) NOT NULL, ' \
+            + 'query varchar(255) NOT NULL, ' \
+            + 'result_ids text NOT NULL, ' \
+            + 'fetched_on int NOT NULL, ' \
+            + 'used_on int NOT NULL, ' \
+            + 'PRIMARY KEY(search_type, query))',
+        'CREATE INDEX search_cache_by_used_on ON search_cache (used_on)',
+    ]),
+    (7, 'Tweet search cursor per track', [
+        'CREATE TABLE tweet_cursor (' \
+            + 'track_id varchar(255) NOT NULL PRIMARY KEY, ' \
+            + 'since_id varchar(255), ' \
+            + 'updated_on int NOT NULL)',
+    ]),
+    (8, 'Related artist crawl frontier', [
+        'CREATE TABLE crawl_frontier (' \
+            + 'crawl_name varchar(255) NOT NULL, ' \
+            + 'artist_id varchar(255) NOT NULL, ' \
+            + 'depth int NOT NULL, ' \
+            + 'status varchar(255) NOT NULL, ' \
+            + 'updated_on int NOT NULL, ' \
+            + 'PRIMARY KEY(crawl_name, artist_id))',
+        'CREATE INDEX crawl_frontier_by_status ' \
+            + 'ON crawl_frontier (crawl_name, status, depth)',
+    ]),
+    (9, 'Normalized genres kept in sync with artist.genres', [
+        'CREATE TABLE genre (' \
+            + 'genre_id INTEGER PRIMARY KEY, ' \
+            + 'genre_name varchar(255) NOT NULL UNIQUE)',
+        'CREATE TABLE artist_genre (' \
+            + 'artist_id varchar(255) NOT NULL, ' \
+            + 'genre_id int NOT NULL, ' \
+            + 'FOREIGN KEY (artist_id) REFERENCES Artist(artist_id), ' \
+            + 'FOREIGN KEY (genre_id) REFERENCES genre(genre_id), ' \
+            + 'PRIMARY KEY(artist_id, genre_id)) WITHOUT ROWID',
+        'CREATE INDEX artist_genre_by_genre ' \
+            + 'ON artist_genre (genre_id, artist_id)',
+        'CREATE TRIGGER artist_genre_insert AFTER INSERT ON artist BEGIN ' \
+            + '; '.join(link_genres_sql('new.artist_id', 'new.genres')) \
+            + '; END',
+        'CREATE TRIGGER artist_genre_update AFTER UPDATE OF genres ' \
+            + 'ON artist WHEN old.genres IS NOT new.genres BEGIN ' \
+            + 'DELETE FROM artist_genre WHERE artist_id = old.artist_id; ' \
+            + '; '.join(link_genres_sql('new.artist_id', 'new.genres')) \
+            + '; END',
+        'CREATE TRIGGER artist_genre_delete AFTER DELETE ON artist BEGIN ' \
+            + 'DELETE FROM artist_genre WHERE artist_id = old.artist_id; END',
+    ] + link_genres_sql('artist.artist_id', 'artist.genres', 'artist')),
+    (10, 'FTS update triggers only for indexed columns', [
+        # fetched_on touches and upserts that only change popularity used
+        # to delete and reinsert the FTS rows
+        'DROP TRIGGER artist_fts_update',
+        'DROP TRIGGER track_fts_update',
+        "CREATE TRIGGER artist_fts_update AFTER UPDATE OF artist_name, " \
+            + "genres ON artist WHEN old.artist_name IS NOT new.artist_name " \
+            + "OR old.genres IS NOT new.genres BEGIN " \
+            + "INSERT INTO artist_fts (artist_fts, rowid, artist_name, " \
+            + "genres) VALUES ('delete', old.rowid, old.artist_name, " \
+            + "old.genres); " \
+            + "INSERT INTO artist_fts (rowid, artist_name, genres) " \
+            + "VALUES (new.rowid, new.artist_name, new.genres); END",
+        "CREATE TRIGGER track_fts_update AFTER UPDATE OF track_name " \
+            + "ON track WHEN old.track_name IS NOT new.track_name BEGIN " \
+            + "INSERT INTO track_fts (track_fts, rowid, track_name) " \
+            + "VALUES ('delete', old.rowid, old.track_name); " \
+            + "INSERT INTO track_fts (rowid, track_name) " \
+            + "VALUES (new.rowid, new.track_name); END",
+    ]),
+    (11, 'Unfinished tweet walk per track', [
+        # Tweets between since_id and max_id are still to be fetched, the
+        # ones above max_id up to newest_id are saved
+        'ALTER TABLE tweet_cursor ADD COLUMN max_id varchar(255)',
+        'ALTER TABLE tweet_cursor ADD COLUMN newest_id varchar(255)',
+    ]),
+    (12, 'Genre triggers that work under upserts', [
+        # The OR IGNORE inserts of version 9 failed with a UNIQUE error
+        # when an upsert changed the genres of a saved artist
+        'DROP TRIGGER artist_genre_insert',
+        'DROP TRIGGER artist_genre_update',
+        'CREATE TRIGGER artist_genre_insert AFTER INSERT ON artist BEGIN ' \
+            + '; '.join(link_genres_sql('new.artist_id', 'new.genres')) \
+            + '; END',
+        'CREATE TRIGGER artist_genre_update AFTER UPDATE OF genres ' \
+            + 'ON artist WHEN old.genres IS NOT new.genres BEGIN ' \
+            + 'DELETE FROM artist_genre WHERE artist_id = old.artist_id; ' \
+            + '; '.join(link_genres_sql('new.artist_id', 'new.genres')) \
+            + '; END',
+    ]),
+]
+
+
+# ------------------------ Runner ------------------------
+def schema_version(conn):
+    ''' Get the latest applied migration version.
+
+    Parameters
+    ----------
+    Connection
+        SQLite connection
+
+    Returns
+    -------
+    int
+        Schema version, 0 if no migration has been applied
+    '''
+    conn.execute('CREATE TABLE IF NOT EXISTS schema_version (' \
+                 + 'version int NOT NULL PRIMARY KEY, ' \
+                 + 'description varchar(255), ' \
+                 + 'applied_on int NOT NULL)')
+    version = conn.execute('SELECT max(version) FROM schema_version')\
+                  .fetchone()[0]
+    if version is None:
+        return 0
+    return version
+
+def analyze(conn):
+    ''' Refresh the query planner statistics.
+
+    Parameters
+    ----------
+    Connection
+        SQLite connection
+
+    Returns
+    -------
+    None
+    '''
+    conn.execute('ANALYZE')
+    conn.commit()
+
+def migrate(conn):
+    ''' Apply every migration newer than the recorded schema version. Each
+    migration runs in its own transaction together with its version row.
+
+    Parameters
+    ----------
+    Connection
+        SQLite connection
+
+    Returns
+    -------
+    List
+        A list of applied migration versions
+    '''
+    current = schema_version(conn)
+    conn.commit()
+
+    applied = []
+    for version, description, step in migrations:
+        if version <= current:
+            continue
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the lock
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            if callable(step):
+                step(conn)
+            else:
+                for statement in step:
+                    conn.execute(statement)
+            conn.execute('INSERT INTO schema_version values (?,?,?)', \
+                         [version, description, int(time.time())])
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    if len(applied) > 0:
+        analyze(conn)
+    return applied
+
+
+# ------------------------ Main function ---------------------
+if __name__ == "__main__":
+    # Usage: python3 db_migrations.py [db_name]
+    db_name = 'final_pj.sqlite'
+    if len(sys.argv) > 1:
+        db_name = sys.argv[1]
+
+    db_conn = sqlite3.connect(db_name)
+    applied = migrate(db_conn)
+    print('Applied migrations: ' + str(applied))
+    print('Schema version: ' + str(schema_version(db_conn)))
+    db_conn.close()
@@ -0,0 +1,160 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import threading
+from collections import OrderedDict
+
+# Default number of entries kept per entity type
+default_capacities = {
+    'artist': 5000,
+    'track': 5000,
+    'playlist': 100,
+    'twitter': 2000,
+    'related_artists': 1000,
+    'track_twitters': 500,
+    'featured_playlists': 1,
+}
+
+class EntityCache:
+    ''' Size-bounded LRU identity map keyed by entity type and id
+    '''
+    def __init__(self, capacities=None):
+        self.capacities = dict(default_capacities)
+        if capacities is not None:
+            self.capacities.update(capacities)
+
+        self.lock = threading.RLock()
+        self.entries = {}
+        
+        # Bumped by every invalidation. Loaders read it before querying so
+        # a row read before a commit is not cached after the invalidation.
+        self.generation = 0
+        self.hits = {}
+        self.misses = {}
+        self.evictions = {}
+
+    def get(self, entity_type, entity_id):
+        ''' Get a cached entity and mark it as recently used.
+
+        Parameters
+        ----------
+        Str
+            Entity type, e.g. 'artist'
+
+        Str
+            Entity id
+
+        Returns
+        -------
+        Object
+            The cached object, or None if it is not cached
+        '''
+        with self.lock:
+            entries = self.entries.get(entity_type)
+            if entries is None or entity_id not in entries:
+                self.misses[entity_type] = self.misses.get(entity_type, 0) + 1
+                return None
+            entries.move_to_end(entity_id)
+            self.hits[entity_type] = self.hits.get(entity_type, 0) + 1
+            return entries[entity_id]
+
+    def put(self, entity_type, entity_id, value, generation=None):
+        ''' Cache an entity, evicting the least recently used ones when the
+        entity type is over capacity.
+
+        Parameters
+        ----------
+        Str
+            Entity type, e.g. 'artist'
+
+        Str
+            Entity id
+
+        Object
+            The object to cache
+
+        int
+            Generation read before the object was loaded. The object is
+            not cached if anything was invalidated since.
+
+        Returns
+        -------
+        Object
+            The cached object
+        '''
+        capacity = self.capacities.get(entity_type, 0)
+        if capacity <= 0:
+            return value
+
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return value
+            entries = self.entries.setdefault(entity_type, OrderedDict())
+            entries[entity_id] = value
+            entries.move_to_end(entity_id)
+            while len(entries) > capacity:
+                entries.popitem(last=False)
+                self.evictions[entity_type] = \
+                    self.evictions.get(entity_type, 0) + 1
+        return value
+
+    def invalidate(self, entity_type, entity_id):
+        ''' Drop one cached entity.
+
+        Parameters
+        ----------
+        Str
+            Entity type, e.g. 'artist'
+
+        Str
+            Entity id
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            self.generation += 1
+            entries = self.entries.get(entity_type)
+            if entries is not None:
+                entries.pop(entity_id, None)
+
+    def clear(self):
+        ''' Drop every cached entity. Counters are kept.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            self.generation += 1
+            self.entries = {}
+
+    def stats(self):
+        ''' Get hit, miss and eviction counters per entity type.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict
+            A dict of {entity type: {'size', 'hits', 'misses', 'evictions'}}
+        '''
+        with self.lock:
+            result = {}
+            for entity_type in self.capacities:
+                result[entity_type] = {
+                    'size': len(self.entries.get(entity_type, ())),
+                    'hits': self.hits.get(entity_type, 0),
+                    'misses': self.misses.get(entity_type, 0),
+                    'evictions': self.evictions.get(entity_type, 0),
+                }
+            return result
@@ -0,0 +1,412 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import asyncio
+import random
+import threading
+import time
+
+# Status codes retried with backoff. 429 is the throttle signal.
+throttle_status = 429
+retry_status = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    ''' Token bucket refilled at rate tokens per second up to capacity.
+    Tokens are reserved ahead, so callers wait their turn in order.
+    '''
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_on = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        ''' Take one token.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        float
+            Seconds to wait before the token may be used
+        '''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, \
+                              self.tokens + (now - self.updated_on) * self.rate)
+            self.updated_on = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def available(self):
+        ''' Get the number of tokens available now, negative when reserved
+        ahead.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        float
+            Token count
+        '''
+        with self.lock:
+            return min(self.capacity, self.tokens \
+                       + (time.monotonic() - self.updated_on) * self.rate)
+
+def error_status(error):
+    ''' Get the HTTP status and headers of an error raised by spotipy,
+    requests or aiohttp.
+
+    Parameters
+    ----------
+    Exception
+        Error raised by a request
+
+    Returns
+    -------
+    Tuple
+        (status, headers), (None, None) for errors without a response
+    '''
+    status = getattr(error, 'http_status', None)
+    if status is None:
+        status = getattr(error, 'status', None)
+    headers = getattr(error, 'headers', None)
+
+    response = getattr(error, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+        headers = getattr(response, 'headers', None)
+    if not isinstance(status, int):
+        return None, None
+    return status, headers
+
+def retry_after(headers):
+    ''' Parse a Retry-After header given in seconds.
+
+    Parameters
+    ----------
+    Dict
+        Response headers, may be None
+
+    Returns
+    -------
+    float
+        Seconds to wait, None if the header is missing or not a number
+    '''
+    if headers is None:
+        return None
+    value = headers.get('Retry-After')
+    if value is None:
+        value = headers.get('retry-after')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    ''' Central scheduler for the requests of one API. Every request takes
+    a token from the API's bucket and one of limit concurrency slots. The
+    limit grows by one after limit successes in a row and halves on every
+    429 (AIMD). Throttled and transient errors are retried after
+    Retry-After or a jittered exponential backoff, and a Retry-After
+    pauses every request to the API.
+    '''
+    def __init__(self, name, rate, capacity, min_concurrency=1, \
+                 max_concurrency=16, max_retries=5, base_backoff=0.5, \
+                 max_backoff=60):
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.condition = threading.Condition()
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.paused_until = 0.0
+        self.async_waiters = []
+        self.counters = {'requests': 0, 'throttled': 0, 'retries': 0, \
+                         'failures': 0, 'waited': 0.0}
+
+    # ------------------------ Slots ------------------------
+    def _try_acquire(self):
+        ''' Take a slot and a token if a slot is free and the API is not
+        paused. Called with the condition held.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Tuple
+            (True, seconds to wait for the token) or (False, seconds to
+            wait before trying again, None until a slot is released)
+        '''
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False, self.paused_until - now
+        if self.in_flight >= int(self.limit):
+            return False, None
+        self.in_flight += 1
+        self.counters['requests'] += 1
+        return True, self.bucket.reserve()
+
+    def _release(self, outcome):
+        ''' Give back a slot and adjust the concurrency limit.
+
+        Parameters
+        ----------
+        Str
+            'ok', 'throttled' or 'error'
+
+        Returns
+        -------
+        None
+        '''
+        with self.condition:
+            self.in_flight -= 1
+            if outcome == 'ok':
+                self.limit = min(self.max_concurrency, \
+                                 self.limit + 1.0 / max(1, int(self.limit)))
+            elif outcome == 'throttled':
+                self.limit = max(self.min_concurrency, self.limit / 2)
+            self.condition.notify_all()
+            for loop, future in self.async_waiters:
+                loop.call_soon_threadsafe(_wake_future, future)
+            self.async_waiters = []
+
+    def acquire(self):
+        ''' Block until a slot and a token are available.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        start = time.monotonic()
+        with self.condition:
+            self.waiting += 1
+            try:
+                while True:
+                    granted, wait = self._try_acquire()
+                    if granted:
+                        break
+                    self.condition.wait(wait)
+            finally:
+                self.waiting -= 1
+        if wait > 0:
+            time.sleep(wait)
+        self._count_wait(time.monotonic() - start)
+
+    async def acquire_async(self):
+        ''' Wait without blocking the event loop until a slot and a token
+        are available.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        '''
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            self.waiting += 1
+        try:
+            while True:
+                with self.condition:
+                    granted, wait = self._try_acquire()
+                    if not granted:
+                        future = loop.create_future()
+                        self.async_waiters.append((loop, future))
+                if granted:
+                    break
+                try:
+                    await asyncio.wait_for(future, wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self.condition:
+                self.waiting -= 1
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._count_wait(time.monotonic() - start)
+
+    def _count_wait(self, seconds):
+        with self.condition:
+            self.counters['waited'] += seconds
+
+    # ------------------------ Retries ------------------------
+    def _classify(self, error, attempt):
+        ''' Decide whether a failed request is retried.
+
+        Parameters
+        ----------
+        Exception
+            Error raised by the request
+
+        int
+            Attempt number, from 0
+
+        Returns
+        -------
+        Tuple
+            (outcome for _release, seconds to wait before retrying or None
+            to raise)
+        '''
+        status, headers = error_status(error)
+        throttled = status == throttle_status
+        # requests and aiohttp connection errors are OSErrors
+        transient = status in retry_status or (status is None \
+            and isinstance(error, (OSError, asyncio.TimeoutError)))
+
+        with self.condition:
+            if throttled:
+                self.counters['throttled'] += 1
+            if not transient or attempt >= self.max_retries:
+                self.counters['failures'] += 1
+                return ('throttled' if throttled else 'error'), None
+            self.counters['retries'] += 1
+
+            # Full jitter backoff, but never earlier than Retry-After
+            wait = random.uniform(0, min(self.max_backoff, \
+                                         self.base_backoff * 2 ** attempt))
+            after = retry_after(headers) if throttled else None
+            if after is not None:
+                wait = max(wait, after)
+                self.paused_until = max(self.paused_until, \
+                                        time.monotonic() + after)
+        return ('throttled' if throttled else 'error'), wait
+
+    def call(self, function, *args, **kwargs):
+        ''' Run a request under the scheduler, retrying throttled and
+        transient failures.
+
+        Parameters
+        ----------
+        Function
+            Makes the request, raising on HTTP errors
+
+        Returns
+        -------
+        Object
+            What function returns
+        '''
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                outcome, wait = self._classify(e, attempt)
+                self._release(outcome)
+                if wait is None:
+                    raise
+                time.sleep(wait)
+                attempt += 1
+                continue
+            except BaseException:
+                self._release('error')
+                raise
+            self._release('ok')
+            return result
+
+    async def call_async(self, function, *args, **kwargs):
+        ''' Async counterpart of call.
+
+        Parameters
+        ----------
+        Function
+            Coroutine function making the request, raising on HTTP errors
+
+        Returns
+        -------
+        Object
+            What function returns
+        '''
+        attempt = 0
+        while True:
+            await self.acquire_async()
+            try:
+                result = await function(*args, **kwargs)
+            except Exception as e:
+                outcome, wait = self._classify(e, attempt)
+                self._release(outcome)
+                if wait is None:
+                    raise
+                await asyncio.sleep(wait)
+                attempt += 1
+                continue
+            except BaseException:
+                self._release('error')
+                raise
+            self._release('ok')
+            return result
+
+    # ------------------------ Metrics ------------------------
+    def metrics(self):
+        ''' Get queue depth, concurrency and throttle counters.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict
+            Scheduler state and counters
+        '''
+        with self.condition:
+            result = dict(self.counters)
+            result.update({
+                'name': self.name,
+                'queue_depth': self.waiting,
+                'in_flight': self.in_flight,
+                'concurrency_limit': int(self.limit),
+                'tokens': round(self.bucket.available(), 2),
+                'paused_for': round(max(0.0, self.paused_until \
+                                        - time.monotonic()), 2),
+            })
+            return result
+
+def _wake_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ScheduledClient:
+    ''' Wraps a client so every method call goes through a scheduler,
+    e.g. ScheduledClient(spotipy.Spotify(...), scheduler).artist(id)
+    '''
+    def __init__(self, client, scheduler):
+        self.client = client
+        self.scheduler = scheduler
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute):
+            return attribute
+
+        def scheduled(*args, **kwargs):
+            return self.scheduler.call(attribute, *args, **kwargs)
+        return scheduled
@@ -0,0 +1,235 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    ''' Coalesces concurrent calls for the same key. The first caller runs
+    the call, later callers wait for its result. Keys are forgotten once
+    the call finishes, so nothing is cached here.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.async_calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _claim(self, calls, keys, new_future):
+        ''' Claim the keys nobody is fetching. Called with the lock held.
+
+        Parameters
+        ----------
+        Dict
+            In-flight futures by key
+
+        List
+            A list of keys
+
+        Function
+            Creates an empty future
+
+        Returns
+        -------
+        Tuple
+            (claimed keys, futures of the keys other callers are fetching)
+        '''
+        claimed = []
+        waiting = {}
+        for key in dict.fromkeys(keys):
+            if key in calls:
+                waiting[key] = calls[key]
+                self.coalesced += 1
+            else:
+                calls[key] = new_future()
+                claimed.append(key)
+                self.leaders += 1
+        return claimed, waiting
+
+    def _settle(self, calls, claimed, results=None, error=None):
+        ''' Complete and forget the futures of claimed keys.
+
+        Parameters
+        ----------
+        Dict
+            In-flight futures by key
+
+        List
+            Claimed keys
+
+        Dict
+            Results by key; keys without a result get None
+
+        Exception
+            Error to raise in every waiter instead
+
+        Returns
+        -------
+        None
+        '''
+        with self.lock:
+            futures = [calls.pop(key) for key in claimed]
+        for key, future in zip(claimed, futures):
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results.get(key))
+
+    def do(self, key, function):
+        ''' Run function unless a call for key is already in flight, in
+        which case wait for that call instead.
+
+        Parameters
+        ----------
+        Hashable
+            Call key, e.g. ('artist', artist_id)
+
+        Function
+            Takes no argument
+
+        Returns
+        -------
+        Object
+            Result of the call, shared by every caller
+        '''
+        results = self.do_many([key], lambda keys: {key: function()})
+        return results[key]
+
+    def do_many(self, keys, function, return_exceptions=False):
+        ''' Run function for the keys not in flight, and wait for the
+        calls other callers are running for the rest.
+
+        Parameters
+        ----------
+        List
+            A list of call keys
+
+        Function
+            Takes the list of claimed keys, returns a dict of results by
+            key. Missing keys resolve to None.
+
+        bool
+            True to return the errors of other callers' calls as results
+            instead of raising them
+
+        Returns
+        -------
+        Dict
+            Results by key
+        '''
+        with self.lock:
+            claimed, waiting = self._claim(self.calls, keys, Future)
+
+        results = {}
+        if len(claimed) > 0:
+            try:
+                results = function(claimed)
+            except BaseException as e:
+                self._settle(self.calls, claimed, error=e)
+                raise
+            self._settle(self.calls, claimed, results)
+            results = dict(results)
+
+        for key in waiting:
+            try:
+                results[key] = waiting[key].result()
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[key] = e
+        return results
+
+    async def do_async(self, key, function):
+        ''' Async counterpart of do.
+
+        Parameters
+        ----------
+        Hashable
+            Call key
+
+        Function
+            Coroutine function taking no argument
+
+        Returns
+        -------
+        Object
+            Result of the call, shared by every caller
+        '''
+        async def run(keys):
+            return {key: await function()}
+        results = await self.do_many_async([key], run)
+        return results[key]
+
+    async def do_many_async(self, keys, function, return_exceptions=False):
+        ''' Async counterpart of do_many. Calls are shared between the
+        coroutines of one event loop.
+
+        Parameters
+        ----------
+        List
+            A list of call keys
+
+        Function
+            Coroutine function taking the list of claimed keys, returning
+            a dict of results by key
+
+        bool
+            True to return the errors of other callers' calls as results
+            instead of raising them
+
+        Returns
+        -------
+        Dict
+            Results by key
+        '''
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            calls = self.async_calls.setdefault(loop, {})
+            claimed, waiting = self._claim(calls, keys, loop.create_future)
+
+        results = {}
+        if len(claimed) > 0:
+            try:
+                results = await function(claimed)
+            except BaseException as e:
+                self._settle(calls, claimed, error=e)
+                raise
+            self._settle(calls, claimed, results)
+            results = dict(results)
+
+        for key in waiting:
+            # Shielded so one cancelled waiter does not cancel the call
+            try:
+                results[key] = await asyncio.shield(waiting[key])
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[key] = e
+        with self.lock:
+            if len(calls) == 0 and self.async_calls.get(loop) is calls:
+                del self.async_calls[loop]
+        return results
+
+    def stats(self):
+        ''' Get how many calls ran and how many were coalesced.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict
+            {'leaders', 'coalesced', 'in_flight'}
+        '''
+        with self.lock:
+            return {'leaders': self.leaders, 'coalesced': self.coalesced, \
+                    'in_flight': len(self.calls) + sum(len(calls) for calls \
+                                 in self.async_calls.values())}
@@ -12,6 +12,11 @@ import sqlite3
 import spotipy
 import webbrowser
 import sys
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 
 # Plot
 import plotly.express as px
@@ -28,6 +33,11 @@ from spotify_objects import Track
 from spotify_objects import Playlist
 from spotify_objects import Twitter
 
+# Request scheduling
+from rate_limiter import RequestScheduler
+from rate_limiter import ScheduledClient
+from single_flight import SingleFlight
+
 # Twitter config
 twitter_client_key = twitter_secrets.TWITTER_API_KEY
 twitter_client_secret = twitter_secrets.TWITTER_API_SECRET
@@ -41,10 +51,104 @@ twitter_oauth = OAuth1(twitter_client_key,
 
 twitter_base_url = "https://api.twitter.com/1.1/search/tweets.json"
 
+# One keep-alive session for every tweet search
+twitter_session = requests.Session()
+twitter_session.auth = twitter_oauth
+
+# Standard search allows 180 requests per 15 minutes. Burst plus refill
+# stays within any 15 minute window.
+twitter_search_quota = 180
+twitter_search_window = 15 * 60
+twitter_search_burst = 15
+twitter_scheduler = RequestScheduler('twitter', \
+    (twitter_search_quota - twitter_search_burst) / twitter_search_window, \
+    twitter_search_burst, max_concurrency=4)
+
+# Tweets per search page, and pages walked per ingest
+tweet_page_size = 100
+tweet_page_budget = 5
+
+# Playlist-wide tweet collection: tracks searched at once, and pages per
+# track. The Twitter scheduler still holds them to the search window.
+tweet_fanout_workers = 4
+tweet_fanout_pages = 1
+
 # Local database config
 from data_accessor import DataAccessor
 local_db_name = 'final_pj.sqlite'
-local_db_accessor = DataAccessor(local_db_name)
+local_db_profile = 'default'
+local_db_accessor = DataAccessor(local_db_name, profile=local_db_profile)
+
+# Related artist graph, loaded on first use and kept up to date by
+# save_related_artists
+from artist_graph import load_graph
+related_graph = None
+related_graph_lock = threading.Lock()
+
+# Genre similarity index, loaded on first use and kept up to date by
+# save_artist
+from artist_similarity import load_index
+similarity_index = None
+similarity_index_lock = threading.Lock()
+
+# Playlist co-occurrence matrices, loaded on first use and kept up to date
+# by playlist saves
+from cooccurrence import load_cooccurrence
+cooccurrence = None
+cooccurrence_lock = threading.Lock()
+
+# Local-first search: serve cached matches when there are at least this many
+local_search_min_results = 3
+local_search_limit = 10
+
+# Spotify search results kept by normalized query, least recently used
+# ones are evicted
+search_cache_capacity = 1000
+
+# Seconds before cached data is stale. Stale data is still served while a
+# background refresh updates it.
+cache_ttls = {
+    'artist': 7 * 24 * 3600,
+    'track': 7 * 24 * 3600,
+    'playlist': 24 * 3600,
+    'featured_playlists': 24 * 3600,
+    'search': 24 * 3600,
+    'tweets': 3600,
+}
+refresh_executor = ThreadPoolExecutor(max_workers=2)
+refreshing = set()
+refreshing_lock = threading.Lock()
+
+# Seconds a negative cache record is trusted, by reason
+negative_cache_ttls = {
+    'missing': 7 * 24 * 3600,
+    'failed': 10 * 60,
+}
+
+# Max ids per call of the multi-id endpoints spotify.tracks/spotify.artists
+spotify_batch_size = 50
+
+# Concurrent misses for the same (entity type, id) share one fetch
+inflight = SingleFlight()
+
+# Requests resolving cache misses run on this many threads at once
+fetch_workers = 8
+fetch_executor = ThreadPoolExecutor(max_workers=fetch_workers)
+
+# Playlist pages after the first one are fetched this many at a time
+playlist_page_size = 100
+playlist_page_workers = 4
+
+class CachedLookupError(Exception):
+    ''' Raised for an id the negative cache knows cannot be fetched
+    '''
+    def __init__(self, entity_type, entity_id, reason, error_class):
+        super().__init__(entity_type + ' ' + str(entity_id) + ' is ' \
+                         + reason + ' (' + str(error_class) + ')')
+        self.entity_type = entity_type
+        self.entity_id = entity_id
+        self.reason = reason
+        self.error_class = error_class
 
 
 # Spotify config
@@ -53,7 +157,14 @@ spotify_client_id = spotify_secrets.SPOTIFY_CLIENT_ID
 spotify_client_secret = spotify_secrets.SPOTIFY_CLIENT_SECRET
 os.environ['SPOTIPY_CLIENT_ID'] = spotify_client_id
 os.environ['SPOTIPY_CLIENT_SECRET'] = spotify_client_secret
-spotify = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials())
+
+# Spotify limits by a rolling 30 second window without a published quota.
+# A plain session turns off spotipy's own retries, so 429 and Retry-After
+# reach the scheduler.
+spotify_scheduler = RequestScheduler('spotify', 10, 20, max_concurrency=16)
+spotify = ScheduledClient(spotipy.Spotify(\
+    client_credentials_manager=SpotifyClientCredentials(), \
+    requests_session=requests.Session()), spotify_scheduler)
 
 
 
@@ -121,7 +232,7 @@ def convert_spotify_artist_object(spotify_object):
 
 
 # Track converters
-def convert_spotify_track_object(track_object):
+def convert_spotify_track_object(track_object, artists=None):
     ''' Object converter
     
     Parameters
@@ -129,6 +240,10 @@ def convert_spotify_track_object(track_object):
     Dict
         Spotify track object
     
+    Dict
+        Already resolved internal Artist objects by id. Artists are
+        looked up with get_artists if not given.
+    
     Returns
     -------
     Track 
@@ -142,17 +257,18 @@ def convert_spotify_track_object(track_object):
     
     track = Track(track_id, track_name, duration_ms, popularity, external_url)
     
-    for artist_object in track_object['artists']:
-        try:
-            track.artists.append(get_artist(artist_object['id']))
-        except:
-            pass
+    artist_ids = [artist_object['id'] for artist_object \
+                  in track_object['artists'] if artist_object['id'] is not None]
+    if artists is None:
+        track.artists = get_artists(artist_ids)
+    else:
+        track.artists = [artists[id] for id in artist_ids if id in artists]
     
     return track
 
 
 # Playlist converters
-def convert_spotify_playlist_object(playlist_object):
+def convert_spotify_playlist_object(playlist_object, tracks=None):
     ''' Object converter
     
     Parameters
@@ -160,6 +276,10 @@ def convert_spotify_playlist_object(playlist_object):
     Dict
         Spotify playlist object
     
+    List
+        Already resolved internal Track objects of the embedded items.
+        The items are hydrated with hydrate_tracks if not given.
+    
     Returns
     -------
     Playlist 
@@ -175,37 +295,914 @@ def convert_spotify_playlist_object(playlist_object):
     palylist = Playlist(playlist_id, playlist_name, owner_name, \
                         playlist_description, followers, external_url)
                         
-    for track_object in playlist_object['tracks']['items']:
-        try:
-            palylist.tracks.append(get_track(track_object['track']['id']))
-        except:
-            pass
+    # Items embed full track objects, so no track needs another request
+    if tracks is None:
+        tracks = hydrate_tracks([track_object['track'] for track_object \
+                                 in playlist_object['tracks']['items']])
+    palylist.tracks = tracks
     
     return palylist
     
+def hydrate_tracks(track_objects):
+    ''' Build and save tracks from full Spotify track objects, e.g. the
+    ones embedded in playlist and search payloads. Only artists missing
+    from the cache are requested, all together. Everything is saved in
+    one transaction.
+    
+    Parameters
+    ----------
+    List
+        A list of Spotify track objects. Local files, removed tracks and
+        podcast episodes are skipped.
+    
+    Returns
+    -------
+    List
+        A list of internal Track objects in input order
+    '''
+    track_objects = [track_object for track_object in track_objects \
+                     if track_object is not None \
+                     and track_object['id'] is not None \
+                     and track_object.get('type', 'track') == 'track']
+    
+    tracks = []
+    with local_db_accessor.batch():
+        artist_ids = [artist_object['id'] for track_object in track_objects \
+                      for artist_object in track_object['artists'] \
+                      if artist_object['id'] is not None]
+        artists = {}
+        for artist in get_artists(list(dict.fromkeys(artist_ids))):
+            artists[artist.artist_id] = artist
+        
+        for track_object in track_objects:
+            tracks.append(local_db_accessor.save_track(\
+                convert_spotify_track_object(track_object, artists)))
+    return tracks
+
+def hydrate_artists(artist_objects):
+    ''' Build and save artists from full Spotify artist objects, e.g. the
+    ones embedded in search and related artist payloads, in one
+    transaction.
+    
+    Parameters
+    ----------
+    List
+        A list of Spotify artist objects
+    
+    Returns
+    -------
+    List
+        A list of internal Artist objects in input order
+    '''
+    artists = []
+    with local_db_accessor.batch():
+        for artist_object in artist_objects:
+            if artist_object is None:
+                continue
+            artists.append(local_db_accessor.save_artist(\
+                convert_spotify_artist_object(artist_object)))
+    return artists
+
 # Twitter converters
 def convert_twitter_status_object(twitter_status_obj):
     ''' Object converter
     
     Parameters
     ----------
-    Dict
-        Twitter status object
+    Dict
+        Twitter status object
+    
+    Returns
+    -------
+    Twitter 
+        Internal Twitter object
+    '''
+    twitter_id = twitter_status_obj['id_str']
+    user_name = twitter_status_obj['user']['name']
+    url = twitter_status_obj['user']['url']
+    text = twitter_status_obj['text']
+    created_at = twitter_status_obj['created_at']
+    
+    twitter = Twitter(twitter_id, user_name, url, text, created_at)
+    
+    return twitter
+
+
+
+# ------------------------ Cache freshness ------------------------
+def is_stale(entity_type, fetched_on):
+    ''' Check whether cached data is older than its TTL.
+    
+    Parameters
+    ----------
+    Str
+        Entity type, a key of cache_ttls
+    
+    int
+        Unix time the data was fetched, None if unknown
+    
+    Returns
+    -------
+    bool
+        True if the data should be refreshed
+    '''
+    if fetched_on is None:
+        return True
+    return time.time() - fetched_on > cache_ttls[entity_type]
+
+def refresh_in_background(entity_type, entity_id, fetch):
+    ''' Refetch stale data on the refresh executor. Refreshes already
+    running for the same entity are not repeated.
+    
+    Parameters
+    ----------
+    Str
+        Entity type
+    
+    Str
+        Entity id
+    
+    Function
+        Fetches the entity from the network and saves it, taking the id
+    
+    Returns
+    -------
+    None
+    '''
+    key = (entity_type, entity_id)
+    with refreshing_lock:
+        if key in refreshing:
+            return
+        refreshing.add(key)
+    
+    def run():
+        try:
+            fetch(entity_id)
+        except Exception as e:
+            print('Refresh failed - ' + entity_type + ': ' + str(e))
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+    
+    refresh_executor.submit(run)
+
+def refresh_many_in_background(entity_type, entity_ids, fetch_many):
+    ''' Refetch many stale entities with one multi-id fetch on the refresh
+    executor. Ids already being refreshed are left out.
+    
+    Parameters
+    ----------
+    Str
+        Entity type
+    
+    List
+        A list of entity ids
+    
+    Function
+        Takes a list of ids, fetches and saves them, e.g. fetch_artists
+    
+    Returns
+    -------
+    None
+    '''
+    keys = []
+    with refreshing_lock:
+        for entity_id in dict.fromkeys(entity_ids):
+            key = (entity_type, entity_id)
+            if key not in refreshing:
+                refreshing.add(key)
+                keys.append(key)
+    if len(keys) == 0:
+        return
+    
+    def run():
+        try:
+            fetch_many_once(entity_type, [key[1] for key in keys], fetch_many)
+        except Exception as e:
+            print('Refresh failed - ' + entity_type + ': ' + str(e))
+        finally:
+            with refreshing_lock:
+                refreshing.difference_update(keys)
+    
+    refresh_executor.submit(run)
+
+def serve_cached(entity_type, result, entity_id, fetch):
+    ''' Return a cache hit, scheduling a refresh if it is stale.
+    
+    Parameters
+    ----------
+    Str
+        Entity type
+    
+    Object
+        Cached Artist, Track or Playlist object
+    
+    Str
+        Entity id
+    
+    Function
+        Fetches the entity from the network and saves it, taking the id
+    
+    Returns
+    -------
+    Object
+        The cached object
+    '''
+    if is_stale(entity_type, result.fetched_on):
+        print('Cache hit (stale, refreshing) - ' + entity_type)
+        refresh_in_background(entity_type, entity_id, fetch)
+    else:
+        print('Cache hit - ' + entity_type)
+    return result
+
+
+
+# ------------------------ Negative cache ------------------------
+def is_missing_error(error):
+    ''' Check whether an error means the id does not exist.
+    
+    Parameters
+    ----------
+    Exception
+        Error raised by a fetch
+    
+    Returns
+    -------
+    bool
+        True for Spotify 400 (invalid id) and 404 responses
+    '''
+    return isinstance(error, spotipy.SpotifyException) \
+        and error.http_status in (400, 404)
+
+def is_known_missing(negative):
+    ''' Check whether a negative cache record is still trusted.
+    
+    Parameters
+    ----------
+    Tuple
+        (reason, error class, recorded on), or None
+    
+    Returns
+    -------
+    bool
+        True if the id should not be fetched again yet
+    '''
+    if negative is None:
+        return False
+    reason, error_class, recorded_on = negative
+    return time.time() - recorded_on <= negative_cache_ttls[reason]
+
+def fetch_unless_known_missing(entity_type, entity_id, fetch, negative=None):
+    ''' Fetch an entity unless the negative cache says it cannot be
+    fetched. Failed fetches are recorded in the negative cache.
+    
+    Parameters
+    ----------
+    Str
+        Entity type
+    
+    Str
+        Entity id
+    
+    Function
+        Fetches the entity from the network and saves it, taking the id
+    
+    Tuple
+        Negative cache record if already looked up
+    
+    Returns
+    -------
+    Object
+        The fetched object
+    '''
+    if negative is None:
+        negative = local_db_accessor.find_negative(entity_type, entity_id)
+    if is_known_missing(negative):
+        print('Negative cache hit - ' + entity_type)
+        raise CachedLookupError(entity_type, entity_id, negative[0], \
+                                negative[1])
+    
+    try:
+        return fetch(entity_id)
+    except Exception as e:
+        reason = 'failed'
+        if is_missing_error(e):
+            reason = 'missing'
+        local_db_accessor.save_negative(entity_type, entity_id, reason, \
+                                        type(e).__name__)
+        raise
+
+def fetch_once(entity_type, entity_id, fetch):
+    ''' fetch_unless_known_missing, shared by every concurrent caller
+    asking for the same entity.
+    
+    Parameters
+    ----------
+    Str
+        Entity type
+    
+    Str
+        Entity id
+    
+    Function
+        Fetches the entity from the network and saves it, taking the id
+    
+    Returns
+    -------
+    Object
+        The fetched object
+    '''
+    return inflight.do((entity_type, entity_id), \
+        lambda: fetch_unless_known_missing(entity_type, entity_id, fetch))
+
+def fetch_many_once(entity_type, entity_ids, fetch_many):
+    ''' Fetch many entities, waiting for the ones other callers are
+    already fetching instead of requesting them again.
+    
+    Parameters
+    ----------
+    Str
+        Entity type
+    
+    List
+        A list of ids
+    
+    Function
+        Takes a list of ids, fetches and saves them, returns a dict of
+        objects by id
+    
+    Returns
+    -------
+    Dict
+        Objects by id, for the ids that could be fetched
+    '''
+    def fetch_claimed(keys):
+        fetched = fetch_many([key[1] for key in keys])
+        return {(entity_type, id): fetched[id] for id in fetched}
+    
+    results = inflight.do_many([(entity_type, id) for id in entity_ids], \
+                               fetch_claimed, return_exceptions=True)
+    return {key[1]: results[key] for key in results \
+            if results[key] is not None \
+            and not isinstance(results[key], Exception)}
+
+
+
+# ------------------------ Search cache ------------------------
+def normalize_query(keyword):
+    ''' Normalize a search keyword so that case, whitespace and accents do
+    not change the cache key, e.g. '  Beyoncé ' and 'beyonce'.
+    
+    Parameters
+    ----------
+    Str
+        Search keyword
+    
+    Returns
+    -------
+    Str
+        Normalized query
+    '''
+    decomposed = unicodedata.normalize('NFKD', keyword)
+    folded = ''.join([c for c in decomposed if not unicodedata.combining(c)])
+    return ' '.join(folded.casefold().split())
+
+def find_cached_search(search_type, keyword, find_many, fetch):
+    ''' Serve a search from the search cache. Results are loaded with the
+    batch finder, and stale searches are refreshed in the background.
+    
+    Parameters
+    ----------
+    Str
+        Search type, 'artist' or 'track'
+    
+    Str
+        Search keyword
+    
+    Function
+        Batch finder, e.g. local_db_accessor.find_artists
+    
+    Function
+        Searches Spotify and saves the results, taking the keyword
+    
+    Returns
+    -------
+    List
+        A list of internal objects in result order, None if the search is
+        not cached or a result is no longer in the database
+    '''
+    query = normalize_query(keyword)
+    record = local_db_accessor.find_search(search_type, query)
+    if record is None:
+        return None
+    
+    result_ids, fetched_on = record
+    results = find_many(result_ids)
+    if None in results:
+        return None
+    
+    if is_stale('search', fetched_on):
+        print('Cache hit (stale, refreshing) - ' + search_type + ' search')
+        refresh_in_background('search', search_type + ':' + query, \
+                              lambda id: fetch(keyword))
+    else:
+        print('Cache hit - ' + search_type + ' search')
+    return results
+
+
+
+# ------------------------ Fetch functions ------------------------
+def fetch_artist(artist_id):
+    ''' Fetch artist from Spotify and save it.
+    
+    Parameters
+    ----------
+    Str
+        A spotify artist ID
+    
+    Returns
+    -------
+    Artist
+        Internal Artist object
+    '''
+    artist = convert_spotify_artist_object(spotify.artist(artist_id))
+    local_db_accessor.save_artist(artist)
+    return artist
+
+def fetch_track(track_id):
+    ''' Fetch track from Spotify and save it.
+    
+    Parameters
+    ----------
+    Str
+        A spotify track ID
+    
+    Returns
+    -------
+    Track
+        Internal Track object
+    '''
+    track = convert_spotify_track_object(spotify.track(track_id))
+    local_db_accessor.save_track(track)
+    return track
+
+def map_in_parallel(function, items):
+    ''' Call function for every item on fetch_executor.
+    
+    Parameters
+    ----------
+    Function
+        Takes one item. It should only do network work; results are saved
+        by the caller so writes stay on the caller's transaction.
+    
+    List
+        A list of items
+    
+    Returns
+    -------
+    List
+        Results in input order, with the exception in place of the result
+        for failed calls
+    '''
+    def call(item):
+        try:
+            return function(item)
+        except Exception as e:
+            return e
+    
+    if len(items) <= 1:
+        return [call(item) for item in items]
+    return list(fetch_executor.map(call, items))
+
+def fetch_in_batches(entity_type, ids, endpoint):
+    ''' Call a multi-id endpoint for up to spotify_batch_size ids at a time,
+    all chunks in parallel. Ids Spotify returns no object for, and ids of
+    failed calls, are recorded in the negative cache.
+    
+    Parameters
+    ----------
+    Str
+        Entity type
+    
+    List
+        A list of ids
+    
+    Function
+        Takes a list of ids, returns the list of Spotify objects
+    
+    Returns
+    -------
+    Dict
+        Spotify objects by id
+    '''
+    ids = list(dict.fromkeys(ids))
+    chunks = [ids[start:start + spotify_batch_size] \
+              for start in range(0, len(ids), spotify_batch_size)]
+    
+    spotify_objects = {}
+    for chunk, results in zip(chunks, map_in_parallel(endpoint, chunks)):
+        if isinstance(results, Exception):
+            # One bad id fails the whole call, so nothing is known missing
+            for id in chunk:
+                local_db_accessor.save_negative(entity_type, id, 'failed', \
+                                                type(results).__name__)
+            continue
+        
+        for id, spotify_object in zip(chunk, results):
+            if spotify_object is None:
+                local_db_accessor.save_negative(entity_type, id, 'missing', \
+                                                'NotFound')
+            else:
+                spotify_objects[id] = spotify_object
+    return spotify_objects
+
+def fetch_artists(artist_ids):
+    ''' Fetch artists from Spotify with the multi-id endpoint and save them
+    in one transaction.
+    
+    Parameters
+    ----------
+    List
+        A list of spotify artist IDs
+    
+    Returns
+    -------
+    Dict
+        Internal Artist objects by id, for the ids that could be fetched
+    '''
+    artists = {}
+    with local_db_accessor.batch():
+        spotify_objects = fetch_in_batches('artist', artist_ids, \
+            lambda ids: spotify.artists(ids)['artists'])
+        for artist in hydrate_artists(list(spotify_objects.values())):
+            artists[artist.artist_id] = artist
+    return artists
+
+def fetch_tracks(track_ids):
+    ''' Fetch tracks from Spotify with the multi-id endpoint, resolve all
+    their artists together, and save everything in one transaction.
+    
+    Parameters
+    ----------
+    List
+        A list of spotify track IDs
+    
+    Returns
+    -------
+    Dict
+        Internal Track objects by id, for the ids that could be fetched
+    '''
+    tracks = {}
+    with local_db_accessor.batch():
+        spotify_objects = fetch_in_batches('track', track_ids, \
+            lambda ids: spotify.tracks(ids)['tracks'])
+        for track in hydrate_tracks(list(spotify_objects.values())):
+            tracks[track.track_id] = track
+    return tracks
+
+def fetch_playlist(playlist_id):
+    ''' Fetch playlist from Spotify and save it. The saved tracks are
+    replaced by the fresh ones in one transaction, so tracks that left the
+    playlist are dropped.
+    
+    Parameters
+    ----------
+    Str
+        A spotify playlist ID
+    
+    Returns
+    -------
+    Playlist
+        Internal Playlist object
+    '''
+    playlist_object = spotify.playlist(playlist_id)
+    playlist = convert_spotify_playlist_object(playlist_object)
+    
+    # The playlist object only embeds the first page of tracks
+    paging = playlist_object['tracks']
+    if paging['next'] is None:
+        local_db_accessor.save_playlist(playlist)
+        return playlist
+    
+    pages, complete = fetch_playlist_pages(playlist_id, \
+        paging['offset'] + paging['limit'], paging['total'])
+    
+    # Without every page the fresh set is unknown, so nothing is removed
+    with local_db_accessor.batch():
+        local_db_accessor.save_playlist(playlist, replace_tracks=complete)
+        for track_ids in pages:
+            local_db_accessor.save_playlist_tracks(playlist_id, track_ids)
+    return local_db_accessor.find_playlist(playlist_id)
+
+def fetch_playlist_page(page):
+    ''' Save the tracks of one page of playlist items.
+    
+    Parameters
+    ----------
+    Dict
+        Spotify paging object of playlist items
+    
+    Returns
+    -------
+    Tuple
+        (track ids, URL of the next page or None for the last page)
+    '''
+    tracks = hydrate_tracks([item['track'] for item in page['items']])
+    return [track.track_id for track in tracks], page['next']
+
+def fetch_playlist_pages(playlist_id, offset, total):
+    ''' Fetch the remaining pages of a playlist, several at a time. The
+    tracks are saved as each page arrives; only their ids are kept for
+    the playlist links, and they are returned in offset order whatever
+    order the pages arrive in. Pages past the known total are followed
+    with their next cursor.
+    
+    Parameters
+    ----------
+    Str
+        A spotify playlist ID
+    
+    int
+        Offset of the first page to fetch
+    
+    int
+        Total number of playlist items
+    
+    Returns
+    -------
+    Tuple
+        (track id lists of the loaded pages in playlist order, True if every
+        page loaded)
+    '''
+    def fetch_page(page_offset):
+        page = spotify.playlist_items(playlist_id, limit=playlist_page_size, \
+                                      offset=page_offset, \
+                                      additional_types=('track',))
+        return fetch_playlist_page(page)
+    
+    offsets = list(range(offset, total, playlist_page_size))
+    print('Loading ' + str(len(offsets)) + ' more playlist pages...')
+    
+    pages = {}
+    complete = True
+    next_url = None
+    with ThreadPoolExecutor(max_workers=playlist_page_workers) as executor:
+        futures = {}
+        for page_offset in offsets:
+            futures[executor.submit(fetch_page, page_offset)] = page_offset
+        for future in as_completed(futures):
+            try:
+                track_ids, page_next = future.result()
+            except Exception as e:
+                print('Playlist page failed - offset ' \
+                      + str(futures[future]) + ': ' + str(e))
+                complete = False
+                continue
+            pages[futures[future]] = track_ids
+            if futures[future] == offsets[-1]:
+                next_url = page_next
+    
+    pages = [pages[page_offset] for page_offset in sorted(pages)]
+    
+    # The playlist grew after the first page was read
+    while next_url is not None:
+        track_ids, next_url = fetch_playlist_page(\
+            spotify.next({'next': next_url}))
+        pages.append(track_ids)
+    return pages, complete
+
+def fetch_artist_search(keyword):
+    ''' Search artists on Spotify, save them and cache the result ids.
+    
+    Parameters
+    ----------
+    Str
+        An artist name
+    
+    Returns
+    -------
+    List
+        A list of internal Artist objects
+    '''
+    results = spotify.search(q='artist:' + keyword, type='artist')
+    
+    # Search results embed full artist objects
+    with local_db_accessor.batch():
+        artists = hydrate_artists(results['artists']['items'])
+        local_db_accessor.save_search('artist', normalize_query(keyword), \
+                                      [artist.artist_id for artist in artists])
+    local_db_accessor.evict_searches(search_cache_capacity)
+    return artists
+
+def fetch_track_search(keyword):
+    ''' Search tracks on Spotify, save them and cache the result ids.
+    
+    Parameters
+    ----------
+    Str
+        A track name
+    
+    Returns
+    -------
+    List
+        A list of internal Track objects
+    '''
+    results = spotify.search(q='track:' + keyword, type='track')
+    
+    # Search results embed full track objects
+    with local_db_accessor.batch():
+        tracks = hydrate_tracks(results['tracks']['items'])
+        local_db_accessor.save_search('track', normalize_query(keyword), \
+                                      [track.track_id for track in tracks])
+    local_db_accessor.evict_searches(search_cache_capacity)
+    return tracks
+
+def fetch_tweets(keyword, limit, since_id=None, max_id=None):
+    ''' Search recent tweets through the Twitter scheduler.
+    
+    Parameters
+    ----------
+    Str
+        Search keyword
+    
+    int
+        Maximum number of tweets
+    
+    Str
+        Only return tweets newer than this id
+    
+    Str
+        Only return tweets at or older than this id
+    
+    Returns
+    -------
+    Dict
+        Twitter search response
+    '''
+    search_params = {'q': keyword, 'count': limit}
+    if since_id is not None:
+        search_params['since_id'] = since_id
+    if max_id is not None:
+        search_params['max_id'] = max_id
+    
+    def search():
+        response = twitter_session.get(twitter_base_url, params=search_params)
+        response.raise_for_status()
+        return response.json()
+    
+    return twitter_scheduler.call(search)
+
+def ingest_tweets(track, max_pages=None):
+    ''' Walk tweet search pages for a track from the newest down with
+    max_id, stopping at the track's since_id cursor or after max_pages
+    pages. A walk that ran out of pages is resumed from its max_id by the
+    next call. Each page is saved in one transaction.
+    
+    Parameters
+    ----------
+    Track
+        Internal Track object
+    
+    int
+        Page budget, tweet_page_budget if not given
+    
+    Returns
+    -------
+    int
+        Number of tweets ingested
+    '''
+    if max_pages is None:
+        max_pages = tweet_page_budget
+    walk = start_tweet_walk(track)
+    for page in range(max_pages):
+        response = fetch_tweets(track.track_name, tweet_page_size, \
+                                walk['since_id'], walk['max_id'])
+        if not save_tweet_page(track, response['statuses'], walk):
+            break
+    return finish_tweet_walk(track, walk)
+
+def start_tweet_walk(track):
+    ''' Start a tweet walk at the track's cursor: from the newest tweet
+    down to since_id, or from max_id down if the last walk ran out of
+    pages.
+    
+    Parameters
+    ----------
+    Track
+        Internal Track object
+    
+    Returns
+    -------
+    Dict
+        Walk state: since_id, newest_id, max_id, complete, ingested
+    '''
+    cursor = local_db_accessor.find_tweet_cursor(track.track_id)
+    if cursor is None:
+        since_id, max_id, newest_id = None, None, None
+    else:
+        since_id, max_id = cursor[0], cursor[2]
+        newest_id = since_id if max_id is None else cursor[3]
+    return {'since_id': since_id, 'newest_id': newest_id, 'max_id': max_id, \
+            'complete': False, 'ingested': 0}
+
+def save_tweet_page(track, statuses, walk):
+    ''' Save one page of tweet search results in one transaction and move
+    the walk below it.
+    
+    Parameters
+    ----------
+    Track
+        Internal Track object
+    
+    List
+        A list of Twitter status objects
+    
+    Dict
+        Walk state: since_id, newest_id, max_id, complete, ingested
+    
+    Returns
+    -------
+    bool
+        True if there may be older pages
+    '''
+    twitters = [convert_twitter_status_object(status) for status in statuses]
+    if len(twitters) == 0:
+        walk['complete'] = True
+        return False
+    
+    with local_db_accessor.batch():
+        local_db_accessor.save_twitters(twitters)
+        local_db_accessor.save_twitter_by_track(track, twitters)
+    walk['ingested'] += len(twitters)
+    
+    ids = [int(twitter.twitter_id) for twitter in twitters]
+    if walk['newest_id'] is None or max(ids) > int(walk['newest_id']):
+        walk['newest_id'] = str(max(ids))
+    walk['max_id'] = str(min(ids) - 1)
+    
+    # Search often returns short pages while older tweets remain, so only
+    # an empty page ends the walk
+    return True
+
+def finish_tweet_walk(track, walk):
+    ''' Store the cursor of a tweet walk. A walk that ran out of pages
+    keeps since_id and stores its max_id, so the next one fills the gap
+    instead of starting over from the newest tweet.
+    
+    Parameters
+    ----------
+    Track
+        Internal Track object
+    
+    Dict
+        Walk state from save_tweet_page
+    
+    Returns
+    -------
+    int
+        Number of tweets ingested
+    '''
+    if walk['complete']:
+        local_db_accessor.save_tweet_cursor(track.track_id, walk['newest_id'])
+    else:
+        local_db_accessor.save_tweet_cursor(track.track_id, walk['since_id'], \
+                                            walk['max_id'], walk['newest_id'])
+    print('Ingested ' + str(walk['ingested']) + ' tweets')
+    return walk['ingested']
+
+def request_metrics():
+    ''' Get queue depth and throttle metrics of every API scheduler.
+    
+    Parameters
+    ----------
+    None
     
     Returns
     -------
-    Twitter 
-        Internal Twitter object
+    List
+        A list of metric dicts, one per API
     '''
-    twitter_id = twitter_status_obj['id_str']
-    user_name = twitter_status_obj['user']['name']
-    url = twitter_status_obj['user']['url']
-    text = twitter_status_obj['text']
-    created_at = twitter_status_obj['created_at']
+    return [spotify_scheduler.metrics(), twitter_scheduler.metrics()]
+
+def fetch_featured_playlists():
+    ''' Fetch the top 5 featured playlists from Spotify and save them.
     
-    twitter = Twitter(twitter_id, user_name, url, text, created_at)
+    Parameters
+    ----------
+    None
     
-    return twitter
+    Returns
+    -------
+    List
+        A list of internal Playlist objects
+    '''
+    spotify_palylist_objects = spotify.featured_playlists()['playlists']['items']
+    featured_playlists = []
+    for i in range(min(5, len(spotify_palylist_objects))):
+        featured_playlists\
+            .append(get_playlist(spotify_palylist_objects[i]['id']))
+    local_db_accessor.save_featured_palylists(featured_playlists)
+    return featured_playlists
 
 
 
@@ -225,12 +1222,9 @@ def get_artist(artist_id):
     '''
     result = local_db_accessor.find_artist(artist_id)
     if result is not None:
-        print('Cache hit - artist')
-        return result
+        return serve_cached('artist', result, artist_id, fetch_artist)
     print('Cache miss - artist')
-    artist = convert_spotify_artist_object(spotify.artist(artist_id))
-    local_db_accessor.save_artist(artist)
-    return artist
+    return fetch_once('artist', artist_id, fetch_artist)
 
 def get_track(track_id):
     ''' Get track.
@@ -247,12 +1241,78 @@ def get_track(track_id):
     '''
     result = local_db_accessor.find_track(track_id)
     if result is not None:
-        print('Cache hit - track')
-        return result
+        return serve_cached('track', result, track_id, fetch_track)
     print('Cache miss - track')
-    track = convert_spotify_track_object(spotify.track(track_id))
-    local_db_accessor.save_track(track)
-    return track
+    return fetch_once('track', track_id, fetch_track)
+
+def get_artists(artist_ids):
+    ''' Get many artists. Cached artists are read with one batch lookup
+    and only the misses go to Spotify. Artists that cannot be fetched are
+    left out.
+    
+    Parameters
+    ----------
+    List
+        A list of spotify artist IDs
+    
+    Returns
+    -------
+    List
+        A list of internal Artist objects in input order
+    '''
+    artists = local_db_accessor.find_artists(artist_ids)
+    misses = [artist_ids[i] for i in range(len(artists)) \
+              if artists[i] is None]
+    print('Cache hit - ' + str(len(artists) - len(misses)) + ' artists')
+    
+    negatives = local_db_accessor.find_negatives('artist', misses)
+    misses = [id for id in misses if not is_known_missing(negatives.get(id))]
+    if len(misses) > 0:
+        print('Cache miss - ' + str(len(misses)) + ' artists')
+    fetched = fetch_many_once('artist', misses, fetch_artists)
+    
+    stale = []
+    for i in range(len(artists)):
+        if artists[i] is None:
+            artists[i] = fetched.get(artist_ids[i])
+        elif is_stale('artist', artists[i].fetched_on):
+            stale.append(artist_ids[i])
+    refresh_many_in_background('artist', stale, fetch_artists)
+    return [artist for artist in artists if artist is not None]
+
+def get_tracks(track_ids):
+    ''' Get many tracks. Cached tracks are read with one batch lookup and
+    only the misses go to Spotify. Tracks that cannot be fetched are left
+    out.
+    
+    Parameters
+    ----------
+    List
+        A list of spotify track IDs
+    
+    Returns
+    -------
+    List
+        A list of internal Track objects in input order
+    '''
+    tracks = local_db_accessor.find_tracks(track_ids)
+    misses = [track_ids[i] for i in range(len(tracks)) if tracks[i] is None]
+    print('Cache hit - ' + str(len(tracks) - len(misses)) + ' tracks')
+    
+    negatives = local_db_accessor.find_negatives('track', misses)
+    misses = [id for id in misses if not is_known_missing(negatives.get(id))]
+    if len(misses) > 0:
+        print('Cache miss - ' + str(len(misses)) + ' tracks')
+    fetched = fetch_many_once('track', misses, fetch_tracks)
+    
+    stale = []
+    for i in range(len(tracks)):
+        if tracks[i] is None:
+            tracks[i] = fetched.get(track_ids[i])
+        elif is_stale('track', tracks[i].fetched_on):
+            stale.append(track_ids[i])
+    refresh_many_in_background('track', stale, fetch_tracks)
+    return [track for track in tracks if track is not None]
 
 def get_playlist(playlist_id):
     ''' Get related artists to artist_id.
@@ -269,12 +1329,9 @@ def get_playlist(playlist_id):
     '''
     result = local_db_accessor.find_playlist(playlist_id)
     if result is not None:
-        print('Cache hit - playlist')
-        return result
+        return serve_cached('playlist', result, playlist_id, fetch_playlist)
     print('Cache miss - playlist')
-    playlist = convert_spotify_playlist_object(spotify.playlist(playlist_id))
-    local_db_accessor.save_playlist(playlist)
-    return playlist
+    return fetch_once('playlist', playlist_id, fetch_playlist)
 
 def get_related_artists(artist_id):
     ''' Get related artists to artist_id.
@@ -295,38 +1352,192 @@ def get_related_artists(artist_id):
         print('Cache hit - related artists')
         return result
     
-    ('Cache miss - related artists')
-    artists = []
+    print('Cache miss - related artists')
     spotify_result = spotify.artist_related_artists(artist_id)
-    for spotify_artist in spotify_result['artists']:
-        artists.append(get_artist(spotify_artist['id']))
-    local_db_accessor.save_related_artists(artist_id, artists)
+    
+    # Related artists come as full artist objects
+    with local_db_accessor.batch():
+        artists = hydrate_artists(spotify_result['artists'])
+        local_db_accessor.save_related_artists(artist_id, artists)
     return artists
     
-def search_for_artist(keyword):
-    ''' Search for artist
+def get_related_graph():
+    ''' Get the in-memory related artist graph.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    ArtistGraph
+        The graph of every cached related artist edge
+    '''
+    global related_graph
+    with related_graph_lock:
+        if related_graph is None:
+            related_graph = load_graph(local_db_accessor)
+        return related_graph
+
+def get_artists_within(artist_id, hops=2):
+    ''' Get cached artists within a number of related artist hops.
     
     Parameters
     ----------
     Str
-        An artist name.
+        A spotify artist ID
+    
+    int
+        Maximum number of hops
     
     Returns
     -------
     List
-        A list of internal Artist objects
+        (hop count, internal Artist object) tuples, closest and most
+        popular first
     '''
-    results = spotify.search(q='artist:' + keyword, type='artist')
-    items = results['artists']['items']
+    within = get_related_graph().k_hop(artist_id, hops)
+    artists = [artist for artist in local_db_accessor.find_artists(\
+               list(within)) if artist is not None]
+    return sorted([(within[artist.artist_id], artist) for artist in artists], \
+                  key=lambda item: (item[0], -item[1].popularity))
+
+def get_similarity_index():
+    ''' Get the genre similarity index.
     
-    artists = []
-    for item in items:
-        artist = get_artist(item['id'])
-        artists.append(artist)
+    Parameters
+    ----------
+    None
     
-    return artists
+    Returns
+    -------
+    SimilarityIndex
+        The index of every cached artist
+    '''
+    global similarity_index
+    with similarity_index_lock:
+        if similarity_index is None:
+            similarity_index = load_index(local_db_accessor)
+        return similarity_index
+
+def get_similar_artists(artist_id, limit=10):
+    ''' Get cached artists with the most similar genres, computed locally.
+    
+    Parameters
+    ----------
+    Str
+        A spotify artist ID
+    
+    int
+        Maximum number of artists
+    
+    Returns
+    -------
+    List
+        (cosine similarity, internal Artist object) tuples, most similar
+        first
+    '''
+    similar = get_similarity_index().similar(artist_id, limit)
+    artists = local_db_accessor.find_artists([id for id, score in similar])
+    return [(score, artist) for (id, score), artist in zip(similar, artists) \
+            if artist is not None]
+
+def get_cooccurrence():
+    ''' Get the playlist co-occurrence matrices.
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    PlaylistCooccurrence
+        The track and artist matrices of every cached playlist
+    '''
+    global cooccurrence
+    with cooccurrence_lock:
+        if cooccurrence is None:
+            cooccurrence = load_cooccurrence(local_db_accessor)
+        return cooccurrence
+
+def get_tracks_appearing_with(track_id, limit=10):
+    ''' Get cached tracks that most often appear in the same playlists.
+    
+    Parameters
+    ----------
+    Str
+        A spotify track ID
+    
+    int
+        Maximum number of tracks
+    
+    Returns
+    -------
+    List
+        (playlist count, internal Track object) tuples, most frequent first
+    '''
+    top = get_cooccurrence().tracks_with(track_id, limit)
+    tracks = local_db_accessor.find_tracks([id for id, count in top])
+    return [(count, track) for (id, count), track in zip(top, tracks) \
+            if track is not None]
+
+def get_artists_appearing_with(artist_id, limit=10):
+    ''' Get cached artists that most often appear in the same playlists.
+    
+    Parameters
+    ----------
+    Str
+        A spotify artist ID
+    
+    int
+        Maximum number of artists
+    
+    Returns
+    -------
+    List
+        (playlist count, internal Artist object) tuples, most frequent first
+    '''
+    top = get_cooccurrence().artists_with(artist_id, limit)
+    artists = local_db_accessor.find_artists([id for id, count in top])
+    return [(count, artist) for (id, count), artist in zip(top, artists) \
+            if artist is not None]
 
-def search_for_track(keyword):
+def search_for_artist(keyword, local_first=True):
+    ''' Search for artist
+    
+    Parameters
+    ----------
+    Str
+        An artist name.
+    
+    bool
+        Serve cached matches when there are enough of them
+    
+    Returns
+    -------
+    List
+        A list of internal Artist objects
+    '''
+    artists = find_cached_search('artist', keyword, \
+                                 local_db_accessor.find_artists, \
+                                 fetch_artist_search)
+    if artists is not None:
+        return artists
+    
+    if local_first:
+        artists = local_db_accessor.search_artists(keyword, local_search_limit)
+        if len(artists) >= local_search_min_results:
+            print('Cache hit - artist search')
+            refresh_many_in_background('artist', [artist.artist_id \
+                for artist in artists if is_stale('artist', \
+                                                  artist.fetched_on)], \
+                fetch_artists)
+            return artists
+        print('Cache miss - artist search')
+    
+    return fetch_artist_search(keyword)
+
+def search_for_track(keyword, local_first=True):
     ''' Search for track
     
     Parameters
@@ -334,20 +1545,31 @@ def search_for_track(keyword):
     Str
         A track name.
     
+    bool
+        Serve cached matches when there are enough of them
+    
     Returns
     -------
     List
         A list of internal Track objects
     '''
-    results = spotify.search(q='track:' + keyword, type='track')
-    items = results['tracks']['items']
-    
-    tracks = []
-    for item in items:
-        track = get_track(item['id'])
-        tracks.append(track)
-    
-    return tracks
+    tracks = find_cached_search('track', keyword, \
+                                local_db_accessor.find_tracks, \
+                                fetch_track_search)
+    if tracks is not None:
+        return tracks
+    
+    if local_first:
+        tracks = local_db_accessor.search_tracks(keyword, local_search_limit)
+        if len(tracks) >= local_search_min_results:
+            print('Cache hit - track search')
+            refresh_many_in_background('track', [track.track_id \
+                for track in tracks if is_stale('track', track.fetched_on)], \
+                fetch_tracks)
+            return tracks
+        print('Cache miss - track search')
+    
+    return fetch_track_search(keyword)
 
 def get_featured_playlists():
     ''' Get top 5 featured playlists.
@@ -363,17 +1585,17 @@ def get_featured_playlists():
     '''
     result = local_db_accessor.find_featured_palylists()
     if result is not None:
-        print('Cache hit - featured playlists')
+        updated_on = local_db_accessor.featured_playlists_updated_on()
+        if is_stale('featured_playlists', updated_on):
+            print('Cache hit (stale, refreshing) - featured playlists')
+            refresh_in_background('featured_playlists', '', \
+                                  lambda id: fetch_featured_playlists())
+        else:
+            print('Cache hit - featured playlists')
         return result
     
     print('Cache miss - featured playlists')
-    spotify_palylist_objects = spotify.featured_playlists()['playlists']['items']
-    featured_playlists = []
-    for i in range(min(5, len(spotify_palylist_objects))):
-        featured_playlists\
-            .append(get_playlist(spotify_palylist_objects[i]['id']))
-    local_db_accessor.save_featured_palylists(featured_playlists)
-    return featured_playlists
+    return fetch_featured_playlists()
 
 def get_twitters_by_track(track, limit = 100):
     ''' Get a list of twitter posts by keyword
@@ -389,24 +1611,79 @@ def get_twitters_by_track(track, limit = 100):
     Returns
     -------
     Dict
-        A list of internal twitter object
+        A list of internal twitter object, newest first
     '''
+    cursor = local_db_accessor.find_tweet_cursor(track.track_id)
+    if cursor is not None:
+        if is_stale('tweets', cursor[1]):
+            print('Cache hit (stale, refreshing) - twitters by track')
+            refresh_in_background('tweets', track.track_id, \
+                                  lambda id: ingest_tweets(track))
+        else:
+            print('Cache hit - twitters by track')
+    else:
+        print('Cache miss - twitters by track')
+        inflight.do(('tweets', track.track_id), lambda: ingest_tweets(track))
+    
     result = local_db_accessor.find_twitters_by_track(track)
-    if result is not None:
-        print('Cache hit - twitters by track')
-        return result
+    if result is None:
+        return []
+    return result[:limit]
+
+def collect_playlist_tweets(playlist, limit=100):
+    ''' Get tweets for every track of a playlist. Tracks without fresh
+    tweets are searched several at a time, and each track is reported
+    as soon as it is done. A failed track does not stop the others.
+    
+    Parameters
+    ----------
+    Playlist
+        Internal Playlist object
+    
+    int
+        Maximum number of posts per track
     
-    print('Cache miss - twitters by track')
-    search_params = {'q': track.track_name, 'count': limit}
-    response = requests.get(twitter_base_url, params=search_params, \
-                            auth=twitter_oauth).json()
-    twitters = []
-    for status in response['statuses']:
-        twitter = convert_twitter_status_object(status)
-        twitters.append(twitter)
-        local_db_accessor.save_twitter(twitter)
-    local_db_accessor.save_twitter_by_track(track, twitters)
-    return twitters
+    Returns
+    -------
+    Dict
+        Lists of internal Twitter objects by track id, for the tracks
+        that did not fail
+    '''
+    tracks = list({track.track_id: track for track in playlist.tracks}\
+                  .values())
+    tweets = {}
+    pending = []
+    for track in tracks:
+        cursor = local_db_accessor.find_tweet_cursor(track.track_id)
+        if cursor is not None and not is_stale('tweets', cursor[1]):
+            tweets[track.track_id] = get_twitters_by_track(track, limit)
+        else:
+            pending.append(track)
+    print(str(len(tweets)) + ' tracks cached, searching tweets for ' \
+          + str(len(pending)) + ' tracks...')
+    
+    def collect(track):
+        inflight.do(('tweets', track.track_id), \
+                    lambda: ingest_tweets(track, tweet_fanout_pages))
+        result = local_db_accessor.find_twitters_by_track(track)
+        return [] if result is None else result[:limit]
+    
+    with ThreadPoolExecutor(max_workers=tweet_fanout_workers) as executor:
+        futures = {executor.submit(collect, track): track for track in pending}
+        done = 0
+        for future in as_completed(futures):
+            track = futures[future]
+            done += 1
+            try:
+                tweets[track.track_id] = future.result()
+            except Exception as e:
+                print('[' + str(done) + '/' + str(len(pending)) + '] ' \
+                      + track.track_name + ' - failed: ' + str(e))
+                continue
+            print('[' + str(done) + '/' + str(len(pending)) + '] ' \
+                  + track.track_name + ' - ' \
+                  + str(len(tweets[track.track_id])) + ' tweets')
+    return tweets
 
 
 
@@ -496,18 +1773,15 @@ def plot_related_artist_genres(related_artists):
     -------
     None
     '''
-    genres = {}
-    
-    for a in related_artists:
-        for genre in a.genres.split(', '):
-            genres[genre] = genres.get(genre, 0) + 1
+    histogram = local_db_accessor.genre_histogram(\
+        [a.artist_id for a in related_artists])
 
     labels = []
     values = []
     
-    for key in genres:
-        labels.append(key)
-        values.append(genres[key])
+    for genre, count in histogram:
+        labels.append(genre)
+        values.append(count)
 
     fig = go.Figure(data=[go.Pie(labels=labels, values=values)])
     fig.show()
@@ -536,6 +1810,33 @@ def plot_track_popularity(tracks):
     fig.show()
 
 
+def plot_playlist_tweet_counts(tracks, tweets):
+    ''' Plot for the number of tweets of each track
+    
+    Parameters
+    ----------
+    List
+        A list of internal tracks object
+    
+    Dict
+        Lists of internal Twitter objects by track id
+    
+    Returns
+    -------
+    None
+    '''
+    track_names = []
+    tweet_counts = []
+    
+    for track in tracks:
+        if track.track_id in tweets:
+            track_names.append(track.track_name)
+            tweet_counts.append(len(tweets[track.track_id]))
+    
+    fig = go.Figure([go.Bar(x=track_names, y=tweet_counts)])
+    fig.show()
+
+
 def plot_singer_percentages(tracks):
     ''' Plot for the number of occurrences of singers in a list of tracks
     
@@ -587,6 +1888,9 @@ def artist_cli(artist):
             + '\n [2] View popularity chart for related artists of the artist' \
             + '\n [3] View genre chart for percentage of genres among related' \
                    + ' artists' \
+            + '\n [4] View artists within two hops of related artists' \
+            + '\n [5] View artists with similar genres' \
+            + '\n [6] View artists that often appear in the same playlists' \
             + '\n'
         print(message)
         command = input('Please enter the command index or back or exit: ')
@@ -610,10 +1914,92 @@ def artist_cli(artist):
             artists = get_related_artists(artist.artist_id)
             artists.append(artist)
             plot_related_artist_genres(artists)
+        elif command == '4':
+            get_related_artists(artist.artist_id)
+            i = 1
+            for hops, related in get_artists_within(artist.artist_id):
+                print('[' + str(i) + '] ' + related.artist_name + ' (' \
+                      + str(hops) + ' hop' + ('s' if hops > 1 else '') + ')')
+                i+=1
+        elif command == '5':
+            i = 1
+            for score, similar in get_similar_artists(artist.artist_id):
+                print('[' + str(i) + '] ' + similar.artist_name + ' (' \
+                      + str(round(score, 2)) + ')')
+                i+=1
+        elif command == '6':
+            i = 1
+            for count, other in get_artists_appearing_with(artist.artist_id):
+                print('[' + str(i) + '] ' + other.artist_name + ' (' \
+                      + str(count) + ' playlist' + ('s' if count > 1 else '') \
+                      + ')')
+                i+=1
         else:
             print('\nWrong command...\n')
 
 
+def genre_cli():
+    ''' Browse cached artists by genre command line interface (CLI)
+    
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    None
+    '''
+    genres = local_db_accessor.genre_histogram()[:20]
+    
+    while(True):
+        print('\nTop genres of cached artists:\n')
+        for i in range(len(genres)):
+            print('  [' + str(i+1) + ']: ' + genres[i][0] + ' (' \
+                  + str(genres[i][1]) + ' artists)')
+        
+        command = input('\nPlease enter the index for genre or back or exit: ')
+
+        if command == 'exit':
+            sys.exit(0)
+        
+        if command == 'back':
+            break
+        
+        genre = None
+        try:
+            index = int(command) - 1
+            genre = genres[index][0]
+        except:
+            print('\nPlease enter a valid number')
+        
+        if genre is None:
+            continue
+        
+        artists = local_db_accessor.find_artists_by_genre(genre, 20)
+        while(True):
+            print('\nArtists of ' + genre + ':\n')
+            for i in range(len(artists)):
+                print('  [' + str(i+1) + ']: ' + artists[i].artist_name)
+            
+            command = input('\nPlease enter the index for artist or back or exit: ')
+
+            if command == 'exit':
+                sys.exit(0)
+            
+            if command == 'back':
+                break
+            
+            artist = None
+            try:
+                index = int(command) - 1
+                artist = artists[index]
+            except:
+                print('\nPlease enter a valid number')
+            
+            if artist is not None:   
+                artist_cli(artist)
+
+
 def search_artist_cli():
     ''' Search artist command line interface (CLI)
     
@@ -681,6 +2067,7 @@ def track_cli(track):
             + '\n [1] Go to the spotify track page on browser' \
             + '\n [2] View the artist' \
             + '\n [3] View tweets related to the song' \
+            + '\n [4] View songs that often appear in the same playlists' \
             + '\n'
         print(message)
         command = input('Please enter the command index or back or exit: ')
@@ -722,6 +2109,13 @@ def track_cli(track):
                 print('[' + str(i) + '] ' + str(twitter))
                 i+=1
                 print()
+        elif command == '4':
+            i = 1
+            for count, other in get_tracks_appearing_with(track.track_id):
+                print('[' + str(i) + '] ' + other.track_name + ' (' \
+                      + str(count) + ' playlist' + ('s' if count > 1 else '') \
+                      + ')')
+                i+=1
         else:
             print('\nWrong command...\n')
 
@@ -795,6 +2189,7 @@ def playlist_cli(playlist):
             + '\n [2] Go to a track' \
             + '\n [3] View popularity of each song' \
             + '\n [4] View percentage of singers' \
+            + '\n [5] View tweets of every song' \
             + '\n'
         print(message)
         command = input('Please enter the command index or back or exit: ')
@@ -836,6 +2231,10 @@ def playlist_cli(playlist):
             print('Generating pie chart for the number of occurrences of ' \
                 + 'singers...')
             plot_singer_percentages(playlist.tracks)
+        elif command == '5':
+            tweets = collect_playlist_tweets(playlist)
+            print('Generating bar chart for the number of tweets...')
+            plot_playlist_tweet_counts(playlist.tracks, tweets)
         else:
             print('\nWrong command...\n')
 
@@ -896,6 +2295,7 @@ def command_line():
             + '\n [2] View top 5 featured playlists' \
             + '\n [3] Search for a track (song)' \
             + '\n [4] Search for an artist' \
+            + '\n [5] Browse cached artists by genre' \
             + '\n'
         print(message)
         
@@ -910,6 +2310,8 @@ def command_line():
             search_track_cli()
         elif command == '4':
             search_artist_cli()
+        elif command == '5':
+            genre_cli()
         elif command == 'exit':
             break
         else:
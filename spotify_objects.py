@@ -17,6 +17,16 @@ class Artist:
         self.followers = followers
         self.popularity = popularity
         self.external_url = external_url
+        
+        # Unix time the data was fetched from Spotify, None if unknown
+        self.fetched_on = None
+    
+    def genre_list(self):
+        ''' Get the genres as a list. genres is stored comma joined.
+        '''
+        if not self.genres:
+            return []
+        return self.genres.split(', ')
     
     def __str__(self):
         return 'Artist name: ' + str(self.artist_name) \
@@ -38,6 +48,9 @@ class Track:
         
         # List of internal Artist objects
         self.artists = []
+        
+        # Unix time the data was fetched from Spotify, None if unknown
+        self.fetched_on = None
     
     def __str__(self):
         artist_names = ''
@@ -68,6 +81,9 @@ class Playlist:
         
         # List of internal Track objects
         self.tracks = []
+        
+        # Unix time the data was fetched from Spotify, None if unknown
+        self.fetched_on = None
     
     def __str__(self):
         track_names = ''
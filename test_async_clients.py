@@ -0,0 +1,95 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import asyncio
+import os
+import threading
+
+import pytest
+from aiohttp import web
+
+import async_stub_server
+
+# Offline test of async_clients against async_stub_server. Run with:
+# python3 -m pytest -q test_async_clients.py
+
+
+@pytest.fixture(scope='module')
+def async_clients(tmp_path_factory):
+    ''' Import async_clients with spotify_cli's database in a temporary
+    directory, so the test never touches final_pj.sqlite.
+    '''
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('db'))
+    try:
+        import async_clients
+        yield async_clients
+        async_clients.local_db_accessor.close()
+    finally:
+        os.chdir(cwd)
+
+def run_against_stub(async_clients, get_function, *args):
+    ''' Start the stub server on a free port, run one get function with
+    clients pointed at it, and record the threads that committed artists.
+
+    Returns
+    -------
+    Tuple
+        (result, set of committing threads, event loop thread)
+    '''
+    threads = set()
+    listener = lambda artist: threads.add(threading.current_thread())
+    async_clients.local_db_accessor.artist_listeners.append(listener)
+
+    async def main():
+        runner = web.AppRunner(async_stub_server.make_app())
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        base = 'http://127.0.0.1:' + str(port)
+        try:
+            async with async_clients.AsyncClients(\
+                    spotify_base_url=base + '/v1', \
+                    spotify_token_url=base + '/token', \
+                    twitter_base_url=base + '/1.1') as clients:
+                return await get_function(clients, *args), \
+                    threading.current_thread()
+        finally:
+            await runner.cleanup()
+
+    try:
+        result, loop_thread = asyncio.run(main())
+    finally:
+        async_clients.local_db_accessor.artist_listeners.remove(listener)
+    return result, threads, loop_thread
+
+def test_get_playlist(async_clients):
+    playlist, threads, loop_thread = run_against_stub(async_clients, \
+        async_clients.get_playlist, 'p1')
+
+    expected = ['p1%05d' % position for position \
+                in range(async_stub_server.playlist_length)]
+    assert [track.track_id for track in playlist.tracks] == expected
+    assert all(len(track.artists) == 2 for track in playlist.tracks)
+    assert [track.track_id for track in async_clients.local_db_accessor\
+            .find_playlist('p1').tracks] == expected
+
+    # Tracks and artists were committed off the event loop
+    assert len(threads) > 0
+    assert loop_thread not in threads
+
+def test_get_twitters_by_track(async_clients):
+    playlist = run_against_stub(async_clients, async_clients.get_playlist, \
+                                'p2')[0]
+    track = playlist.tracks[0]
+    twitters = run_against_stub(async_clients, \
+        async_clients.get_twitters_by_track, track, 200)[0]
+
+    expected = [str(id) for id \
+                in range(async_stub_server.tweet_count, 0, -1)]
+    assert [twitter.twitter_id for twitter in twitters] == expected
+    assert async_clients.local_db_accessor.find_tweet_cursor(\
+        track.track_id)[0] == str(async_stub_server.tweet_count)
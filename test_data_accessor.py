@@ -0,0 +1,66 @@
+#########################################
+##### Name: Xiao Cheng              #####
+##### Uniqname: xchengx             #####
+#########################################
+
+import pytest
+
+from data_accessor import DataAccessor
+from spotify_objects import Artist, Playlist, Track
+
+# Run with: python3 -m pytest -q test_data_accessor.py
+
+
+@pytest.fixture
+def accessor(tmp_path):
+    ''' A DataAccessor over a new database in a temporary directory.
+    '''
+    accessor = DataAccessor(str(tmp_path / 'test.sqlite'))
+    yield accessor
+    accessor.close()
+
+def artist_ids_by_genre(accessor, genre_name):
+    return sorted(artist.artist_id for artist \
+                  in accessor.find_artists_by_genre(genre_name) or [])
+
+def test_resave_artist_with_changed_genres(accessor):
+    accessor.save_artist(Artist('x1', 'X', 'pop, rock', 1, 10, 'u'))
+    accessor.save_artist(Artist('x1', 'X', 'pop, jazz, jazz', 1, 10, 'u'))
+
+    assert artist_ids_by_genre(accessor, 'jazz') == ['x1']
+    assert artist_ids_by_genre(accessor, 'rock') == []
+    assert artist_ids_by_genre(accessor, 'pop') == ['x1']
+
+def test_resave_artists_with_changed_genres_in_batch(accessor):
+    accessor.save_artist(Artist('x1', 'X', 'pop, rock', 1, 10, 'u'))
+    with accessor.batch():
+        accessor.save_artist(Artist('x2', 'Y', 'rock, blues', 1, 10, 'u'))
+        accessor.save_artist(Artist('x1', 'X', 'jazz, blues', 1, 10, 'u'))
+
+    assert accessor.find_artist('x1').genres == 'jazz, blues'
+    assert artist_ids_by_genre(accessor, 'blues') == ['x1', 'x2']
+    assert artist_ids_by_genre(accessor, 'rock') == ['x2']
+    assert artist_ids_by_genre(accessor, 'pop') == []
+
+def test_save_artist_refreshes_cached_tracks_and_playlists(accessor):
+    artist = Artist('q1', 'Q', 'pop', 1, 10, 'u')
+    track = Track('qt', 'Song', 1000, 20, 'u')
+    track.artists = [artist]
+    playlist = Playlist('qp', 'List', 'owner', 'description', 1, 'u')
+    playlist.tracks = [track]
+    with accessor.batch():
+        accessor.save_artist(artist)
+        accessor.save_track(track)
+        accessor.save_playlist(playlist)
+    assert accessor.find_track('qt').artists[0].popularity == 10
+    assert accessor.find_playlist('qp').tracks[0].artists[0].popularity == 10
+
+    accessor.save_artist(Artist('q1', 'Q', 'pop', 1, 99, 'u'))
+    cached = accessor.find_artist('q1')
+    assert cached.popularity == 99
+    assert accessor.find_track('qt').artists[0] is cached
+    assert accessor.find_playlist('qp').tracks[0].artists[0] is cached
+
+    accessor.save_track(Track('qt', 'Renamed', 1000, 20, 'u'))
+    assert accessor.find_playlist('qp').tracks[0] is accessor.find_track('qt')
+    assert accessor.find_track('qt').track_name == 'Renamed'